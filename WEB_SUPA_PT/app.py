@@ -1,46 +1,326 @@
 import streamlit as st
-import pandas as pd
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-from googleapiclient.errors import HttpError
-from gspread.exceptions import APIError
 import io
-import gspread
 import bcrypt
 #import datetime
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
 from zoneinfo import ZoneInfo
-import yagmail
 import time
-from supabase import create_client
-from openpyxl.styles import PatternFill, Font, Alignment
-from openpyxl.utils import get_column_letter
-import altair as alt
-import numpy as np
+import sys
+import threading
+import bisect
+import json
+import hashlib
+import csv
+import gzip
+import shutil
+import tempfile
+import uuid
+import unicodedata
+import sqlite3
+from pathlib import Path
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+# pandas, numpy, altair, openpyxl, yagmail y los clientes de Google/Supabase se importan dentro
+# de las funciones que los usan: la pantalla de login no los necesita y cada uno suma segundos al
+# arranque en frío. Después del primer uso el import es solo una búsqueda en sys.modules.
+
+# =======================================================
+#        MÉTRICAS DE TIEMPO (SPANS POR VISTA)
+# =======================================================
+# Minutos que abarcan los histogramas de la página MÉTRICAS
+METRICAS_VENTANA_MIN = int(st.secrets.get("METRICAS_VENTANA_MIN", 60))
+# Límites superiores de los tramos del histograma, en segundos
+LIMITES_SPAN = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class MetricasTiempo:
+    """Histogramas móviles de duración por (operación, vista), compartidos por todas las sesiones.
+
+    Cada serie guarda un tramo por minuto (conteos por límite, suma, máximo y errores) y descarta
+    los que quedan fuera de la ventana, así que los totales son siempre de los últimos minutos.
+    """
+
+    def __init__(self, ventana_min):
+        self.ventana_min = ventana_min
+        self.lock = threading.Lock()
+        self.series = {}
+        # Vista heredada por los hilos de un ThreadPoolExecutor lanzado desde una sesión
+        self.hilo = threading.local()
+
+    def registrar(self, operacion, vista, segundos, error=False):
+        minuto = int(time.time() // 60)
+        with self.lock:
+            tramos = self.series.setdefault((operacion, vista), deque())
+            if not tramos or tramos[-1]["minuto"] != minuto:
+                tramos.append({"minuto": minuto, "conteos": [0] * (len(LIMITES_SPAN) + 1),
+                               "suma": 0.0, "maximo": 0.0, "errores": 0})
+            while tramos[0]["minuto"] <= minuto - self.ventana_min:
+                tramos.popleft()
+            tramo = tramos[-1]
+            tramo["conteos"][bisect.bisect_left(LIMITES_SPAN, segundos)] += 1
+            tramo["suma"] += segundos
+            tramo["maximo"] = max(tramo["maximo"], segundos)
+            tramo["errores"] += bool(error)
+
+    def limpiar(self):
+        with self.lock:
+            self.series.clear()
+
+    @staticmethod
+    def _cuantil(conteos, total, q, maximo):
+        """Cuantil interpolado dentro del tramo, como histogram_quantile de Prometheus, sin pasar del máximo."""
+        objetivo = q * total
+        acumulado = 0
+        for i, conteo in enumerate(conteos):
+            if conteo and acumulado + conteo >= objetivo:
+                inferior = LIMITES_SPAN[i - 1] if i else 0.0
+                superior = LIMITES_SPAN[i] if i < len(LIMITES_SPAN) else LIMITES_SPAN[-1]
+                return min(inferior + (superior - inferior) * (objetivo - acumulado) / conteo, maximo)
+            acumulado += conteo
+        return maximo
+
+    def resumen(self):
+        """Una fila por serie con conteos acumulados de la ventana, de mayor a menor tiempo total."""
+        minimo = int(time.time() // 60) - self.ventana_min
+        with self.lock:
+            series = {clave: [t for t in tramos if t["minuto"] > minimo] for clave, tramos in self.series.items()}
+        filas = []
+        for (operacion, vista), tramos in series.items():
+            if not tramos:
+                continue
+            conteos = [sum(c) for c in zip(*(t["conteos"] for t in tramos))]
+            total = sum(conteos)
+            suma = sum(t["suma"] for t in tramos)
+            maximo = max(t["maximo"] for t in tramos)
+            filas.append({
+                "operacion": operacion,
+                "vista": vista,
+                "llamadas": total,
+                "errores": sum(t["errores"] for t in tramos),
+                "suma_s": suma,
+                "promedio_ms": suma / total * 1000,
+                "p50_ms": self._cuantil(conteos, total, 0.50, maximo) * 1000,
+                "p95_ms": self._cuantil(conteos, total, 0.95, maximo) * 1000,
+                "p99_ms": self._cuantil(conteos, total, 0.99, maximo) * 1000,
+                "maximo_ms": maximo * 1000,
+                "conteos": conteos,
+            })
+        return sorted(filas, key=lambda f: f["suma_s"], reverse=True)
+
+    def json(self):
+        return json.dumps({
+            "ventana_min": self.ventana_min,
+            "limites_s": list(LIMITES_SPAN),
+            "series": self.resumen(),
+        }, ensure_ascii=False, indent=2)
+
+    def prometheus(self):
+        """Formato de texto de Prometheus (histograma de la ventana móvil)."""
+        def etiqueta(valor):
+            return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        lineas = [
+            f"# HELP sura_span_segundos Duración de llamadas externas y transformaciones (últimos {self.ventana_min} min).",
+            "# TYPE sura_span_segundos histogram",
+        ]
+        errores = []
+        for fila in self.resumen():
+            etiquetas = f'operacion="{etiqueta(fila["operacion"])}",vista="{etiqueta(fila["vista"])}"'
+            acumulado = 0
+            for limite, conteo in zip(LIMITES_SPAN, fila["conteos"]):
+                acumulado += conteo
+                lineas.append(f'sura_span_segundos_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'sura_span_segundos_bucket{{{etiquetas},le="+Inf"}} {fila["llamadas"]}')
+            lineas.append(f"sura_span_segundos_sum{{{etiquetas}}} {fila['suma_s']:.6f}")
+            lineas.append(f"sura_span_segundos_count{{{etiquetas}}} {fila['llamadas']}")
+            errores.append(f"sura_span_errores{{{etiquetas}}} {fila['errores']}")
+        lineas += [
+            f"# HELP sura_span_errores Spans terminados con excepción (últimos {self.ventana_min} min).",
+            "# TYPE sura_span_errores gauge",
+            *errores,
+        ]
+        return "\n".join(lineas) + "\n"
+
+
+@st.cache_resource
+def _metricas_tiempo():
+    return MetricasTiempo(METRICAS_VENTANA_MIN)
+
+metricas = _metricas_tiempo()
+
+def _vista_actual():
+    """Vista de la sesión que ejecuta el código; "segundo_plano" en hilos sin sesión."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return getattr(metricas.hilo, "vista", "segundo_plano")
+    if not st.session_state.get("auth"):
+        return "LOGIN"
+    return st.session_state.get("vista") or "INICIO"
+
+def _heredar_vista(vista, padre=None):
+    """initializer de ThreadPoolExecutor: los spans del hilo quedan con la vista de quien lo lanzó
+    y, si esa recarga se está perfilando, el hilo se muestrea junto con ella."""
+    metricas.hilo.vista = vista
+    if padre is not None:
+        _perfilador().unir(threading.get_ident(), padre)
+
+@contextmanager
+def medir(operacion):
+    """Span de tiempo: registra la duración del bloque bajo la operación y la vista actual."""
+    vista = _vista_actual()
+    inicio = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        metricas.registrar(operacion, vista, time.perf_counter() - inicio, error)
+
+
+class ClienteMedido:
+    """Envuelve un cliente (Supabase o Drive) y mide cada execute()/next_chunk().
+
+    Las llamadas encadenadas devuelven otro ClienteMedido, y el nombre de la operación se arma con
+    la tabla, el recurso o la función y el primer verbo, p. ej. "supabase.Login.select",
+    "supabase.rpc.kpis_dashboard" o "drive.files.create".
+    """
+
+    VERBOS = ("select", "insert", "update", "upsert", "delete", "list", "create", "get")
+    TERMINALES = ("execute", "next_chunk")
+    # Llamadas que devuelven un constructor o recurso sin execute() propio
+    RECURSOS = ("table", "from_", "files")
+
+    def __init__(self, objeto, operacion, con_verbo=False):
+        self._objeto = objeto
+        self._operacion = operacion
+        self._con_verbo = con_verbo
+
+    def _siguiente(self, nombre, args):
+        if nombre in ("table", "from_") and args:
+            return f"{self._operacion}.{args[0]}", False
+        if nombre == "rpc" and args:
+            return f"{self._operacion}.rpc.{args[0]}", True
+        if nombre == "files":
+            return f"{self._operacion}.files", False
+        if nombre == "new_batch_http_request":
+            return f"{self._operacion}.batch", True
+        if nombre in self.VERBOS and not self._con_verbo:
+            return f"{self._operacion}.{nombre}", True
+        return self._operacion, self._con_verbo
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._objeto, nombre)
+        if nombre in self.TERMINALES:
+            def terminal(*args, **kwargs):
+                with medir(self._operacion):
+                    return atributo(*args, **kwargs)
+            return terminal
+        if callable(atributo):
+            def encadenar(*args, **kwargs):
+                resultado = atributo(*args, **kwargs)
+                operacion, con_verbo = self._siguiente(nombre, args)
+                if nombre in self.RECURSOS or any(hasattr(resultado, t) for t in self.TERMINALES):
+                    return ClienteMedido(resultado, operacion, con_verbo)
+                return resultado
+            return encadenar
+        if any(hasattr(atributo, t) for t in self.TERMINALES):
+            return ClienteMedido(atributo, self._operacion, self._con_verbo)
+        return atributo
 
-supabase = create_client(
-    st.secrets["SUPABASE_URL"],
-    st.secrets["SUPABASE_KEY"]
-)
 
 # =======================================================
-#             CONFIGURAR CREDENCIALES
+#             CONFIGURAR CREDENCIALES Y CLIENTES
 # =======================================================
 scope = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive"
 ]
 
-# 🔥 CREDENCIALES DESDE STREAMLIT SECRETS
-creds = Credentials.from_service_account_info(
-    st.secrets["gcp_service_account"],
-    scopes=scope
-)
+class RegistroClientes:
+    """Clientes de Supabase y Google creados una sola vez por proceso.
 
-client = gspread.authorize(creds)
-drive_service = build("drive", "v3", credentials=creds)
+    Streamlit vuelve a ejecutar app.py en cada interacción; con el registro las credenciales,
+    el cliente de Supabase y el servicio de Drive se construyen en el primer uso y luego se
+    reutilizan. Cada hilo tiene su propia conexión autorizada a Google (httplib2 no se puede
+    compartir entre hilos), que renueva el token de la cuenta de servicio cuando vence.
+
+    Ambos clientes van envueltos en ClienteMedido, que registra la duración de cada llamada.
+
+    Con el secret BACKEND = "local" se usan en su lugar los servicios en memoria de
+    servicios_locales.py (sin red ni credenciales), para medir y perfilar la aplicación.
+    """
+
+    def __init__(self, secrets):
+        self.secrets = secrets
+        self.local_backend = secrets.get("BACKEND", "supabase") == "local"
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self._supabase = None
+        self._creds = None
+        self._drive = None
+
+    @property
+    def supabase(self):
+        with self.lock:
+            if self._supabase is None and self.local_backend:
+                from servicios_locales import SupabaseLocal
+                self._supabase = ClienteMedido(SupabaseLocal.desde_secrets(self.secrets), "supabase")
+            elif self._supabase is None:
+                from supabase import create_client
+                self._supabase = ClienteMedido(create_client(self.secrets["SUPABASE_URL"], self.secrets["SUPABASE_KEY"]), "supabase")
+            return self._supabase
+
+    @property
+    def creds(self):
+        with self.lock:
+            if self._creds is None:
+                from google.oauth2.service_account import Credentials
+                # 🔥 CREDENCIALES DESDE STREAMLIT SECRETS
+                self._creds = Credentials.from_service_account_info(
+                    self.secrets["gcp_service_account"],
+                    scopes=scope
+                )
+            return self._creds
+
+    @property
+    def drive(self):
+        if self.local_backend:
+            with self.lock:
+                if self._drive is None:
+                    from servicios_locales import DriveLocal
+                    self._drive = ClienteMedido(DriveLocal.desde_secrets(self.secrets), "drive")
+                return self._drive
+        creds = self.creds
+        with self.lock:
+            if self._drive is None:
+                from googleapiclient.discovery import build
+                self._drive = ClienteMedido(build("drive", "v3", credentials=creds, cache_discovery=False), "drive")
+            return self._drive
+
+    def http_drive(self):
+        """Conexión autorizada propia del hilo que llama, reutilizada entre peticiones."""
+        if self.local_backend:
+            return None
+        if not hasattr(self.local, "http"):
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            self.local.http = AuthorizedHttp(self.creds, http=httplib2.Http())
+        return self.local.http
+
+
+@st.cache_resource
+def registro_clientes():
+    return RegistroClientes(st.secrets)
+
+clientes = registro_clientes()
+supabase = clientes.supabase
+
+# Carpeta local para cachés persistentes y archivos generados por la aplicación
+DATOS_DIR = Path(st.secrets.get("DATOS_DIR", Path(__file__).parent / ".datos"))
+DATOS_DIR.mkdir(parents=True, exist_ok=True)
 
 
 # =======================================================
@@ -53,11 +333,28 @@ drive_service = build("drive", "v3", credentials=creds)
 #ID unidad real
 SHARED_DRIVE_ID = "0AMe71RDJTYcGUk9PVA"
 
-def obtener_o_crear_carpeta(nombre_carpeta, drive_service):
-    """Busca o crea carpeta en la unidad compartida."""
+# Subidas simultáneas a Drive por envío de formulario
+DRIVE_HILOS = int(st.secrets.get("DRIVE_HILOS", 4))
+# Tamaño de bloque de las subidas reanudables, en MB (Drive exige múltiplos de 256 KB)
+DRIVE_BLOQUE_MB = int(st.secrets.get("DRIVE_BLOQUE_MB", 8))
+DRIVE_REINTENTOS = 5
+# Llamadas por petición batch (límite de Drive: 100) y nombres por consulta "name = ... or ..."
+DRIVE_LOTE = 100
+DRIVE_NOMBRES_CONSULTA = 40
+
+def _http_drive():
+    return clientes.http_drive()
+
+def _texto_drive(valor):
+    """Valor entre comillas para el parámetro q de Drive; \\ y ' se escapan con \\ (si no,
+    Drive rechaza la consulta completa)."""
+    return "'" + str(valor).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def _buscar_carpetas(nombre_carpeta, drive_service):
+    """Carpetas con ese nombre en la unidad compartida, de la más antigua a la más nueva."""
 
     query = (
-        f"name = '{nombre_carpeta}' "
+        f"name = {_texto_drive(nombre_carpeta)} "
         f"and mimeType = 'application/vnd.google-apps.folder' "
         f"and '{SHARED_DRIVE_ID}' in parents "
         f"and trashed = false"
@@ -65,82 +362,330 @@ def obtener_o_crear_carpeta(nombre_carpeta, drive_service):
 
     resultado = drive_service.files().list(
         q=query,
-        spaces='drive',
-        corpora='drive',
+        spaces="drive",
+        corpora="drive",
         driveId=SHARED_DRIVE_ID,
         includeItemsFromAllDrives=True,
         supportsAllDrives=True,
+        orderBy="createdTime",
         fields="files(id, name)"
-    ).execute()
-
-    folders = resultado.get("files", [])
+    ).execute(http=_http_drive())
 
-    if folders:
-        return folders[0]["id"]
+    return resultado.get("files", [])
 
-    metadata = {
-        "name": nombre_carpeta,
-        "mimeType": "application/vnd.google-apps.folder",
-        "parents": [SHARED_DRIVE_ID]
+def obtener_o_crear_carpeta(nombre_carpeta, drive_service):
+    """Busca o crea carpeta en la unidad compartida.
+    Consulta primero la caché de carpetas y la columna DRIVE; la API solo se usa si no se conoce el ID.
+    """
+    carpetas = _carpetas_drive()
+    carpeta_id = carpetas.obtener(nombre_carpeta) or _carpeta_desde_bitacora(nombre_carpeta)
+    if carpeta_id:
+        return carpeta_id
+
+    # Un candado por nombre evita que dos sesiones creen la misma carpeta a la vez
+    with carpetas.candado(nombre_carpeta):
+        carpeta_id = carpetas.obtener(nombre_carpeta)
+        if carpeta_id:
+            return carpeta_id
+
+        folders = _buscar_carpetas(nombre_carpeta, drive_service)
+        if folders:
+            carpeta_id = folders[0]["id"]
+        else:
+            metadata = {
+                "name": nombre_carpeta,
+                "mimeType": "application/vnd.google-apps.folder",
+                "parents": [SHARED_DRIVE_ID]
+            }
+
+            nueva = drive_service.files().create(
+                body=metadata,
+                fields="id",
+                supportsAllDrives=True
+            ).execute(http=_http_drive())
+
+            # Otro proceso pudo crearla al mismo tiempo: se conserva la más antigua y se borra la propia
+            folders = _buscar_carpetas(nombre_carpeta, drive_service)
+            carpeta_id = folders[0]["id"] if folders else nueva["id"]
+            if carpeta_id != nueva["id"]:
+                drive_service.files().delete(
+                    fileId=nueva["id"],
+                    supportsAllDrives=True
+                ).execute(http=_http_drive())
+
+        carpetas.guardar(nombre_carpeta, carpeta_id)
+        return carpeta_id
+
+def _buscar_carpetas_lote(nombres, drive_service):
+    """{nombre: [ids de la más antigua a la más nueva]}, con una consulta por cada DRIVE_NOMBRES_CONSULTA nombres."""
+    encontradas = {}
+    for i in range(0, len(nombres), DRIVE_NOMBRES_CONSULTA):
+        tanda = " or ".join(f"name = {_texto_drive(nombre)}" for nombre in nombres[i:i + DRIVE_NOMBRES_CONSULTA])
+        query = (
+            f"({tanda}) "
+            f"and mimeType = 'application/vnd.google-apps.folder' "
+            f"and '{SHARED_DRIVE_ID}' in parents "
+            f"and trashed = false"
+        )
+        pagina = None
+        while True:
+            resultado = drive_service.files().list(
+                q=query,
+                spaces="drive",
+                corpora="drive",
+                driveId=SHARED_DRIVE_ID,
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                orderBy="createdTime",
+                pageSize=1000,
+                pageToken=pagina,
+                fields="nextPageToken, files(id, name)"
+            ).execute(http=_http_drive())
+            for archivo in resultado.get("files", []):
+                encontradas.setdefault(archivo["name"], []).append(archivo["id"])
+            pagina = resultado.get("nextPageToken")
+            if not pagina:
+                break
+    return encontradas
+
+def _lote_drive(solicitudes, drive_service):
+    """Ejecuta {id: solicitud} en peticiones batch de hasta DRIVE_LOTE llamadas.
+    Devuelve ({id: respuesta}, {id: excepción})."""
+    respuestas, errores = {}, {}
+
+    def recibir(request_id, respuesta, excepcion):
+        if excepcion is None:
+            respuestas[request_id] = respuesta
+        else:
+            errores[request_id] = excepcion
+
+    pendientes = list(solicitudes.items())
+    for i in range(0, len(pendientes), DRIVE_LOTE):
+        lote = drive_service.new_batch_http_request(callback=recibir)
+        for request_id, solicitud in pendientes[i:i + DRIVE_LOTE]:
+            # El batch serializa el HttpRequest original, no el envoltorio que mide el tiempo
+            lote.add(getattr(solicitud, "_objeto", solicitud), request_id=request_id)
+        lote.execute(http=_http_drive())
+    return respuestas, errores
+
+def obtener_o_crear_carpetas(nombres, drive_service):
+    """obtener_o_crear_carpeta para muchos nombres a la vez (carga masiva).
+
+    Los que no están en la caché de carpetas se buscan con una consulta por tanda de nombres y los
+    que faltan se crean en peticiones batch. No se revisa la columna DRIVE: son siniestros nuevos.
+    Devuelve ({nombre: id}, {nombre: error}).
+    """
+    carpetas = _carpetas_drive()
+    ids = {nombre: carpetas.obtener(nombre) for nombre in nombres}
+    faltantes = [nombre for nombre, carpeta_id in ids.items() if not carpeta_id]
+    if not faltantes:
+        return ids, {}
+
+    encontradas = {nombre: lista[0] for nombre, lista in _buscar_carpetas_lote(faltantes, drive_service).items()}
+    nuevas = {
+        nombre: drive_service.files().create(
+            body={
+                "name": nombre,
+                "mimeType": "application/vnd.google-apps.folder",
+                "parents": [SHARED_DRIVE_ID]
+            },
+            fields="id",
+            supportsAllDrives=True
+        )
+        for nombre in faltantes
+        if nombre not in encontradas
     }
-
-    nueva = drive_service.files().create(
-        body=metadata,
-        fields="id",
-        supportsAllDrives=True
-    ).execute()
-
-    return nueva["id"]
+    creadas, errores = _lote_drive(nuevas, drive_service)
+
+    if creadas:
+        # Otro proceso pudo crear alguna al mismo tiempo: se conserva la más antigua y se borran las propias
+        vigentes = _buscar_carpetas_lote(list(creadas), drive_service)
+        sobrantes = {}
+        for nombre, nueva in creadas.items():
+            encontradas[nombre] = vigentes.get(nombre, [nueva["id"]])[0]
+            if encontradas[nombre] != nueva["id"]:
+                sobrantes[nueva["id"]] = drive_service.files().delete(fileId=nueva["id"], supportsAllDrives=True)
+        _lote_drive(sobrantes, drive_service)
+
+    carpetas.guardar_varias(encontradas.items())
+    ids.update(encontradas)
+    return {nombre: carpeta_id for nombre, carpeta_id in ids.items() if carpeta_id}, errores
 
 def obtener_carpeta(nombre_carpeta, drive_service):
     """Busca una carpeta en la unidad compartida.
     Devuelve el ID si existe, o None si no existe.
     """
+    carpetas = _carpetas_drive()
+    carpeta_id = carpetas.obtener(nombre_carpeta) or _carpeta_desde_bitacora(nombre_carpeta)
+    if carpeta_id:
+        return carpeta_id
 
-    query = (
-        f"name = '{nombre_carpeta}' "
-        f"and mimeType = 'application/vnd.google-apps.folder' "
-        f"and '{SHARED_DRIVE_ID}' in parents "
-        f"and trashed = false"
-    )
-
-    resultado = drive_service.files().list(
-        q=query,
-        spaces="drive",
-        corpora="drive",
-        driveId=SHARED_DRIVE_ID,
-        includeItemsFromAllDrives=True,
-        supportsAllDrives=True,
-        fields="files(id, name)"
-    ).execute()
-
-    folders = resultado.get("files", [])
+    folders = _buscar_carpetas(nombre_carpeta, drive_service)
 
     if folders:
+        carpetas.guardar(nombre_carpeta, folders[0]["id"])
         return folders[0]["id"]
 
     return None
 
 
+# =======================================================
+#       CACHÉ PERSISTENTE SINIESTRO -> CARPETA DE DRIVE
+# =======================================================
+def _id_desde_link(link):
+    """ID de carpeta a partir de un link https://drive.google.com/drive/folders/<id>."""
+    coincidencia = re.search(r"/folders/([\w-]+)", link or "")
+    return coincidencia.group(1) if coincidencia else None
+
+class CarpetasDrive:
+    """IDs de carpeta por nombre (SINIESTRO_<n>) guardados en SQLite, para no listar Drive en cada subida.
+    La primera vez se siembra con los links de la columna DRIVE de la bitácora.
+    """
+
+    def __init__(self, ruta):
+        self.lock = threading.Lock()
+        self.candados = {}
+        self.db = sqlite3.connect(ruta, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS carpetas (nombre TEXT PRIMARY KEY, id TEXT NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)")
+        self.db.commit()
+        self.ids = dict(self.db.execute("SELECT nombre, id FROM carpetas"))
+
+    def sembrada(self):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM meta WHERE clave = 'sembrada'").fetchone() is not None
+
+    def sembrar(self, pares):
+        with self.lock:
+            self.db.executemany("INSERT OR IGNORE INTO carpetas (nombre, id) VALUES (?, ?)", pares)
+            self.db.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('sembrada', ?)", (datetime.now().isoformat(),))
+            self.db.commit()
+            self.ids = dict(self.db.execute("SELECT nombre, id FROM carpetas"))
+
+    def obtener(self, nombre):
+        with self.lock:
+            return self.ids.get(nombre)
+
+    def guardar(self, nombre, carpeta_id):
+        with self.lock:
+            self.ids[nombre] = carpeta_id
+            self.db.execute("INSERT OR REPLACE INTO carpetas (nombre, id) VALUES (?, ?)", (nombre, carpeta_id))
+            self.db.commit()
+
+    def guardar_varias(self, pares):
+        pares = list(pares)
+        with self.lock:
+            self.ids.update(pares)
+            self.db.executemany("INSERT OR REPLACE INTO carpetas (nombre, id) VALUES (?, ?)", pares)
+            self.db.commit()
+
+    def candado(self, nombre):
+        with self.lock:
+            return self.candados.setdefault(nombre, threading.Lock())
+
+
+@st.cache_resource
+def _carpetas_drive():
+    carpetas = CarpetasDrive(DATOS_DIR / "carpetas_drive.sqlite3")
+    if not carpetas.sembrada():
+        filas = _descargar_bitacora(_columnas_bitacora(["DRIVE"]))
+        carpetas.sembrar([
+            (f"SINIESTRO_{fila['NUM_SINIESTRO']}", _id_desde_link(fila.get("DRIVE")))
+            for fila in filas
+            if _id_desde_link(fila.get("DRIVE"))
+        ])
+    return carpetas
+
+def _carpeta_desde_bitacora(nombre_carpeta):
+    """Busca el link DRIVE del siniestro en sus eventos (caché por siniestro) y lo guarda si aparece."""
+    if not nombre_carpeta.startswith("SINIESTRO_"):
+        return None
+    for fila in reversed(eventos_siniestro(nombre_carpeta[len("SINIESTRO_"):])):
+        carpeta_id = _id_desde_link(fila.get("DRIVE"))
+        if carpeta_id:
+            _carpetas_drive().guardar(nombre_carpeta, carpeta_id)
+            return carpeta_id
+    return None
+
+
 def subir_archivo_drive(nombre_archivo, contenido, mime_type, folder_id, drive_service):
-    """Sube un archivo dentro de una carpeta en Shared Drive."""
+    """Sube un archivo dentro de una carpeta en Shared Drive.
+    contenido puede ser bytes o un archivo abierto (p. ej. el UploadedFile del formulario), que se
+    envía por bloques sin copiarlo a memoria. Si un bloque falla, la subida se reanuda desde el
+    último bloque confirmado por Drive.
+    """
+    import httplib2
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import MediaIoBaseUpload
 
     file_metadata = {
         "name": nombre_archivo,
         "parents": [folder_id]
     }
 
-    media = MediaIoBaseUpload(io.BytesIO(contenido), mimetype=mime_type)
+    if isinstance(contenido, (bytes, bytearray)):
+        contenido = io.BytesIO(contenido)
+    contenido.seek(0)
+    media = MediaIoBaseUpload(
+        contenido,
+        mimetype=mime_type or "application/octet-stream",
+        chunksize=DRIVE_BLOQUE_MB * 1024 * 1024,
+        resumable=True
+    )
 
-    archivo = drive_service.files().create(
+    solicitud = drive_service.files().create(
         body=file_metadata,
         media_body=media,
         fields="id",
         supportsAllDrives=True
-    ).execute()
+    )
+
+    http = _http_drive()
+    archivo = None
+    fallos = 0
+    while archivo is None:
+        try:
+            _, archivo = solicitud.next_chunk(http=http, num_retries=DRIVE_REINTENTOS)
+            fallos = 0
+        except (HttpError, httplib2.HttpLib2Error, OSError) as e:
+            # Errores 4xx distintos de 408/429 no se arreglan reintentando
+            if isinstance(e, HttpError) and e.resp.status < 500 and e.resp.status not in (408, 429):
+                raise
+            fallos += 1
+            if fallos > DRIVE_REINTENTOS:
+                raise
+            time.sleep(2 ** fallos)
 
     return archivo["id"]
 
+def subir_archivos_drive(archivos, folder_id, drive_service):
+    """Sube varios archivos en paralelo mostrando el avance.
+    Devuelve (archivo, id, error) por archivo, en el mismo orden; un fallo no detiene al resto.
+    """
+    if not archivos:
+        return []
+
+    def subir(archivo):
+        return subir_archivo_drive(archivo.name, archivo, archivo.type, folder_id, drive_service)
+
+    resultados = [None] * len(archivos)
+    barra = st.progress(0.0, text=f"Subiendo archivos 0/{len(archivos)}")
+    with ThreadPoolExecutor(max_workers=DRIVE_HILOS, initializer=_heredar_vista, initargs=(_vista_actual(), threading.get_ident())) as pool:
+        futuros = {pool.submit(subir, archivo): i for i, archivo in enumerate(archivos)}
+        for hechos, futuro in enumerate(as_completed(futuros), start=1):
+            i = futuros[futuro]
+            try:
+                resultados[i] = (archivos[i], futuro.result(), None)
+            except Exception as e:
+                resultados[i] = (archivos[i], None, e)
+            barra.progress(hechos / len(archivos), text=f"Subiendo archivos {hechos}/{len(archivos)}")
+    barra.empty()
+
+    for archivo, _, error in resultados:
+        if error is not None:
+            st.error(f"No se pudo subir {archivo.name}: {error}", icon="🚨")
+    return resultados
+
 # =======================================================
 #                       LOGIN
 # =======================================================
@@ -172,7 +717,8 @@ def login():
             
             registro = response.data[0]
 
-            flag_psw = bcrypt.checkpw(password.encode("utf-8"), registro["PASSWORD"].encode("utf-8"))
+            with medir("bcrypt.checkpw"):
+                flag_psw = bcrypt.checkpw(password.encode("utf-8"), registro["PASSWORD"].encode("utf-8"))
             time.sleep(1)
             if not flag_psw:
                 st.error("Usuario o contraseña incorrectos.")
@@ -232,6 +778,285 @@ def limpiar_y_recargar():
     reset_form_registro()
 
 
+# =======================================================
+#       BANDEJA DE SALIDA (ENVÍOS PROCESADOS EN 2º PLANO)
+# =======================================================
+# Hilos que procesan la bandeja y reintentos antes de marcar un envío con error
+BANDEJA_HILOS = int(st.secrets.get("BANDEJA_HILOS", 2))
+BANDEJA_REINTENTOS = int(st.secrets.get("BANDEJA_REINTENTOS", 8))
+
+class ErrorPermanente(Exception):
+    """Fallo que no se arregla reintentando (p. ej. siniestro ya registrado por otra persona)."""
+
+
+class BandejaSalida:
+    """Envíos de formularios guardados en SQLite y procesados por hilos en segundo plano.
+
+    Cada envío tiene una clave de idempotencia y en `datos` se anota cada paso terminado
+    (carpeta, insert, archivos subidos), así un reintento retoma donde quedó sin repetir nada.
+    Los adjuntos se copian a disco al encolar, por lo que no dependen de la sesión.
+    """
+
+    def __init__(self, ruta, dir_archivos):
+        self.lock = threading.Lock()
+        self.hay_trabajo = threading.Event()
+        self.dir_archivos = dir_archivos
+        self.dir_archivos.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(ruta, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS envios (
+                clave TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                usuario TEXT,
+                siniestro TEXT,
+                datos TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                creado TEXT NOT NULL,
+                actualizado TEXT NOT NULL,
+                proximo REAL NOT NULL DEFAULT 0
+            )
+        """)
+        # Envíos que quedaron a medias si el proceso se detuvo
+        self.db.execute("UPDATE envios SET estado = 'PENDIENTE' WHERE estado = 'EN PROCESO'")
+        self.db.commit()
+
+    def encolar(self, tipo, usuario, siniestro, datos, archivos=None):
+        clave = uuid.uuid4().hex
+        carpeta = self.dir_archivos / clave
+        datos["archivos"] = []
+        for i, archivo in enumerate(archivos or []):
+            carpeta.mkdir(parents=True, exist_ok=True)
+            ruta = carpeta / f"{i}_{Path(archivo.name).name}"
+            archivo.seek(0)
+            with open(ruta, "wb") as destino:
+                shutil.copyfileobj(archivo, destino)
+            datos["archivos"].append({"nombre": archivo.name, "mime": archivo.type, "ruta": str(ruta), "id": None})
+
+        ahora = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO envios (clave, tipo, usuario, siniestro, datos, estado, creado, actualizado) "
+                "VALUES (?, ?, ?, ?, ?, 'PENDIENTE', ?, ?)",
+                (clave, tipo, usuario, str(siniestro), json.dumps(datos), ahora, ahora)
+            )
+            self.db.commit()
+        self.hay_trabajo.set()
+        return clave
+
+    def tomar(self):
+        """Marca EN PROCESO el siguiente envío listo para procesarse y lo devuelve, o None."""
+        with self.lock:
+            fila = self.db.execute(
+                "SELECT clave, tipo, datos, intentos FROM envios "
+                "WHERE estado = 'PENDIENTE' AND proximo <= ? ORDER BY creado LIMIT 1",
+                (time.time(),)
+            ).fetchone()
+            if fila is None:
+                return None
+            self._actualizar(fila[0], estado="EN PROCESO")
+            return {"clave": fila[0], "tipo": fila[1], "datos": json.loads(fila[2]), "intentos": fila[3]}
+
+    def avance(self, clave, datos):
+        """Guarda los pasos ya hechos de un envío."""
+        with self.lock:
+            self._actualizar(clave, datos=json.dumps(datos))
+
+    def completar(self, clave, datos):
+        with self.lock:
+            self._actualizar(clave, estado="COMPLETADO", datos=json.dumps(datos), error=None)
+        shutil.rmtree(self.dir_archivos / clave, ignore_errors=True)
+
+    def fallar(self, clave, intentos, error, permanente=False):
+        with self.lock:
+            if permanente or intentos + 1 >= BANDEJA_REINTENTOS:
+                self._actualizar(clave, estado="ERROR", intentos=intentos + 1, error=str(error))
+            else:
+                espera = min(2 ** intentos * 5, 600)
+                self._actualizar(clave, estado="PENDIENTE", intentos=intentos + 1, error=str(error),
+                                 proximo=time.time() + espera)
+
+    def pendiente(self, tipo, siniestro):
+        """True si hay un envío de ese tipo para el siniestro que todavía no termina."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT 1 FROM envios WHERE tipo = ? AND siniestro = ? AND estado IN ('PENDIENTE', 'EN PROCESO')",
+                (tipo, str(siniestro))
+            ).fetchone() is not None
+
+    def envios_de(self, usuario, limite=10):
+        with self.lock:
+            filas = self.db.execute(
+                "SELECT tipo, siniestro, estado, intentos, error, creado, actualizado FROM envios "
+                "WHERE usuario = ? ORDER BY creado DESC LIMIT ?",
+                (usuario, limite)
+            ).fetchall()
+        columnas = ["TIPO", "SINIESTRO", "ESTADO", "INTENTOS", "ERROR", "CREADO", "ACTUALIZADO"]
+        return [dict(zip(columnas, fila)) for fila in filas]
+
+    def _actualizar(self, clave, **campos):
+        campos["actualizado"] = datetime.now().isoformat(timespec="seconds")
+        asignaciones = ", ".join(f"{campo} = ?" for campo in campos)
+        self.db.execute(f"UPDATE envios SET {asignaciones} WHERE clave = ?", (*campos.values(), clave))
+        self.db.commit()
+
+
+def _ya_insertado(fila):
+    """Idempotencia del insert: el evento ya existe si coinciden siniestro, fecha y estatus."""
+    return bool(
+        supabase
+        .table("BitacoraOperaciones")
+        .select("NUM_SINIESTRO")
+        .eq("NUM_SINIESTRO", fila["NUM_SINIESTRO"])
+        .eq("FECHA_ESTATUS_BITACORA", fila["FECHA_ESTATUS_BITACORA"])
+        .eq("ESTATUS", fila["ESTATUS"])
+        .limit(1)
+        .execute()
+        .data
+    )
+
+def _subir_adjuntos(bandeja, envio, carpeta_id):
+    """Sube los adjuntos que falten y anota el ID de cada uno al terminar."""
+    datos = envio["datos"]
+    pendientes = [a for a in datos["archivos"] if a["id"] is None]
+
+    def subir(adjunto):
+        with open(adjunto["ruta"], "rb") as contenido:
+            return subir_archivo_drive(adjunto["nombre"], contenido, adjunto["mime"], carpeta_id, clientes.drive)
+
+    errores = []
+    with ThreadPoolExecutor(max_workers=DRIVE_HILOS) as pool:
+        futuros = {pool.submit(subir, adjunto): adjunto for adjunto in pendientes}
+        for futuro in as_completed(futuros):
+            try:
+                futuros[futuro]["id"] = futuro.result()
+                bandeja.avance(envio["clave"], datos)
+            except Exception as e:
+                errores.append(f"{futuros[futuro]['nombre']}: {e}")
+    if errores:
+        raise RuntimeError("; ".join(errores))
+    datos["links"] = [f"https://drive.google.com/file/d/{a['id']}/view" for a in datos["archivos"]]
+
+def _sellar_insert(bandeja, envio, fila):
+    """Pone en FECHA_ESTATUS_BITACORA la hora del insert y la guarda antes de hacerlo.
+
+    La hora del formulario queda atrasada si el envío esperó en la bandeja o en los reintentos, y
+    los demás procesos solo vuelven a pedir BITACORA_SOLAPE_MIN minutos por detrás de su marca de
+    agua: un evento más atrasado que eso no lo verían hasta la recarga completa. Sellando aquí el
+    atraso es lo que tarde el insert en confirmarse, bien por debajo del solape. Se guarda en la
+    bandeja antes del insert para que un reintento busque con _ya_insertado esta misma fecha."""
+    fila["FECHA_ESTATUS_BITACORA"] = datetime.now(ZoneInfo("America/Mexico_City")).strftime("%Y-%m-%d %H:%M:%S")
+    bandeja.avance(envio["clave"], envio["datos"])
+
+def _registro_nuevo(fila):
+    """True si el siniestro aún no existe y False si el que existe es el alta de este mismo envío
+    (un reintento). Si otro envío ya registró el número, ErrorPermanente."""
+    existente = (
+        supabase
+        .table("BitacoraOperaciones")
+        .select("FECHA_ESTATUS_BITACORA")
+        .eq("NUM_SINIESTRO", fila["NUM_SINIESTRO"])
+        .limit(1)
+        .execute()
+        .data
+    )
+    if existente and not _ya_insertado(fila):
+        raise ErrorPermanente("El número de siniestro ya se encuentra registrado.")
+    return not existente
+
+def _procesar_registro(bandeja, envio):
+    datos = envio["datos"]
+    fila = datos["fila"]
+
+    if not datos.get("carpeta_id"):
+        # Si el número ya es de otro siniestro no se usa su carpeta
+        _registro_nuevo(fila)
+        datos["carpeta_id"] = obtener_o_crear_carpeta(f"SINIESTRO_{fila['NUM_SINIESTRO']}", clientes.drive)
+        fila["DRIVE"] = f"https://drive.google.com/drive/folders/{datos['carpeta_id']}"
+        bandeja.avance(envio["clave"], datos)
+
+    if not datos.get("insertado"):
+        # Se revisa de nuevo por si otro envío registró el número mientras se creaba la carpeta;
+        # los adjuntos se suben recién cuando el alta es de este envío
+        if _registro_nuevo(fila):
+            _sellar_insert(bandeja, envio, fila)
+            supabase.table("BitacoraOperaciones").insert(fila).execute()
+        datos["insertado"] = True
+        bandeja.avance(envio["clave"], datos)
+        registrar_evento_bitacora(fila)
+
+    _subir_adjuntos(bandeja, envio, datos["carpeta_id"])
+
+def _procesar_seguimiento(bandeja, envio):
+    datos = envio["datos"]
+    fila = datos["fila"]
+
+    if not datos.get("insertado"):
+        if not _ya_insertado(fila):
+            _sellar_insert(bandeja, envio, fila)
+            insertar_eventos([fila])
+        datos["insertado"] = True
+        bandeja.avance(envio["clave"], datos)
+        registrar_evento_bitacora(fila)
+
+    if datos["archivos"]:
+        if not datos.get("carpeta_id"):
+            datos["carpeta_id"] = obtener_o_crear_carpeta(f"SINIESTRO_{fila['NUM_SINIESTRO']}", clientes.drive)
+            bandeja.avance(envio["clave"], datos)
+        _subir_adjuntos(bandeja, envio, datos["carpeta_id"])
+
+PROCESADORES_BANDEJA = {
+    "REGISTRO": _procesar_registro,
+    "SEGUIMIENTO": _procesar_seguimiento,
+}
+
+def _trabajador_bandeja(bandeja, procesadores):
+    while True:
+        envio = bandeja.tomar()
+        if envio is None:
+            bandeja.hay_trabajo.wait(timeout=5)
+            bandeja.hay_trabajo.clear()
+            continue
+        try:
+            procesadores[envio["tipo"]](bandeja, envio)
+        except ErrorPermanente as e:
+            bandeja.fallar(envio["clave"], envio["intentos"], e, permanente=True)
+        except Exception as e:
+            bandeja.fallar(envio["clave"], envio["intentos"], e)
+        else:
+            bandeja.completar(envio["clave"], envio["datos"])
+
+@st.cache_resource
+def _bandeja_salida():
+    """Bandeja del proceso con sus hilos de trabajo, creada una sola vez."""
+    bandeja = BandejaSalida(DATOS_DIR / "bandeja.sqlite3", DATOS_DIR / "bandeja")
+    for i in range(BANDEJA_HILOS):
+        threading.Thread(
+            target=_trabajador_bandeja,
+            args=(bandeja, PROCESADORES_BANDEJA),
+            name=f"bandeja-{i}",
+            daemon=True
+        ).start()
+    return bandeja
+
+ICONOS_ENVIO = {"PENDIENTE": "⏳", "EN PROCESO": "🔄", "COMPLETADO": "✅", "ERROR": "🚨"}
+
+@st.fragment(run_every=3)
+def panel_envios():
+    """Estado de los últimos envíos del usuario; se refresca cada 3 segundos."""
+    envios = _bandeja_salida().envios_de(st.session_state["USUARIO"], limite=5)
+    if not envios:
+        return
+    with st.expander("MIS ENVÍOS", expanded=any(e["ESTADO"] != "COMPLETADO" for e in envios)):
+        for envio in envios:
+            texto = f"{ICONOS_ENVIO.get(envio['ESTADO'], '')} {envio['TIPO']} · SINIESTRO {envio['SINIESTRO']} · {envio['ESTADO']} · {envio['CREADO']}"
+            if envio["ERROR"] and envio["ESTADO"] != "COMPLETADO":
+                texto += f" · {envio['ERROR']}"
+            st.caption(texto)
+
+
 def panel_subir_documentos():
     st.subheader("⬆️ Subir archivos a drive")
     siniestro_id = st.text_input("ESCRIBE NÚMERO DE SINIESTRO")
@@ -240,7 +1065,7 @@ def panel_subir_documentos():
         st.info("Ingresa un número para buscar un siniestro.")
         return
     nombre_carpeta = f"SINIESTRO_{siniestro_id}"
-    carpeta_id = obtener_carpeta(nombre_carpeta, drive_service)
+    carpeta_id = obtener_carpeta(nombre_carpeta, clientes.drive)
     if carpeta_id is None:
         st.warning("⚠️ No existe carpeta para este siniestro, verifica información ingresada")
         return
@@ -252,47 +1077,37 @@ def panel_subir_documentos():
 
         enviado = st.form_submit_button("Cargar archivos",icon="💾",use_container_width=True)
     if enviado:
-        if uploaded_files:
-            for archivo in uploaded_files:
-                subir_archivo_drive(
-                    archivo.name,
-                    archivo.read(),
-                    archivo.type,
-                    carpeta_id,
-                    drive_service
-                )
-        st.toast("Guardando cambios...", icon="⏳",duration=1)
-        time.sleep(1)
+        resultados = subir_archivos_drive(uploaded_files, carpeta_id, clientes.drive)
+        fallidos = [r for r in resultados if r[2] is not None]
+        if fallidos:
+            st.warning(f"Se cargaron {len(resultados) - len(fallidos)} de {len(resultados)} archivos.", icon="⚠️")
+            return
         st.toast("Archivos cargados correctamente", icon="✅")
         st.success("Archivos cargados correctamente", icon="✅")
     
+# Estatus que se pueden agregar en el seguimiento (individual o masivo)
+ESTATUS_OPCIONES = [
+    "ASIGNADO","CLIENTE CONTACTADO","CARGA DOCUMENTAL RECIBIDA",
+    "DESVIADO A FRAUDES","DOCUMENTACIÓN COMPLETA",
+    "EN ESPERA DE PRIMAS, PÓLIZA Y/O SALDO INSOLUTO",
+    "PROPUESTA ECONÓMICA ENVIADA","PROPUESTA ECONÓMICA ACEPTADA",
+    "DERIVADO A CERO KM","DERIVADO A REPOSICIÓN",
+    "EN ESPERA DE PRIMERA FIRMA",
+    "EN ESPERA DE SEGUNDA FIRMA (ROBO)",
+    "EN ESPERA DE LEGALIZACIÓN","DOCUMENTACIÓN LEGALIZADA",
+    "SOLICITUD DE PAGO GENERADA","PAGO LIBERADO",
+    "CIERRE POR DESISTIMIENTO","CIERRE POR RECHAZO",
+    "DERIVADO A PARCIALES"
+]
+
 def panel_seguimiento(siniestro_id):
     st.subheader("📌 Agregar Estatus (Seguimiento)")
-    response = (
-        supabase
-        .table("BitacoraOperaciones")
-        .select("*")
-        .eq("NUM_SINIESTRO",siniestro_id)
-        .execute()
-    )
+    eventos = eventos_siniestro(siniestro_id)
     with st.form("form_seguimiento", clear_on_submit=True):
 
         nuevo_estatus = st.selectbox(
             "ESTATUS",
-            [
-                "Seleccionar estatus",
-                "ASIGNADO","CLIENTE CONTACTADO","CARGA DOCUMENTAL RECIBIDA",
-                "DESVIADO A FRAUDES","DOCUMENTACIÓN COMPLETA",
-                "EN ESPERA DE PRIMAS, PÓLIZA Y/O SALDO INSOLUTO",
-                "PROPUESTA ECONÓMICA ENVIADA","PROPUESTA ECONÓMICA ACEPTADA",
-                "DERIVADO A CERO KM","DERIVADO A REPOSICIÓN",
-                "EN ESPERA DE PRIMERA FIRMA",
-                "EN ESPERA DE SEGUNDA FIRMA (ROBO)",
-                "EN ESPERA DE LEGALIZACIÓN","DOCUMENTACIÓN LEGALIZADA",
-                "SOLICITUD DE PAGO GENERADA","PAGO LIBERADO",
-                "CIERRE POR DESISTIMIENTO","CIERRE POR RECHAZO",
-                "DERIVADO A PARCIALES"
-            ]
+            ["Seleccionar estatus", *ESTATUS_OPCIONES]
         )
 
         comentario = st.text_area("COMENTARIOS", height=120)
@@ -309,7 +1124,7 @@ def panel_seguimiento(siniestro_id):
         if nuevo_estatus == "Seleccionar estatus":
             st.warning("Debes seleccionar un estatus.")
             return
-        ref = response.data[-1]
+        ref = eventos[-1]
         ahora = datetime.now(ZoneInfo("America/Mexico_City"))
 
         ref["FECHA_ESTATUS_BITACORA"] = ahora.strftime("%Y-%m-%d %H:%M:%S")
@@ -318,43 +1133,20 @@ def panel_seguimiento(siniestro_id):
         ref["CORREO_LIQUIDADOR"] = st.session_state["USUARIO"]
         ref["LIQUIDADOR"] = st.session_state["LIQUIDADOR"]
 
-        supabase.table("BitacoraOperaciones").insert(ref).execute()
-
-        if uploaded_files:
-            nombre_carpeta = f"SINIESTRO_{siniestro_id}"
-            carpeta_id = obtener_o_crear_carpeta(nombre_carpeta, drive_service)
+        _bandeja_salida().encolar("SEGUIMIENTO", st.session_state["USUARIO"], siniestro_id, {"fila": ref}, uploaded_files)
 
-            for archivo in uploaded_files:
-                subir_archivo_drive(
-                    archivo.name,
-                    archivo.read(),
-                    archivo.type,
-                    carpeta_id,
-                    drive_service
-                )
-
-        st.session_state["last_load_time"] = 0
-        st.toast("Guardando cambios...", icon="⏳",duration=1)
-        time.sleep(1)
-        st.toast("Estatus agregado correctamente", icon="✅",duration=1)
-        st.success("Estatus agregado correctamente", icon="✅")
-        time.sleep(1)
+        st.toast("Estatus enviado; se guardará en segundo plano", icon="⏳",duration=2)
         st.rerun()
 
 
 def panel_modificar_datos(siniestro_id):
+    import pandas as pd
 
     st.subheader("✏️ Modificar Datos")
 
     # Usamos la primera fila como referencia
-    response = (
-        supabase
-        .table("BitacoraOperaciones")
-        .select("*")
-        .eq("NUM_SINIESTRO",siniestro_id)
-        .execute()
-    )
-    ref = response.data[-1]
+    eventos = eventos_siniestro(siniestro_id)
+    ref = eventos[-1]
     fecha_creacion = ref["FECHA_CREACION"]
     # Campos a editar
     with st.expander("DATOS DEL SINIESTRO", expanded=False):
@@ -394,7 +1186,9 @@ def panel_modificar_datos(siniestro_id):
         patente = st.text_input("Patente", ref["PATENTE"])
 
     if st.button("💾 Guardar cambios", use_container_width=True):
-        supabase.table("BitacoraOperaciones").update({
+        # Con el esquema normalizado los datos del siniestro son una sola fila de Siniestros
+        tabla = "Siniestros" if ESQUEMA_NORMALIZADO else "BitacoraOperaciones"
+        supabase.table(tabla).update({
             "NUM_SINIESTRO": num_siniestro,
             "FECHA_CREACION": fecha_creacion,
             "CORRELATIVO": correlativo,
@@ -426,7 +1220,7 @@ def panel_modificar_datos(siniestro_id):
             "PATENTE": patente
         }).eq("NUM_SINIESTRO", siniestro_id).execute()
 
-        st.session_state["last_load_time"] = 0
+        invalidar_bitacora(siniestro_id)
         st.toast("Guardando cambios...", icon="⏳",duration=1)
         time.sleep(1)
         st.toast("Datos actualizados correctamente", icon="✅",duration=1)
@@ -438,29 +1232,26 @@ def vista_modificar_siniestro():
 
     st.subheader("🔍 Buscar siniestro para actualizar")
 
-    busqueda = st.text_input("ESCRIBE NÚMERO DE SINIESTRO")
+    busqueda = st.text_input("ESCRIBE NÚMERO DE SINIESTRO, PATENTE, RUT, NO. DE SERIE O NOMBRE DEL ASEGURADO")
 
     if not busqueda:
-        st.info("Ingresa un número para buscar un siniestro.")
+        st.info("Ingresa un número de siniestro, patente, RUT, número de serie o nombre para buscar un siniestro.")
+        return
+    busqueda = elegir_siniestro(busqueda, "candidato_actualizar")
+    if busqueda is None:
         return
     try:
-        response = (
-            supabase
-            .table("BitacoraOperaciones")
-            .select("*")
-            .eq("NUM_SINIESTRO", busqueda)
-            .execute()
-        )
+        eventos = eventos_siniestro(busqueda)
     except Exception as e:
         st.error("Error al consultar el siniestro.")
         st.write(e)
         st.stop()
 
-    if not response.data:
+    if not eventos:
         st.error("Siniestro no encontrado.",icon="❌")
         return
     
-    seleccionado = response.data[0].get("NUM_SINIESTRO")
+    seleccionado = eventos[0].get("NUM_SINIESTRO")
 
     if not seleccionado:
         return
@@ -476,6 +1267,7 @@ def vista_modificar_siniestro():
 
     with tab2:
         panel_seguimiento(seleccionado)
+        panel_envios()
 
     if st.button("Volver al inicio", icon="⬅️", use_container_width=True):
         st.session_state.vista = None
@@ -484,8 +1276,54 @@ def vista_modificar_siniestro():
 
 
 
+# Campos que se capturan en un alta (formulario o planilla); el resto los pone fila_alta
+CAMPOS_ALTA = [
+    "NUM_SINIESTRO", "CORRELATIVO", "FECHA_SINIESTRO", "LUGAR_SINIESTRO", "MEDIO", "COBERTURA",
+    "MARCA", "SUBMARCA", "VERSION", "MODELO", "NO_SERIE", "MOTOR", "PATENTE",
+    "NOMBRE_ASEGURADO", "RUT_ASEGURADO", "TIPO_DE_PERSONA_ASEGURADO", "TEL_ASEGURADO",
+    "CORREO_ASEGURADO", "DIRECCION_ASEGURADO",
+    "NOMBRE_PROPIETARIO", "RUT_PROPIETARIO", "TIPO_DE_PERSONA_PROPIETARIO", "TEL_PROPIETARIO",
+    "CORREO_PROPIETARIO", "DIRECCION_PROPIETARIO",
+]
+EMAIL_REGEX = r"^[\w\.-]+@[\w\.-]+\.\w+$"
+
+def validar_siniestro(datos):
+    """Errores de captura de un alta; las mismas reglas para el formulario y la carga masiva."""
+    errores = []
+
+    if not datos.get("NUM_SINIESTRO"):
+        errores.append("El número de siniestro es obligatorio.")
+
+    correo = datos.get("CORREO_ASEGURADO")
+    if correo and not re.match(EMAIL_REGEX, correo):
+        errores.append("El correo del asegurado no es válido.")
+
+    fecha = datos.get("FECHA_SINIESTRO")
+    if fecha:
+        try:
+            datetime.strptime(fecha, "%Y-%m-%d")
+        except ValueError:
+            errores.append("La fecha del siniestro no es válida.")
+
+    return errores
+
+def fila_alta(datos, usuario, liquidador):
+    """Fila de ALTA SINIESTRO: los CAMPOS_ALTA capturados más fechas, estatus y liquidador."""
+    ahora = datetime.now(ZoneInfo("America/Mexico_City"))
+    fila = {campo: datos.get(campo, "") for campo in CAMPOS_ALTA}
+    fila.update({
+        "FECHA_CREACION": ahora.strftime("%Y-%m-%d"),
+        "FECHA_ESTATUS_BITACORA": ahora.strftime("%Y-%m-%d %H:%M:%S"),
+        "ESTATUS": "ALTA SINIESTRO",
+        "LIQUIDADOR": liquidador,
+        "CORREO_LIQUIDADOR": usuario,
+        "DRIVE": None
+    })
+    return fila
+
 def registro_siniestro():
     st.header("Registro de nuevo siniestro")
+    panel_envios()
 
     with st.form("form_siniestro",clear_on_submit=True):
 
@@ -580,45 +1418,11 @@ def registro_siniestro():
                 .execute()
             )
 
-            if response.data:
+            if response.data or _bandeja_salida().pendiente("REGISTRO", Siniestro):
                 st.toast("El número de expediente ya se encuentra registrado. Use un ID diferente o revise la pestaña “Modificar datos”.", icon="🚨",duration=3)
                 return
 
-            errores = []
-
-            if not Siniestro:
-                errores.append("El número de siniestro es obligatorio.")
-
-            email_regex = r"^[\w\.-]+@[\w\.-]+\.\w+$"
-            if Asegurado_Correo and not re.match(email_regex, Asegurado_Correo):
-                errores.append("El correo del asegurado no es válido.")
-
-            if errores:
-                st.error("Revisa lo siguiente:\n- " + "\n- ".join(errores))
-                return
-            
-            # Usuario login desde session_state
-            Usuario_Login = st.session_state["USUARIO"]
-            Liquidador_Nombre = st.session_state["LIQUIDADOR"]
-
-            # Crear carpeta en drive
-            carpeta_id = obtener_o_crear_carpeta(f"SINIESTRO_{Siniestro}", drive_service)
-            carpeta_link = f"https://drive.google.com/drive/folders/{carpeta_id}"
-
-            # Subir archivos
-            links_archivos = []
-            if archivos:
-                for archivo in archivos:
-                    archivo_id = subir_archivo_drive(
-                        archivo.name,
-                        archivo.read(),
-                        archivo.type,
-                        carpeta_id,
-                        drive_service
-                    )
-                    links_archivos.append(f"https://drive.google.com/file/d/{archivo_id}/view")
-
-            supabase.table("BitacoraOperaciones").insert({
+            datos = {
                 "NUM_SINIESTRO": Siniestro,
                 "CORRELATIVO": Correlativo,
                 "FECHA_SINIESTRO": FechaSiniestro.strftime("%Y-%m-%d"),
@@ -632,9 +1436,6 @@ def registro_siniestro():
                 "NO_SERIE": Serie,
                 "MOTOR": Motor,
                 "PATENTE": Patente,
-                "FECHA_CREACION": datetime.now(ZoneInfo("America/Mexico_City")).strftime("%Y-%m-%d"),
-                "FECHA_ESTATUS_BITACORA": datetime.now(ZoneInfo("America/Mexico_City")).strftime("%Y-%m-%d %H:%M:%S"),
-                "ESTATUS": "ALTA SINIESTRO",
                 "NOMBRE_ASEGURADO": Asegurado_Nombre,
                 "RUT_ASEGURADO": Asegurado_Rut,
                 "TIPO_DE_PERSONA_ASEGURADO": Asegurado_Tipo,
@@ -646,89 +1447,141 @@ def registro_siniestro():
                 "TIPO_DE_PERSONA_PROPIETARIO": Propietario_Tipo,
                 "TEL_PROPIETARIO": Propietario_Telefono,
                 "CORREO_PROPIETARIO": Propietario_Correo,
-                "DIRECCION_PROPIETARIO": Propietario_Direccion,
-                "LIQUIDADOR": Liquidador_Nombre,
-                "CORREO_LIQUIDADOR": Usuario_Login,
-                "DRIVE": carpeta_link
-            }).execute()
+                "DIRECCION_PROPIETARIO": Propietario_Direccion
+            }
 
-            st.toast("Guardando cambios...", icon="⏳",duration=1)
-            time.sleep(1)
-            st.toast("Siniestro registrado correctamente", icon="✅")
+            errores = validar_siniestro(datos)
+
+            if errores:
+                st.error("Revisa lo siguiente:\n- " + "\n- ".join(errores))
+                return
+            
+            # Usuario login desde session_state
+            Usuario_Login = st.session_state["USUARIO"]
+            Liquidador_Nombre = st.session_state["LIQUIDADOR"]
+
+            # La carpeta de drive, los archivos y el insert los hace la bandeja de salida
+            fila = fila_alta(datos, Usuario_Login, Liquidador_Nombre)
+            _bandeja_salida().encolar("REGISTRO", Usuario_Login, Siniestro, {"fila": fila}, archivos)
+
+            st.toast("Siniestro enviado; se registrará en segundo plano", icon="⏳")
            #st.success("Siniestro registrado correctamente", icon="✅",width=30)
 
+# Nombres de columna que se muestran en pantallas y descargas
+COLUMNAS_VISIBLES = {
+    "NUM_SINIESTRO":"# DE SINIESTRO",
+    "CORRELATIVO":"CORRELATIVO",
+    "FECHA_SINIESTRO":"FECHA SINIESTRO",
+    "LUGAR_SINIESTRO":"LUGAR SINIESTRO",
+    "MEDIO":"MEDIO ASIGNACIÓN",
+    "COBERTURA":"COBERTURA",
+    "MARCA":"MARCA",
+    "SUBMARCA":"SUBMARCA",
+    "VERSION":"VERSIÓN",
+    "MODELO":"AÑO/MODELO",
+    "NO_SERIE":"NO. SERIE",
+    "MOTOR":"MOTOR",
+    "PATENTE":"PATENTE",
+    "FECHA_CREACION":"FECHA CREACIÓN",
+    "FECHA_ESTATUS_BITACORA":"FECHA ESTATUS BITÁCORA",
+    "ESTATUS":"ESTATUS",
+    "NOMBRE_ASEGURADO":"NOMBRE ASEGURADO",
+    "RUT_ASEGURADO":"RUT ASEGURADO",
+    "TIPO_DE_PERSONA_ASEGURADO":"TIPO DE PERSONA ASEGURADO",
+    "TEL_ASEGURADO":"TEL. ASEGURADO",
+    "CORREO_ASEGURADO":"CORREO ASEGURADO",
+    "DIRECCION_ASEGURADO":"DIRECCIÓN ASEGURADO",
+    "NOMBRE_PROPIETARIO":"NOMBRE PROPIETARIO",
+    "RUT_PROPIETARIO":"RUT PROPIETARIO",
+    "TIPO_DE_PERSONA_PROPIETARIO":"TIPO DE PERSONA PROPIETARIO",
+    "TEL_PROPIETARIO":"TEL. PROPIETARIO",
+    "CORREO_PROPIETARIO":"CORREO PROPIETARIO",
+    "DIRECCION_PROPIETARIO":"DIRECCIÓN PROPIETARIO",
+    "LIQUIDADOR":"LIQUIDADOR",
+    "CORREO_LIQUIDADOR":"CORREO LIQUIDADOR",
+    "DRIVE":"DRIVE",
+    "COMENTARIO":"COMENTARIO"
+}
+
+def elegir_siniestro(consulta, key):
+    """NUM_SINIESTRO para lo que escribió el usuario, o None mientras no elija un candidato. Si es
+    un número de siniestro se usa directo; si no, se elige entre los candidatos del índice de
+    búsqueda, sin ninguno marcado de antemano. Sin candidatos se devuelve la consulta tal cual,
+    para la búsqueda exacta de siempre."""
+    consulta = consulta.strip()
+    try:
+        candidatos = buscar_siniestros(consulta)
+    except Exception:
+        candidatos = []
+    if not candidatos:
+        return consulta
+
+    numeros = [str(fila["NUM_SINIESTRO"]) for fila, _ in candidatos]
+    for numero in numeros:
+        if normalizar_busqueda(numero) == normalizar_busqueda(consulta):
+            return numero
+    # "4000001" también es el comienzo de "40000010": si el número existe tal cual (aunque la
+    # copia del índice todavía no lo tenga) se abre ese en lugar de ofrecer los que empiezan igual
+    if len(consulta.split()) == 1:
+        try:
+            if eventos_siniestro(consulta):
+                return consulta
+        except Exception:
+            pass
+
+    opciones = {}
+    for numero, (fila, campos) in zip(numeros, candidatos):
+        detalle = " · ".join(str(fila[c]) for c in ("PATENTE", "NOMBRE_ASEGURADO", "ESTATUS") if fila.get(c))
+        coincide = ", ".join(COLUMNAS_VISIBLES.get(c, c) for c in campos)
+        opciones[f"{numero} · {detalle} (coincide en {coincide})"] = numero
+    elegido = st.selectbox(
+        f"SINIESTROS ENCONTRADOS ({len(candidatos)}{'+' if len(candidatos) >= BUSQUEDA_LIMITE else ''})",
+        list(opciones),
+        index=None,
+        placeholder="Elige un siniestro",
+        key=key
+    )
+    return opciones.get(elegido)
+
 def vista_buscar_siniestro():
+    import pandas as pd
 
     st.subheader("🔎 Buscar siniestro")
 
-    siniestro = st.text_input("ESCRIBE NÚMERO DE SINIESTRO:")
+    consulta = st.text_input("ESCRIBE NÚMERO DE SINIESTRO, PATENTE, RUT, NO. DE SERIE O NOMBRE DEL ASEGURADO:")
+    siniestro = elegir_siniestro(consulta, "candidato_buscar") if consulta else consulta
 
     if st.button("Buscar", icon="🔎", use_container_width=True):
         
+        if siniestro is None:
+            st.warning("Elige uno de los siniestros encontrados.")
+            return
         if not siniestro:
             st.warning("Ingresa un número de siniestro.")
             return
         try:
-            response = (
-                supabase
-                .table("BitacoraOperaciones")
-                .select("*")
-                .eq("NUM_SINIESTRO", siniestro)
-                .execute()
-            )
+            eventos = eventos_siniestro(siniestro)
         except Exception as e:
             st.error("Error al consultar el siniestro.")
             st.write(e)
             st.stop()
 
-        if not response.data:
+        if not eventos:
             st.error("Siniestro no encontrado.",icon="❌")
             return
 
-        resultado = pd.DataFrame(response.data)
+        with medir("pandas.buscar_siniestro"):
+            resultado = pd.DataFrame(eventos)
 
         if resultado.empty:
             st.error("❌ Siniestro no encontrado.")
             return
-        resultado.rename(columns={
-            "NUM_SINIESTRO":"# DE SINIESTRO",
-            "CORRELATIVO":"CORRELATIVO",
-            "FECHA_SINIESTRO":"FECHA SINIESTRO",
-            "LUGAR_SINIESTRO":"LUGAR SINIESTRO",
-            "MEDIO":"MEDIO ASIGNACIÓN",
-            "COBERTURA":"COBERTURA",
-            "MARCA":"MARCA",
-            "SUBMARCA":"SUBMARCA",
-            "VERSION":"VERSIÓN",
-            "MODELO":"AÑO/MODELO",
-            "NO_SERIE":"NO. SERIE",
-            "MOTOR":"MOTOR",
-            "PATENTE":"PATENTE",
-            "FECHA_CREACION":"FECHA CREACIÓN",
-            "FECHA_ESTATUS_BITACORA":"FECHA ESTATUS BITÁCORA",
-            "ESTATUS":"ESTATUS",
-            "NOMBRE_ASEGURADO":"NOMBRE ASEGURADO",
-            "RUT_ASEGURADO":"RUT ASEGURADO",
-            "TIPO_DE_PERSONA_ASEGURADO":"TIPO DE PERSONA ASEGURADO",
-            "TEL_ASEGURADO":"TEL. ASEGURADO",
-            "CORREO_ASEGURADO":"CORREO ASEGURADO",
-            "DIRECCION_ASEGURADO":"DIRECCIÓN ASEGURADO",
-            "NOMBRE_PROPIETARIO":"NOMBRE PROPIETARIO",
-            "RUT_PROPIETARIO":"RUT PROPIETARIO",
-            "TIPO_DE_PERSONA_PROPIETARIO":"TIPO DE PERSONA PROPIETARIO",
-            "TEL_PROPIETARIO":"TEL. PROPIETARIO",
-            "CORREO_PROPIETARIO":"CORREO PROPIETARIO",
-            "DIRECCION_PROPIETARIO":"DIRECCIÓN PROPIETARIO",
-            "LIQUIDADOR":"LIQUIDADOR",
-            "CORREO_LIQUIDADOR":"CORREO LIQUIDADOR",
-            "DRIVE":"DRIVE",
-            "COMENTARIO":"COMENTARIO"
-        },inplace=True)
-
-        
-        resultado["FECHA ESTATUS BITÁCORA"] = pd.to_datetime(resultado["FECHA ESTATUS BITÁCORA"], errors="coerce")
-        resultado = resultado.sort_values(by=["FECHA ESTATUS BITÁCORA"],ascending=[True])
-        Ultimo_estatus = resultado.iloc[-1]["ESTATUS"]
+        with medir("pandas.buscar_siniestro"):
+            resultado.rename(columns=COLUMNAS_VISIBLES,inplace=True)
+            resultado["FECHA ESTATUS BITÁCORA"] = pd.to_datetime(resultado["FECHA ESTATUS BITÁCORA"], errors="coerce")
+            resultado = resultado.sort_values(by=["FECHA ESTATUS BITÁCORA"],ascending=[True])
+        # El último de los eventos ya leídos, con el mismo orden que el modelo de último estatus
+        Ultimo_estatus = sorted(eventos, key=_clave_fecha)[-1]["ESTATUS"]
         st.success(f"Último estatus registrado: {Ultimo_estatus}")
         st.info("Registro de operaciones completo:")
         st.dataframe(resultado, use_container_width=True, hide_index=True)
@@ -753,29 +1606,1445 @@ def vista_buscar_siniestro():
     if st.button("Volver al inicio", icon="⬅️",use_container_width=True):
         st.session_state.vista = None
         st.rerun()
-def fetch_all_bitacora():
-    all_rows = []
-    start = 0
-    step = 1000
+# =======================================================
+#          CARGA MASIVA DE SINIESTROS (PLANILLA)
+# =======================================================
+# Filas por insert multi-fila y por consulta .in_ de duplicados
+CARGA_LOTE = int(st.secrets.get("CARGA_LOTE", 100))
+CARGA_MAX_FILAS = int(st.secrets.get("CARGA_MAX_FILAS", 1000))
+ICONOS_CARGA = {"REGISTRADO": "✅", "DUPLICADO": "⚠️", "ERROR": "🚨"}
+
+def _fecha_planilla(valor):
+    """AAAA-MM-DD a partir de la celda (fecha de Excel, ISO o DD/MM/AAAA). Si no se reconoce se deja
+    tal cual para que validar_siniestro la rechace; vacía queda en None."""
+    if not valor:
+        return None
+    for formato in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(valor, formato).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return valor
+
+def leer_planilla(archivo):
+    """Filas de una planilla xlsx, xls o csv como [(fila en la planilla, datos)] con los nombres de
+    CAMPOS_ALTA, más los encabezados que no se reconocieron. Los encabezados valen con el nombre
+    interno o el visible, sin importar mayúsculas, tildes ni signos; las filas vacías se omiten."""
+    import pandas as pd
+
+    if archivo.name.lower().endswith(".csv"):
+        df = pd.read_csv(archivo, dtype=str, keep_default_na=False, sep=None, engine="python", encoding="utf-8-sig")
+    else:
+        df = pd.read_excel(archivo, dtype=str).fillna("")
+
+    encabezados = {}
+    for campo in CAMPOS_ALTA:
+        encabezados[normalizar_busqueda(COLUMNAS_VISIBLES.get(campo, campo))] = campo
+        encabezados[normalizar_busqueda(campo)] = campo
+    columnas = {columna: encabezados.get(normalizar_busqueda(columna)) for columna in df.columns}
+    ignoradas = [str(columna) for columna, campo in columnas.items() if campo is None]
+
+    filas = []
+    for numero, registro in enumerate(df.to_dict("records"), start=2):
+        datos = {campo: str(registro[columna]).strip() for columna, campo in columnas.items() if campo}
+        if not any(datos.values()):
+            continue
+        datos["FECHA_SINIESTRO"] = _fecha_planilla(datos.get("FECHA_SINIESTRO"))
+        filas.append((numero, datos))
+    return filas, ignoradas
+
+def _siniestros_registrados(numeros):
+    """Los NUM_SINIESTRO de `numeros` que ya tienen eventos en la bitácora (una consulta por CARGA_LOTE)."""
+    registrados = set()
+    for i in range(0, len(numeros), CARGA_LOTE):
+        respuesta = (
+            supabase
+            .table("BitacoraOperaciones")
+            .select("NUM_SINIESTRO")
+            .in_("NUM_SINIESTRO", numeros[i:i + CARGA_LOTE])
+            .execute()
+        )
+        registrados.update(str(fila["NUM_SINIESTRO"]) for fila in respuesta.data)
+    return registrados
 
-    while True:
-        response = (
+def registrar_carga_masiva(filas, usuario, liquidador):
+    """Da de alta las filas de leer_planilla y devuelve el reporte por fila (FILA, NUM_SINIESTRO,
+    RESULTADO, DETALLE).
+
+    Cada fila pasa por validar_siniestro; los duplicados se buscan dentro del archivo, en la
+    bitácora con una sola consulta .in_ y en la bandeja de salida. Las carpetas de Drive se crean
+    por lotes y los inserts van de CARGA_LOTE filas. Un lote que falla marca solo sus filas.
+    """
+    reporte = []
+    validas = []
+    vistos = {}
+    for numero, datos in filas:
+        siniestro = datos.get("NUM_SINIESTRO", "")
+        errores = validar_siniestro(datos)
+        if siniestro in vistos:
+            errores.append(f"El número de siniestro se repite en la fila {vistos[siniestro]}.")
+        elif siniestro:
+            vistos[siniestro] = numero
+        entrada = {"FILA": numero, "NUM_SINIESTRO": siniestro, "RESULTADO": "ERROR", "DETALLE": " ".join(errores)}
+        reporte.append(entrada)
+        if not errores:
+            validas.append((entrada, datos))
+
+    registrados = _siniestros_registrados([datos["NUM_SINIESTRO"] for _, datos in validas])
+    bandeja = _bandeja_salida()
+    pendientes = []
+    for entrada, datos in validas:
+        if datos["NUM_SINIESTRO"] in registrados or bandeja.pendiente("REGISTRO", datos["NUM_SINIESTRO"]):
+            entrada.update(RESULTADO="DUPLICADO", DETALLE="El número de siniestro ya se encuentra registrado.")
+        else:
+            pendientes.append((entrada, fila_alta(datos, usuario, liquidador)))
+    if not pendientes:
+        return reporte
+
+    nombres = [f"SINIESTRO_{fila['NUM_SINIESTRO']}" for _, fila in pendientes]
+    try:
+        carpetas, errores_drive = obtener_o_crear_carpetas(nombres, clientes.drive)
+    except Exception as e:
+        carpetas, errores_drive = {}, dict.fromkeys(nombres, e)
+
+    por_insertar = []
+    for nombre, (entrada, fila) in zip(nombres, pendientes):
+        if nombre in carpetas:
+            fila["DRIVE"] = f"https://drive.google.com/drive/folders/{carpetas[nombre]}"
+            por_insertar.append((entrada, fila))
+        else:
+            entrada["DETALLE"] = f"No se pudo crear la carpeta de Drive: {errores_drive.get(nombre)}"
+
+    for i in range(0, len(por_insertar), CARGA_LOTE):
+        lote = por_insertar[i:i + CARGA_LOTE]
+        try:
+            supabase.table("BitacoraOperaciones").insert([fila for _, fila in lote]).execute()
+        except Exception as e:
+            for entrada, _ in lote:
+                entrada["DETALLE"] = f"No se pudo registrar: {e}"
+            continue
+        for entrada, fila in lote:
+            registrar_evento_bitacora(fila)
+            entrada.update(RESULTADO="REGISTRADO", DETALLE=fila["DRIVE"])
+    return reporte
+
+def mostrar_reporte(reporte, iconos, nombre_archivo):
+    """Resumen por RESULTADO, tabla y descarga en Excel de un reporte por fila."""
+    import pandas as pd
+
+    conteo = Counter(entrada["RESULTADO"] for entrada in reporte)
+    st.info(" · ".join(f"{iconos[r]} {r}: {conteo[r]}" for r in iconos if conteo[r]))
+    st.dataframe(
+        pd.DataFrame(reporte).rename(columns=COLUMNAS_VISIBLES),
+        use_container_width=True,
+        hide_index=True
+    )
+    destino = io.BytesIO()
+    escribir_excel(destino, [reporte])
+    st.download_button(
+        "Descargar reporte",
+        data=destino.getvalue(),
+        file_name=nombre_archivo,
+        mime=EXCEL_MIME,
+        icon="📥"
+    )
+
+def _plantilla_carga():
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    _encabezado_excel(wb.create_sheet("SINIESTROS"), CAMPOS_ALTA)
+    destino = io.BytesIO()
+    wb.save(destino)
+    return destino.getvalue()
+
+def vista_carga_masiva():
+    import pandas as pd
+
+    st.subheader("📑 Carga masiva de siniestros")
+    st.caption(
+        "Una fila por siniestro con los encabezados de la plantilla. Se aplican las mismas "
+        "validaciones que en el registro individual; los siniestros ya registrados se omiten."
+    )
+    st.download_button(
+        "Descargar plantilla",
+        data=_plantilla_carga(),
+        file_name="Plantilla_Carga_Siniestros.xlsx",
+        mime=EXCEL_MIME,
+        icon="📄"
+    )
+
+    archivo = st.file_uploader("Planilla de siniestros", type=["xlsx", "xls", "csv"], key="carga_masiva_archivo")
+    if archivo is not None:
+        try:
+            filas, ignoradas = leer_planilla(archivo)
+        except Exception as e:
+            st.error("No se pudo leer la planilla.")
+            st.write(e)
+            return
+
+        if ignoradas:
+            st.warning(f"Columnas no reconocidas (se ignoran): {', '.join(ignoradas)}")
+        if not filas:
+            st.warning("La planilla no tiene filas con datos.")
+        elif len(filas) > CARGA_MAX_FILAS:
+            st.error(f"La planilla tiene {len(filas)} filas; el máximo por carga es {CARGA_MAX_FILAS}.")
+        else:
+            st.dataframe(
+                pd.DataFrame([datos for _, datos in filas]).rename(columns=COLUMNAS_VISIBLES),
+                use_container_width=True,
+                hide_index=True
+            )
+            if st.button(f"Registrar {len(filas)} siniestros", icon="💾", use_container_width=True):
+                with st.spinner("Registrando siniestros..."):
+                    reporte = registrar_carga_masiva(filas, st.session_state["USUARIO"], st.session_state["LIQUIDADOR"])
+                st.session_state["carga_masiva_reporte"] = (archivo.file_id, reporte)
+
+        # El reporte se conserva entre recargas mientras siga cargado el mismo archivo
+        file_id, reporte = st.session_state.get("carga_masiva_reporte", (None, None))
+        if reporte and file_id == archivo.file_id:
+            mostrar_reporte(reporte, ICONOS_CARGA, "Reporte_Carga_Masiva.xlsx")
+
+    if st.button("Volver al inicio", icon="⬅️", use_container_width=True):
+        st.session_state.vista = None
+        st.rerun()
+
+# =======================================================
+#          ACTUALIZACIÓN MASIVA DE ESTATUS
+# =======================================================
+ICONOS_ESTATUS_MASIVO = {"ACTUALIZADO": "✅", "SIN CAMBIO": "➖", "NO ENCONTRADO": "⚠️", "ERROR": "🚨"}
+
+def actualizar_estatus_masivo(siniestros, estatus, comentario, usuario, liquidador):
+    """Agrega `estatus` a cada siniestro copiando su última fila, como panel_seguimiento, y
+    devuelve el reporte por siniestro (NUM_SINIESTRO, ESTATUS_ANTERIOR, RESULTADO, DETALLE).
+
+    Las últimas filas se leen juntas con ultimos_eventos y todos los eventos nuevos se insertan
+    en un solo insert multi-fila. Los siniestros que ya tienen ese estatus no se repiten.
+    """
+    ultimos = ultimos_eventos(siniestros)
+    ahora = datetime.now(ZoneInfo("America/Mexico_City")).strftime("%Y-%m-%d %H:%M:%S")
+
+    reporte = []
+    nuevas = []
+    for siniestro in siniestros:
+        ref = ultimos.get(siniestro)
+        entrada = {
+            "NUM_SINIESTRO": siniestro,
+            "ESTATUS_ANTERIOR": ref.get("ESTATUS") if ref else None,
+            "RESULTADO": "NO ENCONTRADO",
+            "DETALLE": ""
+        }
+        reporte.append(entrada)
+        if ref is None:
+            entrada["DETALLE"] = "El siniestro no existe en la bitácora."
+        elif ref.get("ESTATUS") == estatus:
+            entrada.update(RESULTADO="SIN CAMBIO", DETALLE="El siniestro ya tiene ese estatus.")
+        else:
+            fila = dict(ref)
+            fila["FECHA_ESTATUS_BITACORA"] = ahora
+            fila["ESTATUS"] = estatus
+            fila["COMENTARIO"] = comentario
+            fila["CORREO_LIQUIDADOR"] = usuario
+            fila["LIQUIDADOR"] = liquidador
+            nuevas.append((entrada, fila))
+
+    if not nuevas:
+        return reporte
+    try:
+        insertar_eventos([fila for _, fila in nuevas])
+    except Exception as e:
+        for entrada, _ in nuevas:
+            entrada.update(RESULTADO="ERROR", DETALLE=f"No se pudo registrar: {e}")
+        return reporte
+    for entrada, fila in nuevas:
+        registrar_evento_bitacora(fila)
+        entrada.update(RESULTADO="ACTUALIZADO", DETALLE=ahora)
+    return reporte
+
+def vista_estatus_masivo():
+    st.subheader("📌 Actualización masiva de estatus")
+
+    texto = st.text_area(
+        "NÚMEROS DE SINIESTRO (uno por línea, o separados por coma o espacio)",
+        height=160,
+        key="masivo_siniestros"
+    )
+    siniestros = list(dict.fromkeys(s for s in re.split(r"[\s,;]+", texto) if s))
+    nuevo_estatus = st.selectbox("ESTATUS", ["Seleccionar estatus", *ESTATUS_OPCIONES], key="masivo_estatus")
+    comentario = st.text_area("COMENTARIOS", height=120, key="masivo_comentario")
+
+    if st.button(f"Agregar estatus a {len(siniestros)} siniestros", icon="💾", use_container_width=True):
+        if not siniestros:
+            st.warning("Ingresa al menos un número de siniestro.")
+        elif nuevo_estatus == "Seleccionar estatus":
+            st.warning("Debes seleccionar un estatus.")
+        elif len(siniestros) > CARGA_MAX_FILAS:
+            st.error(f"Son {len(siniestros)} siniestros; el máximo por actualización es {CARGA_MAX_FILAS}.")
+        else:
+            with st.spinner("Actualizando estatus..."):
+                st.session_state["estatus_masivo_reporte"] = actualizar_estatus_masivo(
+                    siniestros,
+                    nuevo_estatus,
+                    comentario,
+                    st.session_state["USUARIO"],
+                    st.session_state["LIQUIDADOR"]
+                )
+
+    reporte = st.session_state.get("estatus_masivo_reporte")
+    if reporte:
+        mostrar_reporte(reporte, ICONOS_ESTATUS_MASIVO, "Reporte_Estatus_Masivo.xlsx")
+
+    if st.button("Volver al inicio", icon="⬅️", use_container_width=True):
+        st.session_state.vista = None
+        st.rerun()
+
+# =======================================================
+#        CACHÉ DE EVENTOS POR SINIESTRO (LRU COMPARTIDA)
+# =======================================================
+# Siniestros cuyos eventos se conservan en memoria
+SINIESTROS_CACHE_MAX = int(st.secrets.get("SINIESTROS_CACHE_MAX", 256))
+
+class CacheSiniestros:
+    """Eventos de cada NUM_SINIESTRO ordenados por fecha, con desalojo LRU y vencimiento por BITACORA_TTL."""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self.lock = threading.Lock()
+        self.entradas = OrderedDict()
+
+    def obtener(self, siniestro):
+        clave = str(siniestro)
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is not None and time.monotonic() - entrada[0] <= BITACORA_TTL:
+                self.entradas.move_to_end(clave)
+                return entrada[1]
+
+        filas = (
             supabase
             .table("BitacoraOperaciones")
             .select("*")
-            .range(start, start + step - 1)
+            .eq("NUM_SINIESTRO", siniestro)
+            .order("FECHA_ESTATUS_BITACORA")
             .execute()
+            .data
+        )
+        with self.lock:
+            self.entradas[clave] = (time.monotonic(), filas)
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.maximo:
+                self.entradas.popitem(last=False)
+        return filas
+
+    def invalidar(self, siniestro):
+        with self.lock:
+            self.entradas.pop(str(siniestro), None)
+
+
+@st.cache_resource
+def _cache_siniestros():
+    return CacheSiniestros(SINIESTROS_CACHE_MAX)
+
+def eventos_siniestro(siniestro):
+    """Eventos de un siniestro (lista vacía si no existe). Devuelve copias que se pueden modificar."""
+    return [dict(fila) for fila in _cache_siniestros().obtener(siniestro)]
+
+
+# =======================================================
+#      SINCRONIZACIÓN DE LA BITÁCORA (TODAS LAS SESIONES)
+# =======================================================
+# Segundos que se reutiliza la copia local antes de pedir cambios a Supabase
+BITACORA_TTL = int(st.secrets.get("BITACORA_TTL", 60))
+# Minutos que se vuelven a pedir por detrás de la marca de agua, para no perder
+# eventos guardados con una hora apenas anterior a la marca (latencia, relojes). Los envíos de
+# la bandeja se sellan al insertar (_sellar_insert) para quedar dentro de este margen.
+BITACORA_SOLAPE_MIN = int(st.secrets.get("BITACORA_SOLAPE_MIN", 2))
+# Minutos entre recargas completas; cubren ediciones hechas desde otros procesos
+BITACORA_RECARGA_MIN = int(st.secrets.get("BITACORA_RECARGA_MIN", 30))
+# Usar las vistas y la función kpis_dashboard de sql/001_agregados_dashboard.sql en lugar de
+# calcular los agregados sobre la copia local. Si la consulta falla se vuelve a la copia local.
+DASHBOARD_RPC = bool(st.secrets.get("DASHBOARD_RPC", False))
+
+def _clave_fecha(fila):
+    """FECHA_ESTATUS_BITACORA normalizada como texto 'YYYY-MM-DD HH:MM:SS' para ordenar y comparar."""
+    valor = fila.get("FECHA_ESTATUS_BITACORA")
+    if not valor:
+        return ""
+    return str(valor).replace("T", " ")[:19]
+
+
+# Estatus con los que un siniestro se considera cerrado
+ESTATUS_CIERRE = [
+    "PAGO LIBERADO",
+    "CIERRE POR DESISTIMIENTO",
+    "CIERRE POR RECHAZO",
+    "DERIVADO A PARCIALES"
+]
+
+def _dias_habiles(fila):
+    """Días hábiles entre FECHA_CREACION y FECHA_ESTATUS_BITACORA, o None si falta alguna fecha."""
+    import numpy as np
+    try:
+        inicio = np.datetime64(str(fila.get("FECHA_CREACION"))[:10], "D")
+        fin = np.datetime64(_clave_fecha(fila)[:10], "D")
+        return int(np.busday_count(inicio, fin))
+    except ValueError:
+        return None
+
+
+class AgregadosKPI:
+    """Contadores del dashboard general calculados sobre el último estatus de cada siniestro.
+
+    Cada cambio de estatus se aplica como delta: se resta la fila anterior del siniestro
+    (sale de su casilla de ESTATUS/LIQUIDADOR) y se suma la nueva.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.cerrados = 0
+        self.suma_dias = 0
+        self.con_dias = 0
+        self.por_estatus = Counter()
+        self.por_liquidador = Counter()
+
+    def aplicar(self, anterior, nueva):
+        if anterior is not None:
+            self._sumar(anterior, -1)
+        if nueva is not None:
+            self._sumar(nueva, 1)
+
+    def _sumar(self, fila, signo):
+        self.total += signo
+        estatus = fila.get("ESTATUS")
+        liquidador = fila.get("LIQUIDADOR")
+        if estatus is not None:
+            self.por_estatus[estatus] += signo
+            if self.por_estatus[estatus] == 0:
+                del self.por_estatus[estatus]
+        if liquidador is not None:
+            self.por_liquidador[liquidador] += signo
+            if self.por_liquidador[liquidador] == 0:
+                del self.por_liquidador[liquidador]
+        if estatus in ESTATUS_CIERRE:
+            self.cerrados += signo
+            dias = _dias_habiles(fila)
+            if dias is not None:
+                self.suma_dias += signo * dias
+                self.con_dias += signo
+
+    @classmethod
+    def desde_servidor(cls, datos):
+        """Agregados devueltos por la función kpis_dashboard de Postgres."""
+        agregados = cls()
+        agregados.total = datos["total"]
+        agregados.cerrados = datos["cerrados"]
+        agregados.suma_dias = datos["suma_dias"]
+        agregados.con_dias = datos["con_dias"]
+        agregados.por_estatus = Counter(datos["por_estatus"])
+        agregados.por_liquidador = Counter(datos["por_liquidador"])
+        return agregados
+
+    @classmethod
+    def reconstruir(cls, ultimos):
+        """Calcula los contadores desde cero a partir del último estatus de cada siniestro."""
+        agregados = cls()
+        for fila in ultimos:
+            agregados.aplicar(None, fila)
+        return agregados
+
+    def estado(self):
+        """Contadores crudos, para comparar dos agregados."""
+        return (self.total, self.cerrados, self.suma_dias, self.con_dias,
+                dict(self.por_estatus), dict(self.por_liquidador))
+
+    def resumen(self):
+        return {
+            "total": self.total,
+            "cerrados": self.cerrados,
+            "promedio_dias": self.suma_dias / self.con_dias if self.con_dias else float("nan"),
+            "por_estatus": dict(self.por_estatus),
+            "por_liquidador": dict(self.por_liquidador),
+        }
+
+
+def _mismas_filas(a, b):
+    """True si dos listas de filas tienen el mismo contenido sin importar el orden."""
+    if len(a) != len(b):
+        return False
+    firma = lambda filas: Counter(json.dumps(f, sort_keys=True, default=str) for f in filas)
+    return firma(a) == firma(b)
+
+# =======================================================
+#        ÍNDICE DE BÚSQUEDA MULTICAMPO (EN MEMORIA)
+# =======================================================
+# Campos indexados: "palabras" indexa cada palabra (nombres); "compacto" el valor completo sin
+# puntos, guiones ni espacios (RUT, patente, número de serie, siniestro)
+CAMPOS_BUSQUEDA = {
+    "NUM_SINIESTRO": "compacto",
+    "PATENTE": "compacto",
+    "RUT_ASEGURADO": "compacto",
+    "RUT_PROPIETARIO": "compacto",
+    "NO_SERIE": "compacto",
+    "NOMBRE_ASEGURADO": "palabras",
+}
+COLUMNAS_BUSQUEDA = [*CAMPOS_BUSQUEDA, "ESTATUS", "LIQUIDADOR"]
+BUSQUEDA_LIMITE = 20
+
+def normalizar_busqueda(texto):
+    """Mayúsculas sin tildes y solo letras y números: "Pérez-Soto 12.345" -> "PEREZSOTO12345"."""
+    texto = str(texto).upper()
+    if not texto.isascii():
+        texto = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return "".join(filter(str.isalnum, texto))
+
+class IndiceBusqueda:
+    """Índice de prefijos sobre CAMPOS_BUSQUEDA de la última fila de cada siniestro.
+
+    Las entradas son textos "TOKEN\\0SINIESTRO\\0CAMPO" en una lista ordenada, así que los
+    siniestros cuyo token empieza con un prefijo forman un tramo contiguo que se ubica con bisect.
+    Con varias palabras en la consulta se recorre el tramo más corto y el resto se verifica contra
+    los tokens de cada candidato. No es seguro entre hilos: lo protege el candado del sincronizador.
+    """
+
+    def __init__(self):
+        self.entradas = []
+        self.tokens = {}
+
+    @staticmethod
+    def _tokens(fila):
+        tokens = set()
+        for campo, modo in CAMPOS_BUSQUEDA.items():
+            valor = fila.get(campo)
+            if valor is None or valor == "":
+                continue
+            partes = str(valor).split() if modo == "palabras" else [valor]
+            for parte in partes:
+                token = normalizar_busqueda(parte)
+                if token:
+                    tokens.add((token, campo))
+        return tokens
+
+    def construir(self, ultimos):
+        self.tokens = {siniestro: self._tokens(fila) for siniestro, fila in ultimos.items()}
+        self.entradas = sorted(
+            f"{token}\0{siniestro}\0{campo}"
+            for siniestro, tokens in self.tokens.items()
+            for token, campo in tokens
         )
 
-        data = response.data
-        if not data:
-            break
+    def actualizar(self, siniestro, fila):
+        """Reemplaza los tokens del siniestro por los de `fila` (None lo quita del índice)."""
+        anteriores = self.tokens.pop(siniestro, set())
+        nuevos = self._tokens(fila) if fila is not None else set()
+        for token, campo in anteriores - nuevos:
+            entrada = f"{token}\0{siniestro}\0{campo}"
+            pos = bisect.bisect_left(self.entradas, entrada)
+            if pos < len(self.entradas) and self.entradas[pos] == entrada:
+                del self.entradas[pos]
+        for token, campo in nuevos - anteriores:
+            bisect.insort(self.entradas, f"{token}\0{siniestro}\0{campo}")
+        if nuevos:
+            self.tokens[siniestro] = nuevos
+
+    def _tramo(self, prefijo):
+        return (
+            bisect.bisect_left(self.entradas, prefijo),
+            bisect.bisect_left(self.entradas, prefijo + "\uffff")
+        )
+
+    def buscar(self, consulta, limite=BUSQUEDA_LIMITE):
+        """[(siniestro, campos que coinciden)] para hasta `limite` siniestros donde cada palabra de
+        la consulta es prefijo de algún token. Primero la coincidencia exacta de NUM_SINIESTRO."""
+        palabras = [p for p in (normalizar_busqueda(p) for p in str(consulta).split()) if p]
+        if not palabras:
+            return []
+        tramos = sorted(((self._tramo(p), p) for p in palabras), key=lambda t: t[0][1] - t[0][0])
+        (inicio, fin), _ = tramos[0]
+        resto = [p for _, p in tramos[1:]]
+
+        def coincide(siniestro):
+            tokens = self.tokens.get(siniestro, ())
+            return all(any(t.startswith(p) for t, _ in tokens) for p in resto)
+
+        resultados = {}
+        # El siniestro escrito completo va primero aunque el tramo tenga más de `limite` candidatos
+        if len(palabras) == 1:
+            exacto = palabras[0] + "\0"
+            pos = bisect.bisect_left(self.entradas, exacto)
+            while pos < len(self.entradas) and self.entradas[pos].startswith(exacto):
+                _, siniestro, campo = self.entradas[pos].split("\0")
+                if campo == "NUM_SINIESTRO":
+                    resultados[siniestro] = {campo}
+                pos += 1
+
+        for pos in range(inicio, fin):
+            _, siniestro, campo = self.entradas[pos].split("\0")
+            if siniestro in resultados:
+                resultados[siniestro].add(campo)
+            elif len(resultados) >= limite:
+                break
+            elif coincide(siniestro):
+                resultados[siniestro] = {campo}
+        orden = list(resultados)[:limite]
+        return [(siniestro, sorted(resultados[siniestro])) for siniestro in orden]
+
+
+class SincronizadorBitacora:
+    """Copia local de la bitácora que se actualiza pidiendo solo los cambios.
+
+    Las filas se guardan ordenadas por FECHA_ESTATUS_BITACORA. La marca de agua es la
+    fecha más reciente vista; cada sincronización pide únicamente los eventos desde la
+    marca (menos el solape) y vuelve a pedir los siniestros editados en este proceso.
+
+    También mantiene `ultimos`, el modelo de lectura con la fila más reciente de cada
+    NUM_SINIESTRO, y `kpi`, los contadores del dashboard sobre ese modelo. Si las columnas
+    incluyen CAMPOS_BUSQUEDA, `indice` es el IndiceBusqueda sobre `ultimos`. Todos se
+    actualizan con cada cambio en lugar de recalcularse.
+
+    `version` sube cada vez que la copia cambia de verdad (recarga, eventos nuevos o
+    distintos en el solape, siniestros editados); sirve como marca para cachés derivadas.
+    """
+
+    def __init__(self, columnas):
+        self.columnas = columnas
+        self.lock = threading.Lock()
+        self.filas = None
+        self.claves = []
+        self.ultimos = {}
+        self.kpi = AgregadosKPI()
+        self.indice = IndiceBusqueda() if columnas == "*" or set(CAMPOS_BUSQUEDA) <= set(columnas.split(",")) else None
+        self.marca = ""
+        self.modificados = set()
+        self.version = 0
+        self.sincronizado = float("-inf")
+        self.recargado = float("-inf")
+
+    def invalidar(self, siniestro=None):
+        """Fuerza sincronizar en la próxima lectura. Si se indica siniestro, sus filas se vuelven a pedir."""
+        with self.lock:
+            self.sincronizado = float("-inf")
+            if siniestro is not None:
+                self.modificados.add(str(siniestro))
+
+    def registrar(self, fila):
+        """Aplica un evento recién insertado sin esperar a la siguiente sincronización."""
+        if self.columnas != "*":
+            columnas = self.columnas.split(",")
+            fila = {c: fila.get(c) for c in columnas}
+        with self.lock:
+            if self.filas is None:
+                return
+            self._insertar(fila)
+            self._actualizar_ultimos([fila], {str(fila.get("NUM_SINIESTRO"))})
+            self.version += 1
+
+    def obtener_ultimos(self):
+        with self.lock:
+            self._vigente()
+            return list(self.ultimos.values())
+
+    def obtener_kpis(self):
+        with self.lock:
+            self._vigente()
+            return self.kpi.resumen()
+
+    def verificar_kpis(self):
+        """Compara los contadores incrementales contra una reconstrucción desde el modelo de lectura."""
+        with self.lock:
+            self._vigente()
+            return self.kpi.estado() == AgregadosKPI.reconstruir(self.ultimos.values()).estado()
+
+    def obtener_marca(self):
+        """Marca de cambios de la copia: fecha más reciente, filas y versión."""
+        with self.lock:
+            self._vigente()
+            return f"{self.marca}|{len(self.filas)}|{self.version}"
+
+    def buscar(self, consulta, limite=BUSQUEDA_LIMITE):
+        """[(última fila, campos que coinciden)] de los siniestros que calzan con la consulta."""
+        with self.lock:
+            self._vigente()
+            return [(self.ultimos[s], campos) for s, campos in self.indice.buscar(consulta, limite)]
+
+    def _vigente(self):
+        ahora = time.monotonic()
+        if self.filas is None or ahora - self.recargado > BITACORA_RECARGA_MIN * 60:
+            with medir("bitacora.recargar"):
+                self._recargar()
+        elif ahora - self.sincronizado > BITACORA_TTL:
+            with medir("bitacora.sincronizar"):
+                self._sincronizar()
+
+    def _recargar(self):
+        filas = _descargar_bitacora(self.columnas)
+        filas.sort(key=_clave_fecha)
+        self.filas = filas
+        self.claves = [_clave_fecha(f) for f in filas]
+        self.marca = self.claves[-1] if self.claves else ""
+        self.modificados.clear()
+        self.ultimos = {}
+        for fila in filas:
+            self.ultimos[str(fila.get("NUM_SINIESTRO"))] = fila
+        self.kpi = AgregadosKPI.reconstruir(self.ultimos.values())
+        if self.indice is not None:
+            self.indice.construir(self.ultimos)
+        self.version += 1
+        self.sincronizado = self.recargado = time.monotonic()
+
+    def _sincronizar(self):
+        nuevas_total = []
+        afectados = set()
+
+        # Siniestros editados en sitio (panel_modificar_datos): se reemplazan todas sus filas
+        if self.modificados:
+            siniestros = set(self.modificados)
+            nuevas = _descargar_bitacora(self.columnas, siniestros=sorted(siniestros))
+            conservar = [i for i, f in enumerate(self.filas) if str(f.get("NUM_SINIESTRO")) not in siniestros]
+            self.filas = [self.filas[i] for i in conservar]
+            self.claves = [self.claves[i] for i in conservar]
+            for fila in nuevas:
+                self._insertar(fila)
+            nuevas_total.extend(nuevas)
+            afectados |= siniestros
+            self.modificados.clear()
+            self.version += 1
+
+        # Eventos nuevos: se reemplaza la cola desde la marca de agua menos el solape
+        try:
+            desde = datetime.fromisoformat(self.marca) - timedelta(minutes=BITACORA_SOLAPE_MIN)
+        except ValueError:
+            self._recargar()
+            return
+        desde = desde.strftime("%Y-%m-%d %H:%M:%S")
+        corte = bisect.bisect_left(self.claves, desde)
+        nuevas = _descargar_bitacora(self.columnas, desde=desde)
+        afectados |= {str(f.get("NUM_SINIESTRO")) for f in self.filas[corte:]}
+        if not _mismas_filas(self.filas[corte:], nuevas):
+            self.version += 1
+        del self.filas[corte:]
+        del self.claves[corte:]
+        for fila in nuevas:
+            self._insertar(fila)
+        nuevas_total.extend(nuevas)
+        afectados |= {str(f.get("NUM_SINIESTRO")) for f in nuevas}
+
+        self._actualizar_ultimos(nuevas_total, afectados)
+        if self.claves:
+            self.marca = max(self.marca, self.claves[-1])
+        self.sincronizado = time.monotonic()
+
+    def _insertar(self, fila):
+        clave = _clave_fecha(fila)
+        pos = bisect.bisect_right(self.claves, clave)
+        self.claves.insert(pos, clave)
+        self.filas.insert(pos, fila)
+
+    def _actualizar_ultimos(self, nuevas, afectados):
+        """Recalcula la última fila solo de los siniestros afectados por un cambio."""
+        candidatos = {}
+        for fila in sorted(nuevas, key=_clave_fecha):
+            candidatos[str(fila.get("NUM_SINIESTRO"))] = fila
+
+        for siniestro in afectados:
+            fila = candidatos.get(siniestro)
+            anterior = self.ultimos.get(siniestro)
+            if fila is not None and anterior is not None and _clave_fecha(anterior) > _clave_fecha(fila):
+                fila = anterior
+            if fila is None:
+                # Sus eventos recientes desaparecieron: se busca el último que quede
+                fila = next((f for f in reversed(self.filas) if str(f.get("NUM_SINIESTRO")) == siniestro), None)
+            self._fijar_ultimo(siniestro, fila)
+
+    def _fijar_ultimo(self, siniestro, fila):
+        self.kpi.aplicar(self.ultimos.get(siniestro), fila)
+        if self.indice is not None:
+            self.indice.actualizar(siniestro, fila)
+        if fila is None:
+            self.ultimos.pop(siniestro, None)
+        else:
+            self.ultimos[siniestro] = fila
+
+
+@st.cache_resource
+def _sincronizadores():
+    """Un sincronizador por conjunto de columnas, compartidos por todas las sesiones."""
+    return {"lock": threading.Lock(), "por_columnas": {}}
+
+def _sincronizador_bitacora(columnas):
+    registro = _sincronizadores()
+    clave = _columnas_bitacora(columnas)
+    with registro["lock"]:
+        if clave not in registro["por_columnas"]:
+            registro["por_columnas"][clave] = SincronizadorBitacora(clave)
+        return registro["por_columnas"][clave]
+
+def invalidar_bitacora(siniestro=None):
+    """Avisa a los sincronizadores de una escritura. Pasar el siniestro cuando se editaron filas existentes."""
+    if siniestro is not None:
+        _cache_siniestros().invalidar(siniestro)
+    _kpis_servidor.clear()
+    registro = _sincronizadores()
+    with registro["lock"]:
+        sincronizadores = list(registro["por_columnas"].values())
+    for sincronizador in sincronizadores:
+        sincronizador.invalidar(siniestro)
+
+def ultimo_estatus(columnas):
+    """Una fila por NUM_SINIESTRO con su evento más reciente (modelo de lectura materializado)."""
+    return _sincronizador_bitacora(columnas).obtener_ultimos()
+
+def buscar_siniestros(consulta, limite=BUSQUEDA_LIMITE):
+    """Siniestros cuyo número, patente, RUT, número de serie o nombre del asegurado empieza con
+    las palabras de la consulta (sin distinguir tildes ni mayúsculas): [(última fila, campos)]."""
+    return _sincronizador_bitacora(COLUMNAS_BUSQUEDA).buscar(consulta, limite)
+
+@st.cache_data(ttl=BITACORA_TTL, show_spinner=False)
+def _kpis_servidor():
+    return supabase.rpc("kpis_dashboard").execute().data
+
+def kpis_dashboard():
+    """Contadores del dashboard general: calculados en Postgres con DASHBOARD_RPC, o mantenidos
+    de forma incremental sobre la copia local."""
+    if DASHBOARD_RPC:
+        try:
+            return AgregadosKPI.desde_servidor(_kpis_servidor()).resumen()
+        except Exception:
+            pass  # p. ej. la migración aún no se aplicó
+    return _sincronizador_bitacora(COLUMNAS_DASH).obtener_kpis()
+
+def ultimo_estatus_liquidador(liquidador):
+    """Último estatus de los siniestros asignados a un liquidador."""
+    if DASHBOARD_RPC:
+        try:
+            return _paginar_offset(supabase.table("BitacoraUltimoEstatus").select("*").eq("LIQUIDADOR", liquidador))
+        except Exception:
+            pass
+    return _ultimas_filas_liquidador(liquidador, marca_bitacora())
+
+@st.cache_data(max_entries=200, show_spinner=False)
+def _ultimas_filas_liquidador(liquidador, marca):
+    """Filas completas del último estatus de los siniestros de un liquidador. Los siniestros salen
+    de la copia liviana del dashboard y sus filas se piden a Supabase, así el proceso no guarda
+    todas las columnas de todos los eventos. `marca` solo forma la clave de la caché."""
+    siniestros = sorted(
+        str(fila["NUM_SINIESTRO"]) for fila in ultimo_estatus(COLUMNAS_DASH) if fila.get("LIQUIDADOR") == liquidador
+    )
+    return [fila for fila in ultimos_eventos(siniestros).values() if fila.get("LIQUIDADOR") == liquidador]
+
+def marca_bitacora():
+    """Cambia cuando la bitácora cambia. Usa la copia liviana del dashboard, que se sincroniza
+    con los mismos avisos que las demás. Sirve para lo que se lee de Supabase después de tomarla;
+    lo que sale de otra copia tiene que usar la marca de esa copia."""
+    return _sincronizador_bitacora(COLUMNAS_DASH).obtener_marca()
+
+def ultimos_eventos(siniestros):
+    """{NUM_SINIESTRO: fila más reciente} de varios siniestros, leída de Supabase y no de la copia
+    del proceso: la sincronización no ve las ediciones en sitio hechas por otros procesos, y quien
+    llama escribe a partir de estas filas. Con DASHBOARD_RPC es una consulta a la vista
+    BitacoraUltimoEstatus por cada CARGA_LOTE siniestros; sin ella se descargan los eventos de cada
+    tanda y se queda el último de cada siniestro."""
+    if DASHBOARD_RPC:
+        ultimos = {}
+        try:
+            for i in range(0, len(siniestros), CARGA_LOTE):
+                respuesta = (
+                    supabase
+                    .table("BitacoraUltimoEstatus")
+                    .select("*")
+                    .in_("NUM_SINIESTRO", siniestros[i:i + CARGA_LOTE])
+                    .execute()
+                )
+                ultimos.update((str(fila["NUM_SINIESTRO"]), fila) for fila in respuesta.data)
+            return ultimos
+        except Exception:
+            pass  # p. ej. la migración aún no se aplicó
+    ultimos = {}
+    for i in range(0, len(siniestros), CARGA_LOTE):
+        _guardar_ultimas(ultimos, _descargar_bitacora("*", siniestros=siniestros[i:i + CARGA_LOTE]))
+    return ultimos
+
+def _guardar_ultimas(ultimos, filas):
+    """Deja en `ultimos` la fila más reciente de cada NUM_SINIESTRO entre las que ya tenía y `filas`
+    (en un empate de fecha gana la que viene después, como en el modelo de último estatus)."""
+    for fila in filas:
+        siniestro = str(fila.get("NUM_SINIESTRO"))
+        if siniestro not in ultimos or _clave_fecha(fila) >= _clave_fecha(ultimos[siniestro]):
+            ultimos[siniestro] = fila
+
+def registrar_evento_bitacora(fila):
+    """Aplica a la copia local y al modelo de último estatus un evento recién insertado."""
+    _cache_siniestros().invalidar(fila.get("NUM_SINIESTRO"))
+    _kpis_servidor.clear()
+    registro = _sincronizadores()
+    with registro["lock"]:
+        sincronizadores = list(registro["por_columnas"].values())
+    for sincronizador in sincronizadores:
+        sincronizador.registrar(fila)
+
+
+# =======================================================
+#      DESCARGA PAGINADA (KEYSET SOBRE FECHA DE ESTATUS)
+# =======================================================
+BITACORA_PAGINA = 1000
+# Consultas simultáneas al descargar la bitácora completa
+BITACORA_HILOS = int(st.secrets.get("BITACORA_HILOS", 4))
+COLUMNA_CURSOR = "FECHA_ESTATUS_BITACORA"
+# Con sql/002_esquema_normalizado.sql aplicado: los datos del siniestro están una vez en
+# Siniestros, cada cambio de estatus es una fila de EventosSiniestro y BitacoraOperaciones es la
+# vista que los une. La app escribe y descarga sobre las tablas en lugar de repetir los datos.
+ESQUEMA_NORMALIZADO = bool(st.secrets.get("ESQUEMA_NORMALIZADO", False))
+COLUMNAS_EVENTO = ["NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA", "ESTATUS", "COMENTARIO", "LIQUIDADOR", "CORREO_LIQUIDADOR"]
+
+def _columnas_bitacora(columnas=None):
+    """Texto para select(); agrega las columnas que necesita la sincronización."""
+    if columnas is None:
+        return "*"
+    return ",".join(sorted(set(columnas) | {"NUM_SINIESTRO", COLUMNA_CURSOR}))
+
+def _consulta_bitacora(columnas, siniestros=None):
+    """Consulta sobre la bitácora. Con ESQUEMA_NORMALIZADO, si solo se piden columnas del evento
+    se lee EventosSiniestro directamente, sin pasar por la vista que une cada evento con su siniestro."""
+    tabla = "BitacoraOperaciones"
+    if ESQUEMA_NORMALIZADO and columnas != "*" and set(columnas.split(",")) <= set(COLUMNAS_EVENTO):
+        tabla = "EventosSiniestro"
+    query = supabase.table(tabla).select(columnas)
+    if siniestros is not None:
+        query = query.in_("NUM_SINIESTRO", siniestros)
+    return query
+
+def _paginas_tramo(columnas, desde=None, hasta=None, siniestros=None):
+    """Lee los eventos con desde <= FECHA_ESTATUS_BITACORA < hasta usando el último valor como cursor.
+
+    La fecha no es única, así que cuando una página viene llena se descartan las filas de
+    su última fecha y la siguiente página empieza en esa fecha (inclusive).
+    Entrega las filas página por página, sin juntarlas en memoria.
+    """
+    cursor, inclusivo = desde, True
+
+    while True:
+        query = _consulta_bitacora(columnas, siniestros)
+        if cursor is None:
+            query = query.not_.is_(COLUMNA_CURSOR, "null")
+        elif inclusivo:
+            query = query.gte(COLUMNA_CURSOR, cursor)
+        else:
+            query = query.gt(COLUMNA_CURSOR, cursor)
+        if hasta is not None:
+            query = query.lt(COLUMNA_CURSOR, hasta)
+
+        pagina = query.order(COLUMNA_CURSOR).limit(BITACORA_PAGINA).execute().data
+        if len(pagina) < BITACORA_PAGINA:
+            yield pagina
+            return
+
+        ultima = pagina[-1][COLUMNA_CURSOR]
+        completas = [f for f in pagina if _clave_fecha(f) < _clave_fecha(pagina[-1])]
+        if completas:
+            yield completas
+            cursor, inclusivo = ultima, True
+        else:
+            # Una página entera con la misma fecha: esa fecha se lee aparte y se salta
+            yield from _paginas_offset(_consulta_bitacora(columnas, siniestros).eq(COLUMNA_CURSOR, ultima), _orden_bitacora(columnas))
+            cursor, inclusivo = ultima, False
+
+def _orden_bitacora(columnas):
+    """Orden total para paginar la bitácora por rango. La tabla no tiene una clave única, así que
+    se ordena por todas las columnas leídas: dos filas que empatan en todas son intercambiables."""
+    pedidas = list(COLUMNAS_VISIBLES) if columnas == "*" else columnas.split(",")
+    return ["NUM_SINIESTRO", *(c for c in pedidas if c != "NUM_SINIESTRO")]
+
+def _paginas_offset(query, orden=("NUM_SINIESTRO",)):
+    """Paginación por rango, solo para los casos sin cursor (fechas nulas o empates).
+    `orden` tiene que identificar cada fila; si no, Postgres puede devolver las filas empatadas en
+    otro orden en la página siguiente y unas se repiten mientras otras se saltan."""
+    for columna in orden:
+        query = query.order(columna)
+    start = 0
+    while True:
+        pagina = query.range(start, start + BITACORA_PAGINA - 1).execute().data
+        yield pagina
+        if len(pagina) < BITACORA_PAGINA:
+            return
+        start += BITACORA_PAGINA
+
+def _paginar_tramo(columnas, desde=None, hasta=None, siniestros=None):
+    return [fila for pagina in _paginas_tramo(columnas, desde, hasta, siniestros) for fila in pagina]
+
+def _paginar_offset(query, orden=("NUM_SINIESTRO",)):
+    return [fila for pagina in _paginas_offset(query, orden) for fila in pagina]
+
+def _paginar_nulos(columnas, siniestros=None):
+    return _paginar_offset(_consulta_bitacora(columnas, siniestros).is_(COLUMNA_CURSOR, "null"), _orden_bitacora(columnas))
+
+def _extremo_fecha(descendente):
+    data = (
+        _consulta_bitacora(COLUMNA_CURSOR)
+        .not_.is_(COLUMNA_CURSOR, "null")
+        .order(COLUMNA_CURSOR, desc=descendente)
+        .limit(1)
+        .execute()
+        .data
+    )
+    return data[0][COLUMNA_CURSOR] if data else None
+
+def _partir_rango(minimo, maximo, partes):
+    """Límites inferiores de `partes` tramos de igual duración entre minimo y maximo."""
+    try:
+        inicio = datetime.fromisoformat(_clave_fecha({COLUMNA_CURSOR: minimo}))
+        fin = datetime.fromisoformat(_clave_fecha({COLUMNA_CURSOR: maximo}))
+    except ValueError:
+        return [minimo]
+    paso = (fin - inicio) / partes
+    limites = [minimo]
+    for i in range(1, partes):
+        limite = (inicio + paso * i).strftime("%Y-%m-%d %H:%M:%S")
+        if limite > _clave_fecha({COLUMNA_CURSOR: limites[-1]}):
+            limites.append(limite)
+    return limites
+
+def _columnas_evento(columnas):
+    """select() sobre EventosSiniestro para un select() de la bitácora: sus columnas del evento,
+    más NUM_SINIESTRO y el cursor."""
+    pedidas = COLUMNAS_EVENTO if columnas == "*" else columnas.split(",")
+    return ",".join(sorted({"NUM_SINIESTRO", COLUMNA_CURSOR, *(c for c in pedidas if c in COLUMNAS_EVENTO)}))
+
+def _datos_siniestros(numeros, columnas):
+    """{NUM_SINIESTRO: fila de Siniestros con `columnas`}. Pocos siniestros se piden con .in_ por
+    tandas de CARGA_LOTE; más de una página, leyendo la tabla completa."""
+    seleccion = ",".join(["NUM_SINIESTRO", *columnas])
+    if len(numeros) > BITACORA_PAGINA:
+        filas = _paginar_offset(supabase.table("Siniestros").select(seleccion))
+    else:
+        filas = []
+        for i in range(0, len(numeros), CARGA_LOTE):
+            filas.extend(
+                supabase
+                .table("Siniestros")
+                .select(seleccion)
+                .in_("NUM_SINIESTRO", numeros[i:i + CARGA_LOTE])
+                .execute()
+                .data
+            )
+    return {str(fila["NUM_SINIESTRO"]): fila for fila in filas}
+
+def _unir_siniestros(eventos, columnas):
+    """Eventos con la forma de la bitácora: a cada uno se le agregan las columnas de su siniestro.
+    Con "*" las columnas quedan en el orden de COLUMNAS_VISIBLES, como en la vista."""
+    pedidas = list(COLUMNAS_VISIBLES) if columnas == "*" else columnas.split(",")
+    maestras = [c for c in pedidas if c not in COLUMNAS_EVENTO]
+    if not maestras or not eventos:
+        return eventos
+    datos = _datos_siniestros(sorted({str(evento["NUM_SINIESTRO"]) for evento in eventos}), maestras)
+    vacio = dict.fromkeys(maestras)
+    filas = []
+    for evento in eventos:
+        fila = {**datos.get(str(evento["NUM_SINIESTRO"]), vacio), **evento}
+        filas.append({c: fila.get(c) for c in pedidas} if columnas == "*" else fila)
+    return filas
+
+def insertar_eventos(filas):
+    """Inserta eventos de seguimiento (filas completas de la bitácora). Con ESQUEMA_NORMALIZADO
+    solo viajan las columnas del evento a EventosSiniestro."""
+    if ESQUEMA_NORMALIZADO:
+        filas = [{c: fila.get(c) for c in COLUMNAS_EVENTO} for fila in filas]
+        supabase.table("EventosSiniestro").insert(filas).execute()
+    else:
+        supabase.table("BitacoraOperaciones").insert(filas).execute()
+
+def _descargar_bitacora(columnas="*", desde=None, siniestros=None):
+    """Descarga filas de la bitácora.
+    desde: solo eventos con FECHA_ESTATUS_BITACORA >= desde.
+    siniestros: solo las filas de esos NUM_SINIESTRO.
+    Sin filtros, la tabla se parte en tramos de fecha que se leen en paralelo.
+    Con ESQUEMA_NORMALIZADO se descargan los eventos y los datos de cada siniestro una sola vez.
+    """
+    if ESQUEMA_NORMALIZADO:
+        return _unir_siniestros(_descargar_eventos(_columnas_evento(columnas), desde, siniestros), columnas)
+    return _descargar_eventos(columnas, desde, siniestros)
+
+def _descargar_eventos(columnas, desde=None, siniestros=None):
+    if siniestros is not None and len(siniestros) > CARGA_LOTE:
+        # Una lista larga en .in_ deja la URL de la consulta demasiado larga
+        return [
+            fila
+            for i in range(0, len(siniestros), CARGA_LOTE)
+            for fila in _descargar_eventos(columnas, desde, siniestros[i:i + CARGA_LOTE])
+        ]
+    if desde is not None:
+        return _paginar_tramo(columnas, desde, siniestros=siniestros)
+    if siniestros is not None:
+        return _paginar_nulos(columnas, siniestros) + _paginar_tramo(columnas, siniestros=siniestros)
+
+    minimo = _extremo_fecha(descendente=False)
+    if minimo is None:
+        return _paginar_nulos(columnas)
+    maximo = _extremo_fecha(descendente=True)
+    limites = _partir_rango(minimo, maximo, BITACORA_HILOS * 2)
+    tramos = [(limite, limites[i + 1] if i + 1 < len(limites) else None) for i, limite in enumerate(limites)]
+
+    with ThreadPoolExecutor(max_workers=BITACORA_HILOS, initializer=_heredar_vista, initargs=(_vista_actual(), threading.get_ident())) as pool:
+        nulos = pool.submit(_paginar_nulos, columnas)
+        futuros = [pool.submit(_paginar_tramo, columnas, desde, hasta) for desde, hasta in tramos]
+        filas = nulos.result()
+        for futuro in futuros:
+            filas.extend(futuro.result())
+    return filas
+
+
+def _paginas_bitacora(columnas="*"):
+    """Bitácora completa página por página (fechas nulas primero y luego por fecha de estatus),
+    para exportarla sin tenerla entera en memoria."""
+    yield from _paginas_offset(_consulta_bitacora(columnas).is_(COLUMNA_CURSOR, "null"), _orden_bitacora(columnas))
+    yield from _paginas_tramo(columnas)
+
+
+# =======================================================
+#            EXPORTACIÓN DE BITÁCORAS POR PÁGINAS
+# =======================================================
+COLUMNAS_FECHA = ["FECHA_ESTATUS_BITACORA", "FECHA_SINIESTRO", "FECHA_CREACION"]
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def _fecha_exportable(valor):
+    """Como pd.to_datetime(errors="coerce"): datetime sin zona horaria, o None si no se puede leer."""
+    if valor in (None, ""):
+        return None
+    try:
+        return datetime.fromisoformat(str(valor)).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+def _valor_exportable(columna, valor):
+    if columna in COLUMNAS_FECHA:
+        return _fecha_exportable(valor)
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    return valor
+
+def _encabezado_excel(ws, columnas):
+    """Encabezado azul con texto blanco, igual que el que dejaba pd.ExcelWriter después de darle formato."""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+
+    header_fill = PatternFill("solid", fgColor="1F4E78")  # azul
+    header_font = Font(bold=True, color="FFFFFF")
+    header_align = Alignment(
+        horizontal="center",
+        vertical="center",
+        wrap_text=True
+    )
+    delgado = Side(style="thin")
+    header_border = Border(left=delgado, right=delgado, top=delgado, bottom=delgado)
+
+    # En modo solo escritura los anchos y altos se fijan antes de escribir la primera fila
+    for col_idx in range(1, len(columnas) + 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = 22
+    ws.row_dimensions[1].height = 35
+
+    celdas = []
+    for columna in columnas:
+        cell = WriteOnlyCell(ws, value=COLUMNAS_VISIBLES.get(columna, columna))
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = header_align
+        cell.border = header_border
+        celdas.append(cell)
+    ws.append(celdas)
+
+def _paginas_exportables(paginas):
+    """Columnas (en el orden de la primera fila) y cada página convertida a listas de valores."""
+    columnas = None
+    for pagina in paginas:
+        if not pagina:
+            continue
+        if columnas is None:
+            columnas = list(pagina[0])
+        yield columnas, [[_valor_exportable(columna, fila.get(columna)) for columna in columnas] for fila in pagina]
+
+def escribir_excel(destino, paginas):
+    """Escribe las filas de `paginas` en la hoja LOG de un libro en modo solo escritura.
+
+    openpyxl pasa cada fila a disco al agregarla, así que la memoria usada no depende del
+    total de filas: solo se mantiene la página que se está escribiendo.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("LOG")
+    columnas = None
+    for columnas_pagina, valores in _paginas_exportables(paginas):
+        if columnas is None:
+            columnas = columnas_pagina
+            _encabezado_excel(ws, columnas)
+        for fila in valores:
+            ws.append(fila)
+    if columnas is None:
+        _encabezado_excel(ws, list(COLUMNAS_VISIBLES))
+    wb.save(destino)
+
+def escribir_csv(destino, paginas, comprimir=False):
+    """CSV en UTF-8 con BOM (para que Excel respete los acentos), opcionalmente comprimido con gzip.
+    Las fechas van como AAAA-MM-DD HH:MM:SS, igual que las escribe pandas."""
+    binario = gzip.GzipFile(fileobj=destino, mode="wb") if comprimir else destino
+    texto = io.TextIOWrapper(binario, encoding="utf-8-sig", newline="")
+    escritor = csv.writer(texto)
+    encabezado = False
+    for columnas, valores in _paginas_exportables(paginas):
+        if not encabezado:
+            escritor.writerow([COLUMNAS_VISIBLES.get(columna, columna) for columna in columnas])
+            encabezado = True
+        escritor.writerows(valores)
+    if not encabezado:
+        escritor.writerow(list(COLUMNAS_VISIBLES.values()))
+    texto.flush()
+    texto.detach()
+    if comprimir:
+        binario.close()
+
+def escribir_csv_gzip(destino, paginas):
+    escribir_csv(destino, paginas, comprimir=True)
+
+PARQUET_FILAS_GRUPO = 50_000
+
+def escribir_parquet(destino, paginas):
+    """Parquet con las fechas como timestamp y el resto de columnas como texto.
+
+    Las filas se juntan en grupos de PARQUET_FILAS_GRUPO antes de escribirse, así que la
+    memoria queda acotada por el tamaño del grupo y no por el total de la bitácora.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def esquema(columnas):
+        return pa.schema([
+            (COLUMNAS_VISIBLES.get(columna, columna), pa.timestamp("us") if columna in COLUMNAS_FECHA else pa.string())
+            for columna in columnas
+        ])
+
+    def grupo(columnas, filas):
+        datos = {}
+        for idx, columna in enumerate(columnas):
+            valores = [fila[idx] for fila in filas]
+            if columna not in COLUMNAS_FECHA:
+                valores = [None if valor is None else str(valor) for valor in valores]
+            datos[COLUMNAS_VISIBLES.get(columna, columna)] = valores
+        return pa.table(datos, schema=esquema(columnas))
+
+    escritor = None
+    columnas, pendientes = None, []
+    for columnas, valores in _paginas_exportables(paginas):
+        pendientes.extend(valores)
+        if len(pendientes) >= PARQUET_FILAS_GRUPO:
+            escritor = escritor or pq.ParquetWriter(destino, esquema(columnas))
+            escritor.write_table(grupo(columnas, pendientes))
+            pendientes = []
+    columnas = columnas or list(COLUMNAS_VISIBLES)
+    escritor = escritor or pq.ParquetWriter(destino, esquema(columnas))
+    escritor.write_table(grupo(columnas, pendientes))
+    escritor.close()
+
+# Formato -> (extensión, mime, función que escribe el archivo)
+FORMATOS_EXPORTACION = {
+    "Excel (.xlsx)": (".xlsx", EXCEL_MIME, escribir_excel),
+    "CSV (.csv)": (".csv", "text/csv", escribir_csv),
+    "CSV comprimido (.csv.gz)": (".csv.gz", "application/gzip", escribir_csv_gzip),
+    "Parquet (.parquet)": (".parquet", "application/vnd.apache.parquet", escribir_parquet),
+}
+
+
+
+# =======================================================
+#        CACHÉ DE ARCHIVOS EXPORTADOS (POR VERSIÓN)
+# =======================================================
+class CacheExportaciones:
+    """Archivos de descarga ya generados, por tipo de bitácora, formato y marca de la bitácora.
+
+    Mientras no se registre ningún evento, cada descarga repetida se sirve desde disco.
+    Un candado por clave hace que, si varias sesiones piden el mismo archivo a la vez, solo
+    la primera lo genere y las demás esperen y reutilicen el resultado. Al generar una
+    versión nueva se borran las anteriores del mismo tipo y formato.
+    """
+
+    def __init__(self, directorio):
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        # Distingue los archivos de este proceso de los de un arranque anterior
+        self.proceso = uuid.uuid4().hex[:8]
+        self.lock = threading.Lock()
+        self.candados = {}
+
+    def _candado(self, clave):
+        with self.lock:
+            return self.candados.setdefault(clave, threading.Lock())
+
+    def obtener(self, tipo, formato, marca, paginas):
+        """Ruta del archivo para (tipo, formato, marca); `paginas` es una función que devuelve las
+        páginas a exportar y solo se llama si hay que generarlo."""
+        extension, _, escribir = FORMATOS_EXPORTACION[formato]
+        prefijo = f"{tipo}-{extension.strip('.').replace('.', '_')}"
+        version = hashlib.sha1(f"{self.proceso}|{marca}".encode("utf-8")).hexdigest()[:16]
+        ruta = self.directorio / f"{prefijo}-{version}{extension}"
+
+        with self._candado(prefijo):
+            if ruta.exists():
+                return ruta
+            with tempfile.NamedTemporaryFile(dir=self.directorio, suffix=".tmp", delete=False) as archivo:
+                temporal = Path(archivo.name)
+                try:
+                    with medir(f"exportar.{prefijo}"):
+                        escribir(archivo, paginas())
+                except Exception:
+                    archivo.close()
+                    temporal.unlink(missing_ok=True)
+                    raise
+            temporal.replace(ruta)
+            for anterior in self.directorio.glob(f"{prefijo}-*{extension}"):
+                if anterior != ruta:
+                    anterior.unlink(missing_ok=True)
+            return ruta
+
+@st.cache_resource
+def _cache_exportaciones():
+    return CacheExportaciones(DATOS_DIR / "exports")
+
+def exportar_bitacora(tipo, formato):
+    """Archivo de la bitácora `tipo` ("operacion" o "ultimo_estatus") en `formato`, desde la caché
+    si la bitácora no cambió desde la última vez que se generó."""
+    paginas = {"operacion": _paginas_bitacora, "ultimo_estatus": _paginas_ultimo_estatus}[tipo]
+    # Las dos se leen de Supabase al generar el archivo, después de tomar la marca
+    return _cache_exportaciones().obtener(tipo, formato, marca_bitacora(), paginas)
+
+def _paginas_ultimo_estatus():
+    """Última fila de cada siniestro, ordenadas por NUM_SINIESTRO. Con DASHBOARD_RPC se pagina la
+    vista BitacoraUltimoEstatus; si no, se recorre la bitácora guardando solo la última fila de
+    cada siniestro (la memoria depende de los siniestros, no de los eventos)."""
+    if DASHBOARD_RPC:
+        paginas = _paginas_offset(supabase.table("BitacoraUltimoEstatus").select("*"))
+        try:
+            primera = next(paginas)
+        except StopIteration:
+            return
+        except Exception:
+            primera = None  # p. ej. la migración aún no se aplicó
+        if primera is not None:
+            yield primera
+            yield from paginas
+            return
+
+    ultimos = {}
+    for pagina in _paginas_bitacora():
+        _guardar_ultimas(ultimos, pagina)
+    filas = sorted(
+        ultimos.values(),
+        key=lambda fila: (fila.get("NUM_SINIESTRO") is None, str(fila.get("NUM_SINIESTRO")))
+    )
+    for inicio in range(0, len(filas), BITACORA_PAGINA):
+        yield filas[inicio:inicio + BITACORA_PAGINA]
 
-        all_rows.extend(data)
-        start += step
 
-    return all_rows
 
+# =======================================================
+#              REPORTES PROGRAMADOS (SNAPSHOTS)
+# =======================================================
+# Horas del día (hora de Ciudad de México) en que se generan las dos bitácoras, p. ej. "06:00,13:00".
+# Sin horas configuradas no se programa nada.
+REPORTES_HORAS = [h.strip() for h in str(st.secrets.get("REPORTES_HORAS", "")).split(",") if h.strip()]
+# Extensiones a generar en cada corrida, p. ej. "xlsx,csv.gz" (también una lista): xlsx, csv, csv.gz, parquet
+REPORTES_FORMATOS = st.secrets.get("REPORTES_FORMATOS", "xlsx")
+if isinstance(REPORTES_FORMATOS, str):
+    REPORTES_FORMATOS = REPORTES_FORMATOS.split(",")
+REPORTES_FORMATOS = [str(f).strip().lstrip(".") for f in REPORTES_FORMATOS if str(f).strip()]
+# Carpeta de Drive donde además se suben los reportes (opcional)
+REPORTES_DRIVE_FOLDER = st.secrets.get("REPORTES_DRIVE_FOLDER")
+# Reportes que se conservan en disco por tipo y formato
+REPORTES_CONSERVAR = int(st.secrets.get("REPORTES_CONSERVAR", 3))
+ZONA_REPORTES = ZoneInfo("America/Mexico_City")
+NOMBRES_REPORTE = {"operacion": "Bitacora_Operación_SURA", "ultimo_estatus": "Bitacora_UltimoEstatus_SURA"}
+
+class ReportesProgramados:
+    """Genera las bitácoras de vista_descargas a horas fijas, fuera de la hora pico.
+
+    Cada corrida toma el archivo de la caché de exportaciones (o lo genera), lo copia a
+    `directorio` con la fecha en el nombre y, si hay carpeta configurada, lo sube a Drive.
+    Si el proceso arranca después de una hora programada sin reporte, lo genera al iniciar.
+    """
+
+    def __init__(self, directorio, horas, formatos, carpeta_drive=None):
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.horas = sorted(datetime.strptime(h, "%H:%M").time() for h in horas)
+        extensiones = {FORMATOS_EXPORTACION[f][0].strip("."): f for f in FORMATOS_EXPORTACION}
+        desconocidas = [f for f in formatos if f not in extensiones]
+        if desconocidas:
+            raise ValueError(
+                f"REPORTES_FORMATOS: extensiones desconocidas {', '.join(desconocidas)} "
+                f"(se aceptan {', '.join(extensiones)})"
+            )
+        self.formatos = [f for f in FORMATOS_EXPORTACION if FORMATOS_EXPORTACION[f][0].strip(".") in formatos]
+        self.carpeta_drive = carpeta_drive
+        self.error = None
+
+    def _programadas(self, ahora):
+        """Última hora programada ya pasada y la siguiente por venir."""
+        hoy = ahora.date()
+        fechas = [datetime.combine(hoy + timedelta(days=d), h, ZONA_REPORTES) for d in (-1, 0, 1) for h in self.horas]
+        anterior = max(f for f in fechas if f <= ahora)
+        siguiente = min(f for f in fechas if f > ahora)
+        return anterior, siguiente
+
+    def ultimo(self, tipo, formato):
+        """(ruta, fecha) del reporte más reciente de ese tipo y formato, o None."""
+        extension = FORMATOS_EXPORTACION[formato][0]
+        rutas = sorted(self.directorio.glob(f"{NOMBRES_REPORTE[tipo]}_*{extension}"))
+        if not rutas:
+            return None
+        sello = rutas[-1].name[len(NOMBRES_REPORTE[tipo]) + 1:-len(extension)]
+        return rutas[-1], datetime.strptime(sello, "%Y%m%d_%H%M").replace(tzinfo=ZONA_REPORTES)
+
+    def generar(self, ahora):
+        sello = ahora.strftime("%Y%m%d_%H%M")
+        for tipo, nombre in NOMBRES_REPORTE.items():
+            for formato in self.formatos:
+                extension, mime, _ = FORMATOS_EXPORTACION[formato]
+                destino = self.directorio / f"{nombre}_{sello}{extension}"
+                temporal = destino.with_suffix(".tmp")
+                shutil.copyfile(exportar_bitacora(tipo, formato), temporal)
+                temporal.replace(destino)
+                if self.carpeta_drive:
+                    with open(destino, "rb") as archivo:
+                        subir_archivo_drive(destino.name, archivo, mime, self.carpeta_drive, clientes.drive)
+                self._depurar(nombre, extension)
+
+    def _depurar(self, nombre, extension):
+        rutas = sorted(self.directorio.glob(f"{nombre}_*{extension}"))
+        for ruta in rutas[:-REPORTES_CONSERVAR]:
+            ruta.unlink(missing_ok=True)
+
+    def correr(self):
+        anterior, siguiente = self._programadas(datetime.now(ZONA_REPORTES))
+        reciente = [self.ultimo(tipo, formato) for tipo in NOMBRES_REPORTE for formato in self.formatos]
+        pendiente = any(r is None or r[1] < anterior for r in reciente)
+        while True:
+            if pendiente:
+                try:
+                    self.generar(datetime.now(ZONA_REPORTES))
+                    self.error = None
+                except Exception as e:
+                    self.error = f"{datetime.now(ZONA_REPORTES):%Y-%m-%d %H:%M}: {e}"
+            espera = (siguiente - datetime.now(ZONA_REPORTES)).total_seconds()
+            if espera > 0:
+                time.sleep(espera)
+            _, siguiente = self._programadas(datetime.now(ZONA_REPORTES))
+            pendiente = True
+
+@st.cache_resource
+def _reportes_programados():
+    """Programador del proceso, con su hilo, creado una sola vez. None si no hay horas configuradas."""
+    if not REPORTES_HORAS:
+        return None
+    reportes = ReportesProgramados(DATOS_DIR / "snapshots", REPORTES_HORAS, REPORTES_FORMATOS, REPORTES_DRIVE_FOLDER)
+    threading.Thread(target=reportes.correr, name="reportes", daemon=True).start()
+    return reportes
 
 def vista_descargas():
     st.subheader("📥 Descargas")
@@ -787,44 +3056,6 @@ def vista_descargas():
     #    .range(0,10000)
     #    .execute()
     #)
-    rows = fetch_all_bitacora()
-    resultado = pd.DataFrame(rows)
-    #resultado = pd.DataFrame(response.data)
-    resultado.rename(columns={
-        "NUM_SINIESTRO":"# DE SINIESTRO",
-        "CORRELATIVO":"CORRELATIVO",
-        "FECHA_SINIESTRO":"FECHA SINIESTRO",
-        "LUGAR_SINIESTRO":"LUGAR SINIESTRO",
-        "MEDIO":"MEDIO ASIGNACIÓN",
-        "COBERTURA":"COBERTURA",
-        "MARCA":"MARCA",
-        "SUBMARCA":"SUBMARCA",
-        "VERSION":"VERSIÓN",
-        "MODELO":"AÑO/MODELO",
-        "NO_SERIE":"NO. SERIE",
-        "MOTOR":"MOTOR",
-        "PATENTE":"PATENTE",
-        "FECHA_CREACION":"FECHA CREACIÓN",
-        "FECHA_ESTATUS_BITACORA":"FECHA ESTATUS BITÁCORA",
-        "ESTATUS":"ESTATUS",
-        "NOMBRE_ASEGURADO":"NOMBRE ASEGURADO",
-        "RUT_ASEGURADO":"RUT ASEGURADO",
-        "TIPO_DE_PERSONA_ASEGURADO":"TIPO DE PERSONA ASEGURADO",
-        "TEL_ASEGURADO":"TEL. ASEGURADO",
-        "CORREO_ASEGURADO":"CORREO ASEGURADO",
-        "DIRECCION_ASEGURADO":"DIRECCIÓN ASEGURADO",
-        "NOMBRE_PROPIETARIO":"NOMBRE PROPIETARIO",
-        "RUT_PROPIETARIO":"RUT PROPIETARIO",
-        "TIPO_DE_PERSONA_PROPIETARIO":"TIPO DE PERSONA PROPIETARIO",
-        "TEL_PROPIETARIO":"TEL. PROPIETARIO",
-        "CORREO_PROPIETARIO":"CORREO PROPIETARIO",
-        "DIRECCION_PROPIETARIO":"DIRECCIÓN PROPIETARIO",
-        "LIQUIDADOR":"LIQUIDADOR",
-        "CORREO_LIQUIDADOR":"CORREO LIQUIDADOR",
-        "DRIVE":"DRIVE",
-        "COMENTARIO":"COMENTARIO"
-    },inplace=True)
-
     st.write("Selecciona el tipo de bitácora a descargar.")
 
     opcion = st.selectbox(
@@ -836,83 +3067,155 @@ def vista_descargas():
         ],
         key="tipo_descarga"
     )
+    formato = st.radio(
+        "Formato",
+        list(FORMATOS_EXPORTACION),
+        horizontal=True,
+        key="formato_descarga"
+    )
+    extension, mime, _ = FORMATOS_EXPORTACION[formato]
+    tipo = {"Bitácora de operación": "operacion", "Bitácora de último estatus": "ultimo_estatus"}.get(opcion)
+
+    # --- REPORTE PROGRAMADO ---
+    # Si hay un reporte pre-generado se ofrece primero; el de los datos actuales se genera a pedido
+    reportes = _reportes_programados()
+    reciente = reportes.ultimo(tipo, formato) if reportes and tipo else None
+    if reciente:
+        ruta_reporte, fecha_reporte = reciente
+        with open(ruta_reporte, "rb") as archivo:
+            st.download_button(
+                label=f"Descargar reporte del {fecha_reporte:%d/%m/%Y %H:%M}",
+                icon="🕒",
+                use_container_width=True,
+                data=archivo,
+                file_name=ruta_reporte.name,
+                mime=mime,
+                key="descarga_programada"
+            )
+        if reportes.error:
+            st.caption(f"⚠️ Último reporte programado con error: {reportes.error}")
+        if not st.toggle("Generar con los datos actuales", key="descarga_actual"):
+            opcion = None
+
     # --- BITÁCORA DE OPERACIÓN ---
     if opcion == "Bitácora de operación":
-
-        resultado["FECHA ESTATUS BITÁCORA"] = pd.to_datetime(resultado["FECHA ESTATUS BITÁCORA"],errors="coerce")
-        resultado["FECHA SINIESTRO"] = pd.to_datetime(resultado["FECHA SINIESTRO"], errors="coerce")
-        resultado["FECHA CREACIÓN"] = pd.to_datetime(resultado["FECHA CREACIÓN"], errors = "coerce")
-        
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-            resultado.to_excel(writer, index=False, sheet_name="LOG")
-            ws = writer.book["LOG"]
-            header_fill = PatternFill("solid", fgColor="1F4E78")  # azul
-            header_font = Font(bold=True, color="FFFFFF")
-            header_align = Alignment(
-                horizontal="center",
-                vertical="center",
-                wrap_text=True
+        with st.spinner("Generando bitácora de operación..."):
+            ruta = exportar_bitacora("operacion", formato)
+
+        with open(ruta, "rb") as archivo:
+            st.download_button(
+                label="Descargar bitácora de operación",
+                icon="⬇️",
+                use_container_width=True,
+                disabled=False,
+                data=archivo,
+                file_name=f"Bitacora_Operación_SURA{extension}",
+                mime=mime
             )
 
-            for col_idx, cell in enumerate(ws[1], start=1):
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = header_align
-                ws.column_dimensions[get_column_letter(col_idx)].width = 22
-            ws.row_dimensions[1].height = 35
-
-        st.download_button(
-            label="Descargar bitácora de operación",
-            icon="⬇️",
-            use_container_width=True,
-            disabled=False,
-            data=buffer.getvalue(),
-            file_name="Bitacora_Operación_SURA.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-
     # --- BITÁCORA DE ÚLTIMO ESTATUS ---
     elif opcion == "Bitácora de último estatus":
-        resultado["FECHA ESTATUS BITÁCORA"] = pd.to_datetime(resultado["FECHA ESTATUS BITÁCORA"],errors="coerce")
-        resultado["FECHA SINIESTRO"] = pd.to_datetime(resultado["FECHA SINIESTRO"], errors="coerce")
-        resultado["FECHA CREACIÓN"] = pd.to_datetime(resultado["FECHA CREACIÓN"], errors = "coerce")
+        with st.spinner("Generando bitácora de último estatus..."):
+            ruta = exportar_bitacora("ultimo_estatus", formato)
+
+        with open(ruta, "rb") as archivo:
+            st.download_button(
+                label="Descargar bitácora de último estatus",
+                icon="⬇️",
+                use_container_width=True,
+                disabled=False,
+                data=archivo,
+                file_name=f"Bitacora_UltimoEstatus_SURA{extension}",
+                mime=mime
+            )
 
-        df_sorted = resultado.sort_values(
-            by=["# DE SINIESTRO", "FECHA ESTATUS BITÁCORA"],
-            ascending=[True, True]
-        )
+    if st.button("Volver al inicio",icon="⬅️",use_container_width=True,width=100):
+        st.session_state.vista = None
+        st.rerun()
 
-        df_ultimos = df_sorted.groupby("# DE SINIESTRO").tail(1)
-
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-            df_ultimos.to_excel(writer, index=False, sheet_name="LOG")
-            ws = writer.book["LOG"]
-            header_fill = PatternFill("solid", fgColor="1F4E78")  # azul
-            header_font = Font(bold=True, color="FFFFFF")
-            header_align = Alignment(
-                horizontal="center",
-                vertical="center",
-                wrap_text=True
-            )
+def vista_metricas():
+    st.subheader("⏱️ Métricas de tiempo")
+    st.write(
+        f"Duración de las consultas a Supabase, llamadas a Drive, envíos de correo, bcrypt y "
+        f"transformaciones de datos en los últimos {METRICAS_VENTANA_MIN} minutos, por vista."
+    )
 
-            for col_idx, cell in enumerate(ws[1], start=1):
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = header_align
-                ws.column_dimensions[get_column_letter(col_idx)].width = 22
-            ws.row_dimensions[1].height = 35
+    resumen = metricas.resumen()
+    if not resumen:
+        st.info("Todavía no hay mediciones en la ventana.")
+    else:
+        vistas = sorted({fila["vista"] for fila in resumen})
+        filtro = st.selectbox("Vista", ["Todas", *vistas], key="metricas_vista")
+        filas = [fila for fila in resumen if filtro == "Todas" or fila["vista"] == filtro]
+        st.dataframe(
+            [{
+                "OPERACIÓN": fila["operacion"],
+                "VISTA": fila["vista"],
+                "LLAMADAS": fila["llamadas"],
+                "ERRORES": fila["errores"],
+                "TOTAL (s)": round(fila["suma_s"], 2),
+                "PROMEDIO (ms)": round(fila["promedio_ms"], 1),
+                "P50 (ms)": round(fila["p50_ms"], 1),
+                "P95 (ms)": round(fila["p95_ms"], 1),
+                "P99 (ms)": round(fila["p99_ms"], 1),
+                "MÁXIMO (ms)": round(fila["maximo_ms"], 1),
+            } for fila in filas],
+            use_container_width=True,
+            hide_index=True
+        )
 
+    col1, col2, col3 = st.columns(3)
+    with col1:
         st.download_button(
-            label="Descargar bitácora de último estatus",
+            label="Prometheus",
             icon="⬇️",
             use_container_width=True,
-            disabled=False,
-            data=buffer.getvalue(),
-            file_name="Bitacora_UltimoEstatus_SURA.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            data=metricas.prometheus(),
+            file_name="metricas_sura.prom",
+            mime="text/plain; version=0.0.4"
         )
+    with col2:
+        st.download_button(
+            label="JSON",
+            icon="⬇️",
+            use_container_width=True,
+            data=metricas.json(),
+            file_name="metricas_sura.json",
+            mime="application/json"
+        )
+    with col3:
+        if st.button("Reiniciar métricas", icon="🗑️", use_container_width=True):
+            metricas.limpiar()
+            st.rerun()
+
+    # --- PERFILES DE RECARGA ---
+    st.subheader("🔥 Perfiles de recarga", divider="blue")
+    perfilador = _perfilador()
+    # Se guarda fuera de la llave del widget para que siga activo al cambiar de vista
+    st.session_state["perfilar_sesion"] = st.toggle(
+        "Perfilar mis recargas", value=st.session_state.get("perfilar_sesion", False)
+    )
+    todas = st.toggle("Perfilar las recargas de todas las sesiones", value=perfilador.todas)
+    if todas != perfilador.todas:
+        perfilador.todas = todas
+    if PERFIL_UMBRAL_MS:
+        st.caption(f"Además se guardan solas las recargas de más de {PERFIL_UMBRAL_MS} ms.")
+    st.caption("Los archivos están en formato collapsed: se abren en speedscope.app o con flamegraph.pl.")
+
+    perfiles = perfilador.recientes()
+    if perfiles:
+        perfil = st.selectbox("Perfil", perfiles, format_func=lambda ruta: ruta.stem, key="perfil_elegido")
+        with open(perfil, "rb") as archivo:
+            st.download_button(
+                label="Descargar perfil",
+                icon="⬇️",
+                use_container_width=True,
+                data=archivo,
+                file_name=perfil.name,
+                mime="text/plain"
+            )
+    else:
+        st.info("Todavía no hay perfiles guardados.")
 
     if st.button("Volver al inicio",icon="⬅️",use_container_width=True,width=100):
         st.session_state.vista = None
@@ -962,9 +3265,11 @@ def vista_registro_usuario():
                 st.error("La dirección de correo ingresada ya se encuentra asociada a un perfil de liquidador. Intenta nuevamente con una cuenta distinta.", icon="🚨")
                 return
 
+            with medir("bcrypt.hashpw"):
+                password_hash = bcrypt.hashpw(str(password).encode("utf-8"),bcrypt.gensalt()).decode("utf-8")
             supabase.table("Login").insert({
                 "USUARIO": correo,
-                "PASSWORD": bcrypt.hashpw(str(password).encode("utf-8"),bcrypt.gensalt()).decode("utf-8"),
+                "PASSWORD": password_hash,
                 "ROL": rol,
                 "LIQUIDADOR": usuario.upper()
             }).execute()
@@ -985,15 +3290,17 @@ def vista_registro_usuario():
             
             Saludos.
             """
-            yag = yagmail.SMTP(REMITENTE, CLAVE_APP)
+            import yagmail
+            with medir("smtp.enviar"):
+                yag = yagmail.SMTP(REMITENTE, CLAVE_APP)
 
-            #Se envía el correo a los destinatarios con la estructura establecida en el item contents
+                #Se envía el correo a los destinatarios con la estructura establecida en el item contents
 
-            yag.send(
-                to=DESTINATARIO, 
-                subject=ASUNTO, 
-                contents=[MENSAJE]
-                )
+                yag.send(
+                    to=DESTINATARIO, 
+                    subject=ASUNTO, 
+                    contents=[MENSAJE]
+                    )
         
     if st.button("Volver al inicio",icon="⬅️",use_container_width=True,width=100):
         st.session_state.vista = None
@@ -1042,7 +3349,12 @@ def kpi_card(backcolor, border, text1, text2, valor):
         unsafe_allow_html=True
         )
 
+# Columnas que necesita el dashboard general (de las 32 de la bitácora)
+COLUMNAS_DASH = ["NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA", "FECHA_CREACION", "ESTATUS", "LIQUIDADOR"]
+
 def dash_general():
+    import pandas as pd
+    import altair as alt
     Liquidador_Nombre = st.session_state["LIQUIDADOR"]
     st.header(f"¡HOLA, {Liquidador_Nombre}!")
 
@@ -1053,30 +3365,12 @@ def dash_general():
    # .range(0,10000)
    # .execute()
    # )
-    rows = fetch_all_bitacora()
-    df_dash = pd.DataFrame(rows)
-    #df_dash = pd.DataFrame(response.data)
-    df_dash["FECHA_ESTATUS_BITACORA"] = pd.to_datetime(df_dash["FECHA_ESTATUS_BITACORA"],errors="coerce")
-    df_dash["FECHA_CREACION"] = pd.to_datetime(df_dash["FECHA_CREACION"], errors="coerce")
-    df_dash = (df_dash.sort_values(by=["NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA"],ascending=[True, True]).groupby("NUM_SINIESTRO").tail(1))
-
-    estatus_cierre = [
-    "PAGO LIBERADO",
-    "CIERRE POR DESISTIMIENTO",
-    "CIERRE POR RECHAZO",
-    "DERIVADO A PARCIALES"
-    ]
-
-    df_cerrados = df_dash[df_dash["ESTATUS"].isin(estatus_cierre)]
-    df_cerrados["DIAS_HABILES"] = np.busday_count(df_cerrados["FECHA_CREACION"].values.astype("datetime64[D]"), 
-                                                  df_cerrados["FECHA_ESTATUS_BITACORA"].values.astype("datetime64[D]"))
+    kpis = kpis_dashboard()
 
-    #df_cerrados = df_dash[(df_dash["ESTATUS"] == "PAGO LIBERADO") | (df_dash["ESTATUS"] == "SOLICITUD DE PAGO GENERADA")]
-    
-    total_siniestros = df_dash.shape[0]
-    total_cerrados = df_cerrados.shape[0]
+    total_siniestros = kpis["total"]
+    total_cerrados = kpis["cerrados"]
     Per_cerrados = str(int((total_cerrados/total_siniestros)*100)) + " %"
-    promedio_dias_cierre = round(df_cerrados["DIAS_HABILES"].mean(), 1)
+    promedio_dias_cierre = round(kpis["promedio_dias"], 1)
 
 
     st.subheader("MÉTRICAS GENERALES",divider="blue")
@@ -1099,8 +3393,9 @@ def dash_general():
     st.divider()
     col1, col2 = st.columns(2)
 
-    count_estatus = df_dash.groupby("ESTATUS").size().reset_index(name="TOTAL")
-    count_liquidador = df_dash.groupby("LIQUIDADOR").size().reset_index(name="TOTAL")
+    with medir("pandas.dash_general"):
+        count_estatus = pd.DataFrame(list(kpis["por_estatus"].items()), columns=["ESTATUS", "TOTAL"])
+        count_liquidador = pd.DataFrame(list(kpis["por_liquidador"].items()), columns=["LIQUIDADOR", "TOTAL"])
 
     with col1:
         st.markdown("### TOTAL DE SINIESTROS POR ESTATUS")
@@ -1126,17 +3421,12 @@ def dash_general():
         st.altair_chart(chart_liquidador, use_container_width=True)
     
 def dash_liquidador():
+    import pandas as pd
     st.divider()
     Liquidador = st.session_state["LIQUIDADOR"]
-    response = (
-    supabase
-    .table("BitacoraOperaciones")
-    .select("*")
-    .eq("LIQUIDADOR", Liquidador)
-    .execute()
-    )
+    asignados = ultimo_estatus_liquidador(Liquidador)
 
-    if not response.data:
+    if not asignados:
         st.subheader("MÉTRICAS PARTICULARES",divider="blue")
 
         st.markdown(
@@ -1155,43 +3445,10 @@ def dash_liquidador():
         unsafe_allow_html=True
         )
     else:
-        df_dash = pd.DataFrame(response.data)
-        df_dash["FECHA_ESTATUS_BITACORA"] = pd.to_datetime(df_dash["FECHA_ESTATUS_BITACORA"],errors="coerce")
-        df_dash = (df_dash.sort_values(by=["NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA"],ascending=[True, True]).groupby("NUM_SINIESTRO").tail(1))
-        df_dash.rename(columns={
-                "NUM_SINIESTRO":"# DE SINIESTRO",
-                "CORRELATIVO":"CORRELATIVO",
-                "FECHA_SINIESTRO":"FECHA SINIESTRO",
-                "LUGAR_SINIESTRO":"LUGAR SINIESTRO",
-                "MEDIO":"MEDIO ASIGNACIÓN",
-                "COBERTURA":"COBERTURA",
-                "MARCA":"MARCA",
-                "SUBMARCA":"SUBMARCA",
-                "VERSION":"VERSIÓN",
-                "MODELO":"AÑO/MODELO",
-                "NO_SERIE":"NO. SERIE",
-                "MOTOR":"MOTOR",
-                "PATENTE":"PATENTE",
-                "FECHA_CREACION":"FECHA CREACIÓN",
-                "FECHA_ESTATUS_BITACORA":"FECHA ESTATUS BITÁCORA",
-                "ESTATUS":"ESTATUS",
-                "NOMBRE_ASEGURADO":"NOMBRE ASEGURADO",
-                "RUT_ASEGURADO":"RUT ASEGURADO",
-                "TIPO_DE_PERSONA_ASEGURADO":"TIPO DE PERSONA ASEGURADO",
-                "TEL_ASEGURADO":"TEL. ASEGURADO",
-                "CORREO_ASEGURADO":"CORREO ASEGURADO",
-                "DIRECCION_ASEGURADO":"DIRECCIÓN ASEGURADO",
-                "NOMBRE_PROPIETARIO":"NOMBRE PROPIETARIO",
-                "RUT_PROPIETARIO":"RUT PROPIETARIO",
-                "TIPO_DE_PERSONA_PROPIETARIO":"TIPO DE PERSONA PROPIETARIO",
-                "TEL_PROPIETARIO":"TEL. PROPIETARIO",
-                "CORREO_PROPIETARIO":"CORREO PROPIETARIO",
-                "DIRECCION_PROPIETARIO":"DIRECCIÓN PROPIETARIO",
-                "LIQUIDADOR":"LIQUIDADOR",
-                "CORREO_LIQUIDADOR":"CORREO LIQUIDADOR",
-                "DRIVE":"DRIVE",
-                "COMENTARIO":"COMENTARIO"
-            },inplace=True)
+        with medir("pandas.dash_liquidador"):
+            df_dash = pd.DataFrame(asignados).sort_values(by=["NUM_SINIESTRO"])
+            df_dash["FECHA_ESTATUS_BITACORA"] = pd.to_datetime(df_dash["FECHA_ESTATUS_BITACORA"],errors="coerce")
+            df_dash.rename(columns=COLUMNAS_VISIBLES,inplace=True)
 
         st.subheader("MÉTRICAS PARTICULARES",divider="blue")
 
@@ -1216,6 +3473,143 @@ def dash_liquidador():
 
 
 
+# =======================================================
+#           PERFILES DE RECARGA (MUESTREO)
+# =======================================================
+# Recargas más lentas que esto (ms) se perfilan y guardan solas; 0 lo desactiva
+PERFIL_UMBRAL_MS = int(st.secrets.get("PERFIL_UMBRAL_MS", 0))
+# Cada cuánto se toma una muestra de la pila, en ms
+PERFIL_INTERVALO_MS = int(st.secrets.get("PERFIL_INTERVALO_MS", 10))
+# Perfiles que se conservan en disco (los más antiguos se borran)
+PERFIL_CONSERVAR = int(st.secrets.get("PERFIL_CONSERVAR", 200))
+
+class PerfiladorMuestreo:
+    """Perfilador por muestreo compartido por todas las sesiones.
+
+    Un solo hilo toma cada `intervalo` la pila de los hilos registrados (sys._current_frames) y
+    cuenta cuántas veces aparece cada una. Al terminar la recarga las pilas se guardan en formato
+    "collapsed" (una línea "func (archivo:línea);...;func (archivo:línea) N" por pila), que se abre
+    directo en speedscope o flamegraph.pl. Las pilas empiezan en el <module> de app.py, sin los
+    marcos de Streamlit que lo ejecutan. Los hilos de un ThreadPoolExecutor lanzado durante la
+    recarga se suman al mismo perfil bajo "(hilo paralelo)".
+    """
+
+    def __init__(self, directorio, intervalo_ms, conservar, script):
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.intervalo = intervalo_ms / 1000
+        self.conservar = conservar
+        self.script = script
+        self.lock = threading.Lock()
+        self.activos = {}
+        self.hijos = {}
+        self.hay_activos = threading.Event()
+        # Activado desde MÉTRICAS: perfila todas las recargas de todas las sesiones
+        self.todas = False
+
+    def iniciar(self, ident):
+        with self.lock:
+            self.activos[ident] = Counter()
+            self.hay_activos.set()
+
+    def unir(self, ident, padre):
+        """Muestrea el hilo `ident` dentro del perfil de `padre`, si este se está perfilando."""
+        with self.lock:
+            if padre in self.activos:
+                self.activos[ident] = self.activos[padre]
+                self.hijos.setdefault(padre, []).append(ident)
+
+    def terminar(self, ident):
+        with self.lock:
+            for hijo in self.hijos.pop(ident, []):
+                self.activos.pop(hijo, None)
+            muestras = self.activos.pop(ident, Counter())
+            if not self.activos:
+                self.hay_activos.clear()
+            return muestras
+
+    def _pila(self, marco):
+        pila = []
+        while marco is not None:
+            codigo = marco.f_code
+            pila.append(f"{codigo.co_name} ({Path(codigo.co_filename).name}:{marco.f_lineno})")
+            if codigo.co_filename == self.script and codigo.co_name == "<module>":
+                break
+            if codigo.co_name == "_worker" and Path(codigo.co_filename).parts[-2:] == ("futures", "thread.py"):
+                pila[-1] = "(hilo paralelo)"
+                break
+            marco = marco.f_back
+        return ";".join(reversed(pila))
+
+    def correr(self):
+        while True:
+            self.hay_activos.wait()
+            time.sleep(self.intervalo)
+            marcos = sys._current_frames()
+            with self.lock:
+                activos = list(self.activos.items())
+            for ident, muestras in activos:
+                marco = marcos.get(ident)
+                pila = self._pila(marco) if marco is not None else None
+                # Un hilo del pool sin tarea solo muestra su propio marco de espera
+                if pila and pila != "(hilo paralelo)":
+                    muestras[pila] += 1
+            del marcos
+
+    def guardar(self, muestras, vista, ms, motivo, filas, siniestros):
+        """Escribe el perfil; el nombre lleva la vista, la duración y las filas de la bitácora en memoria."""
+        vista = re.sub(r"\W+", "_", vista)
+        nombre = (
+            f"{datetime.now():%Y%m%d-%H%M%S}_{vista}_{ms:.0f}ms_{filas}filas_"
+            f"{siniestros}siniestros_{motivo}_{uuid.uuid4().hex[:6]}.folded"
+        )
+        ruta = self.directorio / nombre
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            for pila, conteo in muestras.most_common():
+                archivo.write(f"{pila} {conteo}\n")
+        for anterior in self.recientes()[self.conservar:]:
+            anterior.unlink(missing_ok=True)
+        return ruta
+
+    def recientes(self):
+        return sorted(self.directorio.glob("*.folded"), key=lambda r: r.name, reverse=True)
+
+
+@st.cache_resource
+def _perfilador():
+    perfilador = PerfiladorMuestreo(DATOS_DIR / "perfiles", PERFIL_INTERVALO_MS, PERFIL_CONSERVAR, __file__)
+    threading.Thread(target=perfilador.correr, name="perfilador", daemon=True).start()
+    return perfilador
+
+def _filas_en_memoria():
+    """(eventos, siniestros) de la bitácora más grande que tiene cargada el proceso."""
+    motores = list(_sincronizadores()["por_columnas"].values())
+    filas = max((len(m.filas) for m in motores if m.filas is not None), default=0)
+    siniestros = max((len(m.ultimos) for m in motores), default=0)
+    return filas, siniestros
+
+@contextmanager
+def perfilar_recarga():
+    """Perfila la recarga si la sesión o el administrador lo pidió, o si supera PERFIL_UMBRAL_MS."""
+    perfilador = _perfilador()
+    manual = st.session_state.get("perfilar_sesion") or perfilador.todas
+    if not manual and not PERFIL_UMBRAL_MS:
+        yield
+        return
+
+    vista = _vista_actual()
+    ident = threading.get_ident()
+    perfilador.iniciar(ident)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - inicio) * 1000
+        muestras = perfilador.terminar(ident)
+        if muestras and (manual or ms >= PERFIL_UMBRAL_MS):
+            perfilador.guardar(muestras, vista, ms, "manual" if manual else "auto", *_filas_en_memoria())
+
+
 # =======================================================
 #               VISTA LIQUIDADOR
 # =======================================================
@@ -1240,6 +3634,12 @@ def vista_liquidador():
 
         if st.button("SUBIR ARCHIVOS", use_container_width=True, icon="⬆️"):
             st.session_state.vista = "CARGA"
+
+        if st.button("CARGA MASIVA", use_container_width=True, icon="📑"):
+            st.session_state.vista = "CARGA_MASIVA"
+
+        if st.button("ESTATUS MASIVO", use_container_width=True, icon="📌"):
+            st.session_state.vista = "ESTATUS_MASIVO"
     with st.sidebar:
         if st.button("BUSCAR / CONSULTAR", use_container_width=True, icon="🔎"):
             st.session_state.vista = "BUSCAR"
@@ -1250,21 +3650,28 @@ def vista_liquidador():
     # =====================================================================================
     #                                REGISTRAR SINIESTRO
     # =====================================================================================
-    if st.session_state.vista == "REGISTRAR":
-        registro_siniestro()
+    with perfilar_recarga():
+        if st.session_state.vista == "REGISTRAR":
+            registro_siniestro()
 
-    elif st.session_state.vista == "ACTUALIZAR":
-        vista_modificar_siniestro()
-    
-    elif st.session_state.vista == "CARGA":
-        panel_subir_documentos()
+        elif st.session_state.vista == "ACTUALIZAR":
+            vista_modificar_siniestro()
+        
+        elif st.session_state.vista == "CARGA":
+            panel_subir_documentos()
 
-    elif st.session_state.vista == "BUSCAR":
-        vista_buscar_siniestro()
+        elif st.session_state.vista == "CARGA_MASIVA":
+            vista_carga_masiva()
 
-    elif st.session_state.vista == None:
-        dash_general()
-        dash_liquidador()
+        elif st.session_state.vista == "ESTATUS_MASIVO":
+            vista_estatus_masivo()
+
+        elif st.session_state.vista == "BUSCAR":
+            vista_buscar_siniestro()
+
+        elif st.session_state.vista == None:
+            dash_general()
+            dash_liquidador()
     
 
 # =======================================================
@@ -1289,6 +3696,9 @@ def vista_admin():
         if st.button("USUARIOS", use_container_width=True, icon="👥"):
             st.session_state.vista = "USUARIOS"
 
+        if st.button("MÉTRICAS", use_container_width=True, icon="⏱️"):
+            st.session_state.vista = "METRICAS"
+
     with st.sidebar.expander("GESTIÓN DE SINIESTRO", expanded=False):
         if st.button("REGISTRAR", use_container_width=True, icon="📄"):
             st.session_state.vista = "REGISTRAR"
@@ -1299,6 +3709,12 @@ def vista_admin():
         if st.button("SUBIR ARCHIVOS", use_container_width=True, icon="⬆️"):
             st.session_state.vista = "CARGA"
 
+        if st.button("CARGA MASIVA", use_container_width=True, icon="📑"):
+            st.session_state.vista = "CARGA_MASIVA"
+
+        if st.button("ESTATUS MASIVO", use_container_width=True, icon="📌"):
+            st.session_state.vista = "ESTATUS_MASIVO"
+
     with st.sidebar:
         if st.button("BUSCAR / CONSULTAR", use_container_width=True, icon="🔎"):
             st.session_state.vista = "BUSCAR"
@@ -1309,26 +3725,36 @@ def vista_admin():
     # =====================================================================================
     #                                REGISTRAR SINIESTRO
     # =====================================================================================
-    if st.session_state.vista == "REGISTRAR":
-        registro_siniestro()
-    elif st.session_state.vista == "ACTUALIZAR":
-        vista_modificar_siniestro()
-    elif st.session_state.vista == "CARGA":
-        panel_subir_documentos()
-    elif st.session_state.vista == None:
-        dash_general()
-        dash_liquidador()
-
-    # =====================================================================================
-    #                                BUSCAR / ACTUALIZAR
-    # =====================================================================================
-
-    elif st.session_state.vista == "BUSCAR":
-        vista_buscar_siniestro()
-    elif st.session_state.vista == "DESCARGA":
-        vista_descargas()
-    elif st.session_state.vista == "USUARIOS":
-        vista_registro_usuario()
+    with perfilar_recarga():
+        if st.session_state.vista == "REGISTRAR":
+            registro_siniestro()
+        elif st.session_state.vista == "ACTUALIZAR":
+            vista_modificar_siniestro()
+        elif st.session_state.vista == "CARGA":
+            panel_subir_documentos()
+        elif st.session_state.vista == "CARGA_MASIVA":
+            vista_carga_masiva()
+        elif st.session_state.vista == "ESTATUS_MASIVO":
+            vista_estatus_masivo()
+        elif st.session_state.vista == None:
+            dash_general()
+            dash_liquidador()
+
+        # =====================================================================================
+        #                                BUSCAR / ACTUALIZAR
+        # =====================================================================================
+
+        elif st.session_state.vista == "BUSCAR":
+            vista_buscar_siniestro()
+        elif st.session_state.vista == "DESCARGA":
+            vista_descargas()
+        elif st.session_state.vista == "USUARIOS":
+            vista_registro_usuario()
+        elif st.session_state.vista == "METRICAS":
+            vista_metricas()
+
+# Los reportes programados corren aunque nadie haya iniciado sesión
+_reportes_programados()
 
 # =======================================================
 #                 CONTROL DE SESIÓN
@@ -0,0 +1,94 @@
+"""Mide el arranque en frío de app.py hasta el primer render del login y del panel de administrador.
+
+Cada medición corre en un proceso nuevo de Python, así que incluye los imports de la aplicación
+igual que el primer usuario que entra después de un reinicio. El proceso hijo ejecuta app.py con
+AppTest usando los secrets indicados y reporta:
+    - proceso: desde que arranca el intérprete hasta terminar la primera ejecución del script.
+    - script:  solo la primera ejecución de app.py (imports de la app, clientes y la vista).
+    - módulos pesados que quedaron cargados al terminar.
+
+La vista "login" no inicia sesión; la vista "admin" entra con ROL ADMINISTRADOR y muestra el
+dashboard general de vista_admin(), que sí consulta la bitácora.
+
+Uso:
+    python bench/bench_arranque.py --secrets .streamlit/secrets.toml --repeticiones 5
+    python bench/bench_arranque.py --vistas login
+"""
+import time
+
+INICIO_PROCESO = time.perf_counter()
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+APP = Path(__file__).resolve().parent.parent / "app.py"
+MODULOS_PESADOS = ["pandas", "numpy", "altair", "openpyxl", "yagmail", "googleapiclient", "pyarrow"]
+
+
+def hijo(vista, ruta_secrets):
+    """Una medición: primera ejecución de app.py en este proceso recién creado."""
+    import tomllib
+    from streamlit.testing.v1 import AppTest
+
+    with open(ruta_secrets, "rb") as archivo:
+        secrets = tomllib.load(archivo)
+
+    at = AppTest.from_file(str(APP), default_timeout=300)
+    for clave, valor in secrets.items():
+        at.secrets[clave] = valor
+    if vista == "admin":
+        at.session_state["auth"] = True
+        at.session_state["ROL"] = "ADMINISTRADOR"
+        at.session_state["LIQUIDADOR"] = "BENCH"
+        at.session_state["USUARIO"] = "bench@local"
+        at.session_state["vista"] = None
+
+    inicio = time.perf_counter()
+    at.run()
+    fin = time.perf_counter()
+
+    print(json.dumps({
+        "proceso": (fin - INICIO_PROCESO) * 1000,
+        "script": (fin - inicio) * 1000,
+        "errores": [e.message for e in at.exception],
+        "modulos": [m for m in MODULOS_PESADOS if m in sys.modules],
+    }))
+
+
+def medir(vista, ruta_secrets):
+    salida = subprocess.run(
+        [sys.executable, __file__, "--hijo", vista, "--secrets", ruta_secrets],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--vistas", nargs="+", default=["login", "admin"], choices=["login", "admin"])
+    parser.add_argument("--hijo", choices=["login", "admin"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        hijo(args.hijo, args.secrets)
+        return
+
+    for vista in args.vistas:
+        mediciones = [medir(vista, args.secrets) for _ in range(args.repeticiones)]
+        errores = {e for m in mediciones for e in m["errores"]}
+        proceso = statistics.median(m["proceso"] for m in mediciones)
+        script = statistics.median(m["script"] for m in mediciones)
+        print(f"{vista:<6} proceso {proceso:8.1f} ms   script {script:8.1f} ms   "
+              f"módulos: {', '.join(mediciones[-1]['modulos']) or '-'}")
+        for error in errores:
+            print(f"       error en la vista: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Mide cuánto tiempo de cada recarga se ahorra con el registro de clientes de app.py.
+
+Antes, cada recarga creaba el cliente de Supabase, las credenciales de la cuenta de servicio,
+el cliente de gspread y el servicio de Drive. Ahora se crean una vez por proceso y cada
+recarga solo los toma de st.cache_resource. El script cronometra ambas formas con los
+mismos secrets que usa la aplicación.
+
+Uso:
+    python bench/bench_clientes.py --secrets .streamlit/secrets.toml --repeticiones 20
+"""
+import argparse
+import statistics
+import time
+import tomllib
+
+import streamlit as st
+from google.oauth2.service_account import Credentials
+from googleapiclient.discovery import build
+from supabase import create_client
+
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+
+def clientes_por_recarga(secrets):
+    """Lo que hacía app.py al inicio de cada recarga."""
+    supabase = create_client(secrets["SUPABASE_URL"], secrets["SUPABASE_KEY"])
+    creds = Credentials.from_service_account_info(secrets["gcp_service_account"], scopes=SCOPE)
+    try:
+        import gspread
+        gspread.authorize(creds)
+    except ImportError:
+        pass
+    drive = build("drive", "v3", credentials=creds)
+    return supabase, drive
+
+
+def cronometrar(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def resumen(nombre, tiempos):
+    tiempos = sorted(tiempos)
+    p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+    print(f"{nombre:<28} mediana {statistics.median(tiempos):8.2f} ms   p95 {p95:8.2f} ms")
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.secrets, "rb") as archivo:
+        secrets = tomllib.load(archivo)
+
+    @st.cache_resource
+    def registro():
+        return clientes_por_recarga(secrets)
+
+    registro()  # primera carga del proceso, igual que en la aplicación
+    antes = resumen("clientes en cada recarga", cronometrar(lambda: clientes_por_recarga(secrets), args.repeticiones))
+    ahora = resumen("registro compartido", cronometrar(registro, args.repeticiones))
+    print(f"{'ahorro por recarga':<28} {antes - ahora:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
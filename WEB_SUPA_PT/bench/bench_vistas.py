@@ -0,0 +1,144 @@
+"""Tiempo de cada vista de app.py con 1k, 100k y 1M eventos, sin Supabase ni Drive reales.
+
+La aplicación corre con BACKEND = "local" (servicios_locales.py): la bitácora sintética vive en
+SQLite en memoria y Drive en un diccionario, cada uno con la latencia indicada por llamada.
+Para cada tamaño se limpian st.cache_resource y st.cache_data, se usa una carpeta DATOS_DIR
+nueva y se mide con AppTest la acción principal de cada vista:
+
+    dash_general             abrir el inicio del administrador
+    vista_buscar_siniestro   buscar un siniestro existente
+    vista_descargas          generar la bitácora de operación en Excel
+    registro_siniestro       enviar el formulario de alta (queda en la bandeja de salida)
+
+"primera" es la primera vez que se hace la acción con ese tamaño (cachés frías) y
+"siguientes" la mediana de las repeticiones posteriores.
+
+Uso:
+    python bench/bench_vistas.py
+    python bench/bench_vistas.py --eventos 1000 100000 --repeticiones 5 --latencia-supabase 40
+"""
+import argparse
+import random
+import resource
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP = Path(__file__).resolve().parent.parent / "app.py"
+
+
+def nueva_sesion(secrets, vista):
+    at = AppTest.from_file(str(APP), default_timeout=1800)
+    for clave, valor in secrets.items():
+        at.secrets[clave] = valor
+    at.session_state["auth"] = True
+    at.session_state["ROL"] = "ADMINISTRADOR"
+    at.session_state["LIQUIDADOR"] = "BENCH"
+    at.session_state["USUARIO"] = "bench@local"
+    at.session_state["vista"] = vista
+    return at
+
+
+def boton(at, etiqueta):
+    return next(b for b in at.button if b.label == etiqueta)
+
+
+def revisar(at, vista):
+    if at.exception:
+        raise RuntimeError(f"{vista}: {at.exception[0].message}")
+    return at
+
+
+class Escenarios:
+    """Cada escenario prepara la sesión y devuelve la acción a cronometrar."""
+
+    def __init__(self, secrets, eventos):
+        self.secrets = secrets
+        self.siniestros = max(1, eventos // 5)
+        self.altas = 0
+
+    def dash_general(self):
+        at = nueva_sesion(self.secrets, None)
+        return lambda: revisar(at.run(), "dash_general")
+
+    def vista_buscar_siniestro(self):
+        at = nueva_sesion(self.secrets, "BUSCAR")
+        at.run()
+
+        def buscar():
+            at.text_input[0].set_value(str(40000000 + random.randrange(self.siniestros)))
+            revisar(boton(at, "Buscar").click().run(), "vista_buscar_siniestro")
+        return buscar
+
+    def vista_descargas(self):
+        at = nueva_sesion(self.secrets, "DESCARGA")
+        at.run()
+        at.selectbox(key="tipo_descarga").set_value("Bitácora de operación")
+        return lambda: revisar(at.run(), "vista_descargas")
+
+    def registro_siniestro(self):
+        at = nueva_sesion(self.secrets, "REGISTRAR")
+        at.run()
+
+        def registrar():
+            self.altas += 1
+            at.text_input(key="siniestro_num").set_value(f"BENCH-{self.altas}")
+            at.text_input(key="aseg_correo").set_value("bench@correo.cl")
+            revisar(boton(at, "Guardar").click().run(), "registro_siniestro")
+        return registrar
+
+
+def medir(accion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones + 1):
+        inicio = time.perf_counter()
+        accion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos[0], statistics.median(tiempos[1:]) if repeticiones else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eventos", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--latencia-supabase", type=float, default=20, help="ms por consulta")
+    parser.add_argument("--latencia-drive", type=float, default=50, help="ms por llamada o bloque")
+    parser.add_argument("--vistas", nargs="+", default=["dash_general", "vista_buscar_siniestro", "vista_descargas", "registro_siniestro"])
+    args = parser.parse_args()
+
+    print(f"{'eventos':>10}  {'vista':<24} {'primera ms':>12} {'siguientes ms':>14}")
+    for eventos in args.eventos:
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        secrets = {
+            "BACKEND": "local",
+            "LOCAL_EVENTOS": eventos,
+            "LOCAL_LATENCIA_SUPABASE_MS": args.latencia_supabase,
+            "LOCAL_LATENCIA_DRIVE_MS": args.latencia_drive,
+            "DATOS_DIR": tempfile.mkdtemp(prefix=f"bench_{eventos}_"),
+        }
+
+        # Primera ejecución: genera los datos sintéticos (no se cuenta en las vistas)
+        inicio = time.perf_counter()
+        at = AppTest.from_file(str(APP), default_timeout=1800)
+        for clave, valor in secrets.items():
+            at.secrets[clave] = valor
+        at.run()
+        revisar(at, "login")
+        print(f"{eventos:>10}  {'(datos sintéticos)':<24} {(time.perf_counter() - inicio) * 1000:>12.1f}")
+
+        escenarios = Escenarios(secrets, eventos)
+        for vista in args.vistas:
+            accion = getattr(escenarios, vista)()
+            primera, siguientes = medir(accion, args.repeticiones)
+            print(f"{eventos:>10}  {vista:<24} {primera:>12.1f} {siguientes:>14.1f}")
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{eventos:>10}  {'(RSS máximo MB)':<24} {rss:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
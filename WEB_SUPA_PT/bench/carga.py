@@ -0,0 +1,274 @@
+"""Prueba de carga: N sesiones simultáneas de app.py en un mismo proceso, con los servicios locales.
+
+Cada sesión es un AppTest en su propio hilo. Inicia sesión con un usuario de prueba de
+servicios_locales.py y luego, hasta que se acaba el tiempo, elige flujos al azar con una pausa
+entre acciones, como lo haría un liquidador:
+
+    login         escribir usuario y contraseña e ingresar (bcrypt incluido)
+    dashboard     volver al inicio (dash_general y, para liquidadores, dash_liquidador)
+    buscar        abrir BUSCAR y buscar un siniestro existente
+    seguimiento   abrir ACTUALIZAR, cargar un siniestro y agregar un estatus
+    descarga      (solo administradores) generar la bitácora de último estatus en CSV
+
+Se reporta por flujo la latencia de cada recarga (p50/p95/p99), los errores y el rendimiento
+(recargas y flujos por segundo), además de la memoria residente del proceso.
+
+Uso:
+    python bench/carga.py --sesiones 40 --duracion 60
+    python bench/carga.py --sesiones 10 --admins 2 --eventos 100000 --latencia-supabase 40
+    python bench/carga.py --sesiones 40 --normalizado
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import defaultdict
+from pathlib import Path
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+
+APP = Path(__file__).resolve().parent.parent / "app.py"
+sys.path.insert(0, str(APP.parent))
+
+from servicios_locales import LIQUIDADORES, correo_liquidador  # noqa: E402
+
+# AppTest compila app.py en cada recarga (un ScriptCache nuevo por ejecución) y en Python 3.11
+# compilar desde varios hilos a la vez puede fallar en ast.parse. El servidor real comparte un
+# solo ScriptCache entre sesiones; aquí se hace lo mismo con el bytecode ya compilado.
+COMPILACION = threading.Lock()
+BYTECODE = {}
+_get_bytecode = ScriptCache.get_bytecode
+
+
+def _bytecode_compartido(self, script_path):
+    with COMPILACION:
+        if script_path not in BYTECODE:
+            BYTECODE[script_path] = _get_bytecode(self, script_path)
+        return BYTECODE[script_path]
+
+
+ScriptCache.get_bytecode = _bytecode_compartido
+
+# Al terminar cada ejecución AppTest deja Runtime._instance en None, lo que rompe a las otras
+# sesiones que siguen corriendo; mientras dure la carga se mantiene visible el último runtime.
+_ultimo_runtime = [None]
+
+
+def _runtime_vigente(cls):
+    if cls._instance is not None:
+        _ultimo_runtime[0] = cls._instance
+    if _ultimo_runtime[0] is None:
+        raise RuntimeError("Runtime hasn't been created!")
+    return _ultimo_runtime[0]
+
+
+Runtime.instance = classmethod(_runtime_vigente)
+Runtime.exists = classmethod(lambda cls: cls._instance is not None or _ultimo_runtime[0] is not None)
+
+PESOS = {"dashboard": 3, "buscar": 3, "seguimiento": 2, "descarga": 1}
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano; nan si no hay valores."""
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))]
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Resultados:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.recargas = defaultdict(list)
+        self.flujos = defaultdict(int)
+        self.errores = defaultdict(int)
+        self.ultimo_error = {}
+
+    def recarga(self, flujo, ms):
+        with self.lock:
+            self.recargas[flujo].append(ms)
+
+    def flujo(self, flujo, error=None):
+        with self.lock:
+            self.flujos[flujo] += 1
+            if error:
+                self.errores[flujo] += 1
+                self.ultimo_error[flujo] = error
+
+
+class Sesion:
+    def __init__(self, secrets, usuario, admin, resultados, siniestros, azar):
+        self.secrets = secrets
+        self.usuario = usuario
+        self.admin = admin
+        self.resultados = resultados
+        self.siniestros = siniestros
+        self.azar = azar
+        self.at = None
+
+    def _run(self, flujo, paso):
+        inicio = time.perf_counter()
+        paso.run()
+        self.resultados.recarga(flujo, (time.perf_counter() - inicio) * 1000)
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+
+    def _boton(self, etiqueta):
+        return next(b for b in self.at.button if b.label == etiqueta)
+
+    def _siniestro(self):
+        return str(40000000 + self.azar.randrange(self.siniestros))
+
+    def _vista(self, vista):
+        self.at.session_state["vista"] = vista
+
+    def login(self):
+        self.at = AppTest.from_file(str(APP), default_timeout=600)
+        for clave, valor in self.secrets.items():
+            self.at.secrets[clave] = valor
+        self._run("login", self.at)
+        self.at.text_input[0].set_value(self.usuario)
+        self.at.text_input[1].set_value(self.secrets["LOCAL_CLAVE"])
+        self._run("login", self.at)
+        self._run("login", self._boton("Ingresar").click())
+        if not self.at.session_state["auth"]:
+            raise RuntimeError("no se pudo iniciar sesión")
+
+    def dashboard(self):
+        self._vista(None)
+        self._run("dashboard", self.at)
+
+    def buscar(self):
+        self._vista("BUSCAR")
+        self._run("buscar", self.at)
+        self.at.text_input[0].set_value(self._siniestro())
+        self._run("buscar", self._boton("Buscar").click())
+
+    def seguimiento(self):
+        self._vista("ACTUALIZAR")
+        self._run("seguimiento", self.at)
+        self.at.text_input[0].set_value(self._siniestro())
+        self._run("seguimiento", self.at)
+        self.at.selectbox[-1].set_value("ASIGNADO")
+        self._run("seguimiento", self._boton("Agregar estatus").click())
+
+    def descarga(self):
+        self._vista("DESCARGA")
+        self._run("descarga", self.at)
+        self.at.selectbox(key="tipo_descarga").set_value("Bitácora de último estatus")
+        self.at.radio(key="formato_descarga").set_value("CSV (.csv)")
+        self._run("descarga", self.at)
+
+    def ejecutar(self, flujo):
+        try:
+            getattr(self, flujo)()
+            self.resultados.flujo(flujo)
+            return True
+        except Exception as e:
+            linea = [f for f in traceback.extract_tb(e.__traceback__) if f.filename == __file__][-1]
+            self.resultados.flujo(flujo, f"{type(e).__name__}: {e} (línea {linea.lineno}: {linea.line})")
+            return False
+
+
+def correr_sesion(sesion, fin, pausa):
+    if not sesion.ejecutar("login"):
+        return
+    flujos = [f for f in PESOS if sesion.admin or f != "descarga"]
+    pesos = [PESOS[f] for f in flujos]
+    while time.monotonic() < fin:
+        time.sleep(sesion.azar.uniform(0, 2 * pausa))
+        sesion.ejecutar(sesion.azar.choices(flujos, pesos)[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sesiones", type=int, default=40)
+    parser.add_argument("--admins", type=int, default=None, help="sesiones de administrador (default 10%%)")
+    parser.add_argument("--duracion", type=float, default=60, help="segundos de carga")
+    parser.add_argument("--pausa", type=float, default=1.0, help="pausa media entre acciones, en segundos")
+    parser.add_argument("--eventos", type=int, default=20_000)
+    parser.add_argument("--latencia-supabase", type=float, default=20, help="ms por consulta")
+    parser.add_argument("--latencia-drive", type=float, default=50, help="ms por llamada o bloque")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--normalizado", action="store_true", help="usa el esquema Siniestros + EventosSiniestro")
+    args = parser.parse_args()
+    admins = args.admins if args.admins is not None else max(1, args.sesiones // 10)
+
+    secrets = {
+        "BACKEND": "local",
+        "LOCAL_EVENTOS": args.eventos,
+        "LOCAL_LATENCIA_SUPABASE_MS": args.latencia_supabase,
+        "LOCAL_LATENCIA_DRIVE_MS": args.latencia_drive,
+        "LOCAL_CLAVE": "carga",
+        "DATOS_DIR": tempfile.mkdtemp(prefix="carga_"),
+        "ESQUEMA_NORMALIZADO": args.normalizado,
+    }
+
+    # Genera los datos y carga los módulos antes de medir
+    preparacion = AppTest.from_file(str(APP), default_timeout=1800)
+    for clave, valor in secrets.items():
+        preparacion.secrets[clave] = valor
+    preparacion.run()
+    rss_inicial = rss_mb()
+
+    resultados = Resultados()
+    sesiones = []
+    for i in range(args.sesiones):
+        admin = i < admins
+        usuario = "admin@local" if admin else correo_liquidador(LIQUIDADORES[i % len(LIQUIDADORES)])
+        azar = random.Random(args.semilla * 1000 + i)
+        sesiones.append(Sesion(secrets, usuario, admin, resultados, max(1, args.eventos // 5), azar))
+
+    rss_pico = [rss_inicial]
+    detener = threading.Event()
+
+    def vigilar_memoria():
+        while not detener.wait(0.5):
+            rss_pico[0] = max(rss_pico[0], rss_mb())
+
+    vigilante = threading.Thread(target=vigilar_memoria, daemon=True)
+    vigilante.start()
+
+    inicio = time.monotonic()
+    fin = inicio + args.duracion
+    hilos = [threading.Thread(target=correr_sesion, args=(s, fin, args.pausa), daemon=True) for s in sesiones]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    total = time.monotonic() - inicio
+    detener.set()
+
+    print(f"{args.sesiones} sesiones ({admins} administradores), {args.eventos} eventos, {total:.1f} s")
+    print(f"{'flujo':<12} {'flujos':>7} {'errores':>8} {'recargas':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'flujos/s':>9}")
+    for flujo in ["login", *PESOS]:
+        tiempos = resultados.recargas.get(flujo, [])
+        print(f"{flujo:<12} {resultados.flujos[flujo]:>7} {resultados.errores[flujo]:>8} {len(tiempos):>9} "
+              f"{percentil(tiempos, 50):>9.1f} {percentil(tiempos, 95):>9.1f} {percentil(tiempos, 99):>9.1f} "
+              f"{resultados.flujos[flujo] / total:>9.2f}")
+    todas = [t for tiempos in resultados.recargas.values() for t in tiempos]
+    print(f"{'total':<12} {sum(resultados.flujos.values()):>7} {sum(resultados.errores.values()):>8} {len(todas):>9} "
+          f"{percentil(todas, 50):>9.1f} {percentil(todas, 95):>9.1f} {percentil(todas, 99):>9.1f} "
+          f"{sum(resultados.flujos.values()) / total:>9.2f}")
+    print(f"recargas/s {len(todas) / total:.2f}   RSS inicial {rss_inicial:.0f} MB   pico {rss_pico[0]:.0f} MB   final {rss_mb():.0f} MB")
+    for flujo, error in resultados.ultimo_error.items():
+        print(f"último error en {flujo}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,669 @@
+"""Servicios locales que reemplazan a Supabase y a Google Drive para medir y perfilar app.py.
+
+Se activan con el secret BACKEND = "local"; app.py los toma en RegistroClientes en lugar de
+crear el cliente de Supabase y el servicio de Drive. No usan red ni credenciales:
+
+- SupabaseLocal implementa la parte del constructor de consultas de supabase-py que usa la
+  aplicación (table, select, eq, neq, in_, gte, gt, lt, lte, is_, not_, order, limit, range,
+  insert, update, execute y rpc) sobre SQLite en memoria, con índices en las columnas por las
+  que se filtra.
+- DriveLocal imita files().list/create/delete del servicio de Drive v3, incluidas las subidas
+  reanudables por bloques (next_chunk) y execute(http=...).
+
+Ambos esperan una latencia fija por llamada para parecerse a los servicios reales.
+
+Secrets:
+    LOCAL_EVENTOS                 eventos sintéticos en la bitácora (default 1000)
+    LOCAL_SEMILLA                 semilla del generador (default 7)
+    LOCAL_LATENCIA_SUPABASE_MS    espera por consulta (default 0)
+    LOCAL_LATENCIA_DRIVE_MS       espera por llamada o bloque de Drive (default 0)
+    LOCAL_CLAVE                   contraseña de los usuarios de prueba (default "local")
+    ESQUEMA_NORMALIZADO           el mismo secret de app.py: crea el esquema de
+                                  sql/002_esquema_normalizado.sql (default false)
+
+Usuarios de prueba en Login: admin@local (ADMINISTRADOR) y uno por liquidador de la bitácora
+sintética (p. ej. ana@local para ANA PÉREZ), todos con LOCAL_CLAVE.
+"""
+import io
+import itertools
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+COLUMNAS_BITACORA = [
+    "NUM_SINIESTRO", "CORRELATIVO", "FECHA_SINIESTRO", "LUGAR_SINIESTRO", "MEDIO", "COBERTURA",
+    "MARCA", "SUBMARCA", "VERSION", "MODELO", "NO_SERIE", "MOTOR", "PATENTE", "FECHA_CREACION",
+    "FECHA_ESTATUS_BITACORA", "ESTATUS", "NOMBRE_ASEGURADO", "RUT_ASEGURADO",
+    "TIPO_DE_PERSONA_ASEGURADO", "TEL_ASEGURADO", "CORREO_ASEGURADO", "DIRECCION_ASEGURADO",
+    "NOMBRE_PROPIETARIO", "RUT_PROPIETARIO", "TIPO_DE_PERSONA_PROPIETARIO", "TEL_PROPIETARIO",
+    "CORREO_PROPIETARIO", "DIRECCION_PROPIETARIO", "LIQUIDADOR", "CORREO_LIQUIDADOR", "DRIVE",
+    "COMENTARIO",
+]
+# Esquema normalizado (sql/002_esquema_normalizado.sql): columnas de cada evento y del siniestro
+COLUMNAS_EVENTO = ["NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA", "ESTATUS", "COMENTARIO", "LIQUIDADOR", "CORREO_LIQUIDADOR"]
+COLUMNAS_SINIESTRO = ["NUM_SINIESTRO", *(c for c in COLUMNAS_BITACORA if c not in COLUMNAS_EVENTO)]
+COLUMNAS_LOGIN = ["USUARIO", "PASSWORD", "ROL", "LIQUIDADOR"]
+INDICES = {
+    "BitacoraOperaciones": ["NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA", "LIQUIDADOR"],
+    "EventosSiniestro": ["NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA", "LIQUIDADOR"],
+    "Login": ["USUARIO"],
+}
+
+# Mismas reglas que ESTATUS_CIERRE en app.py y que sql/001_agregados_dashboard.sql
+ESTATUS_CIERRE = ["PAGO LIBERADO", "CIERRE POR DESISTIMIENTO", "CIERRE POR RECHAZO", "DERIVADO A PARCIALES"]
+ESTATUS_INTERMEDIOS = [
+    "ASIGNADO", "CLIENTE CONTACTADO", "CARGA DOCUMENTAL RECIBIDA", "DOCUMENTACIÓN COMPLETA",
+    "PROPUESTA ECONÓMICA ENVIADA", "PROPUESTA ECONÓMICA ACEPTADA", "EN ESPERA DE PRIMERA FIRMA",
+    "EN ESPERA DE LEGALIZACIÓN", "DOCUMENTACIÓN LEGALIZADA", "SOLICITUD DE PAGO GENERADA",
+]
+LIQUIDADORES = ["ANA PÉREZ", "LUIS MUÑOZ", "CAMILA ROJAS", "JORGE SOTO", "VALENTINA DÍAZ", "MATÍAS NÚÑEZ"]
+NOMBRES = ["José", "María", "Martín", "Sofía", "Tomás", "Florencia", "Benjamín", "Antonia", "Agustín", "Isidora"]
+APELLIDOS = ["González", "Muñoz", "Rodríguez", "Fernández", "López", "Martínez", "Sepúlveda", "Núñez", "Peña", "Ibáñez"]
+MARCAS = [("CHEVROLET", "SAIL"), ("TOYOTA", "YARIS"), ("HYUNDAI", "ACCENT"), ("KIA", "RIO"), ("NISSAN", "VERSA")]
+
+
+def _esperar(ms):
+    if ms:
+        time.sleep(ms / 1000)
+
+
+def _rut(numero):
+    return f"{numero // 1000000}.{numero // 1000 % 1000:03d}.{numero % 1000:03d}-{numero % 11 if numero % 11 < 10 else 'K'}"
+
+
+def generar_bitacora(eventos, semilla=7, eventos_por_siniestro=5):
+    """Eventos sintéticos con la forma de BitacoraOperaciones, siniestro por siniestro.
+
+    Cada siniestro tiene un ALTA SINIESTRO seguido de estatus intermedios y, en parte de
+    ellos, un estatus de cierre. Nombres con acentos y RUT/patentes con formato real.
+    """
+    azar = random.Random(semilla)
+    siniestros = max(1, eventos // eventos_por_siniestro)
+    inicio = datetime(2023, 1, 2, 8, 0, 0)
+    for i in range(siniestros):
+        creado = inicio + timedelta(minutes=azar.randint(0, 60 * 24 * 700))
+        marca, submarca = azar.choice(MARCAS)
+        liquidador = azar.choice(LIQUIDADORES)
+        asegurado = f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}"
+        propietario = asegurado if azar.random() < 0.7 else f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}"
+        base = {
+            "NUM_SINIESTRO": str(40000000 + i),
+            "CORRELATIVO": str(azar.randint(1, 9)),
+            "FECHA_SINIESTRO": (creado - timedelta(days=azar.randint(1, 20))).strftime("%Y-%m-%d"),
+            "LUGAR_SINIESTRO": azar.choice(["SANTIAGO", "VALPARAÍSO", "CONCEPCIÓN", "TEMUCO", "ÑUÑOA"]),
+            "MEDIO": azar.choice(["Call center", "PP", "ALMA"]),
+            "COBERTURA": azar.choice(["Robo", "Daño material"]),
+            "MARCA": marca,
+            "SUBMARCA": submarca,
+            "VERSION": azar.choice(["LS", "GL", "EX", "SENSE"]),
+            "MODELO": str(azar.randint(2012, 2024)),
+            "NO_SERIE": "".join(azar.choice("ABCDEFGHJKLMNPRSTUVWXYZ0123456789") for _ in range(17)),
+            "MOTOR": "".join(azar.choice("ABCDEFGHJKLMNPRSTUVWXYZ0123456789") for _ in range(10)),
+            "PATENTE": "".join(azar.choice("BCDFGHJKLPRSTVWXYZ") for _ in range(4)) + f"{azar.randint(10, 99)}",
+            "FECHA_CREACION": creado.strftime("%Y-%m-%d"),
+            "NOMBRE_ASEGURADO": asegurado,
+            "RUT_ASEGURADO": _rut(azar.randint(5000000, 25000000)),
+            "TIPO_DE_PERSONA_ASEGURADO": "Natural",
+            "TEL_ASEGURADO": f"+569{azar.randint(10000000, 99999999)}",
+            "CORREO_ASEGURADO": f"asegurado{i}@correo.cl",
+            "DIRECCION_ASEGURADO": f"CALLE {azar.randint(1, 999)}",
+            "NOMBRE_PROPIETARIO": propietario,
+            "RUT_PROPIETARIO": _rut(azar.randint(5000000, 25000000)),
+            "TIPO_DE_PERSONA_PROPIETARIO": azar.choice(["Natural", "Jurídica"]),
+            "TEL_PROPIETARIO": f"+569{azar.randint(10000000, 99999999)}",
+            "CORREO_PROPIETARIO": f"propietario{i}@correo.cl",
+            "DIRECCION_PROPIETARIO": f"AVENIDA {azar.randint(1, 999)}",
+            "LIQUIDADOR": liquidador,
+            "CORREO_LIQUIDADOR": correo_liquidador(liquidador),
+            "DRIVE": f"https://drive.google.com/drive/folders/LOCAL_CARPETA_{i}",
+        }
+        n = eventos_por_siniestro if i < siniestros - 1 else max(1, eventos - eventos_por_siniestro * (siniestros - 1))
+        fecha = creado
+        for j in range(n):
+            if j == 0:
+                estatus = "ALTA SINIESTRO"
+            elif j == n - 1 and azar.random() < 0.6:
+                estatus = azar.choice(ESTATUS_CIERRE)
+            else:
+                estatus = azar.choice(ESTATUS_INTERMEDIOS)
+            yield dict(
+                base,
+                FECHA_ESTATUS_BITACORA=fecha.strftime("%Y-%m-%d %H:%M:%S"),
+                ESTATUS=estatus,
+                COMENTARIO="" if j == 0 else f"Seguimiento {j}",
+            )
+            fecha += timedelta(hours=azar.randint(1, 24 * 6), minutes=azar.randint(0, 59))
+
+
+def correo_liquidador(liquidador):
+    return liquidador.split()[0].lower() + "@local"
+
+
+def usuarios_prueba(clave):
+    """Filas de Login para el administrador y cada liquidador, con la contraseña hasheada con bcrypt."""
+    import bcrypt
+
+    hash_clave = bcrypt.hashpw(clave.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    usuarios = [{"USUARIO": "admin@local", "PASSWORD": hash_clave, "ROL": "ADMINISTRADOR", "LIQUIDADOR": "ADMINISTRADOR LOCAL"}]
+    for liquidador in LIQUIDADORES:
+        usuarios.append({"USUARIO": correo_liquidador(liquidador), "PASSWORD": hash_clave, "ROL": "LIQUIDADOR", "LIQUIDADOR": liquidador})
+    return usuarios
+
+
+def _dias_habiles(inicio, fin):
+    """Como np.busday_count sobre las partes de fecha; None si alguna no se puede leer."""
+    try:
+        a = date.fromisoformat(str(inicio)[:10])
+        b = date.fromisoformat(str(fin).replace("T", " ")[:10])
+    except ValueError:
+        return None
+    signo = 1
+    if b < a:
+        a, b, signo = b + timedelta(days=1), a + timedelta(days=1), -1
+    semanas, resto = divmod((b - a).days, 7)
+    dias = semanas * 5 + sum(1 for k in range(resto) if (a + timedelta(days=k)).weekday() < 5)
+    return signo * dias
+
+
+class RespuestaLocal:
+    def __init__(self, data):
+        self.data = data
+        self.count = None
+
+
+class ConsultaLocal:
+    """Consulta encadenable con la misma forma que el constructor de postgrest-py."""
+
+    def __init__(self, base, tabla):
+        self.base = base
+        self.tabla = tabla
+        self.columnas = "*"
+        self.filtros = []
+        self.parametros = []
+        self.negar = False
+        self.orden = []
+        self.limite = None
+        self.desde = 0
+        self.operacion = ("select", None)
+
+    def select(self, *columnas):
+        self.columnas = ",".join(columnas) if columnas else "*"
+        return self
+
+    @property
+    def not_(self):
+        self.negar = True
+        return self
+
+    def _filtro(self, sql, negado, *parametros):
+        self.filtros.append(negado if self.negar else sql)
+        self.parametros.extend(parametros)
+        self.negar = False
+        return self
+
+    def eq(self, columna, valor):
+        return self._filtro(f'"{columna}" = ?', f'"{columna}" != ?', _texto(valor))
+
+    def neq(self, columna, valor):
+        return self._filtro(f'"{columna}" != ?', f'"{columna}" = ?', _texto(valor))
+
+    def in_(self, columna, valores):
+        valores = [_texto(v) for v in valores]
+        marcas = ",".join("?" * len(valores)) or "NULL"
+        return self._filtro(f'"{columna}" IN ({marcas})', f'"{columna}" NOT IN ({marcas})', *valores)
+
+    def gte(self, columna, valor):
+        return self._filtro(f'"{columna}" >= ?', f'NOT "{columna}" >= ?', _texto(valor))
+
+    def gt(self, columna, valor):
+        return self._filtro(f'"{columna}" > ?', f'NOT "{columna}" > ?', _texto(valor))
+
+    def lt(self, columna, valor):
+        return self._filtro(f'"{columna}" < ?', f'NOT "{columna}" < ?', _texto(valor))
+
+    def lte(self, columna, valor):
+        return self._filtro(f'"{columna}" <= ?', f'NOT "{columna}" <= ?', _texto(valor))
+
+    def is_(self, columna, valor):
+        if str(valor).lower() != "null":
+            raise ValueError("Solo se admite is_(columna, 'null')")
+        return self._filtro(f'"{columna}" IS NULL', f'"{columna}" IS NOT NULL')
+
+    def order(self, columna, desc=False):
+        # Igual que Postgres: los NULL van al final en orden ascendente y al inicio en descendente
+        self.orden.append(f'"{columna}" {"DESC NULLS FIRST" if desc else "ASC NULLS LAST"}')
+        return self
+
+    def limit(self, cantidad):
+        self.limite = cantidad
+        return self
+
+    def range(self, inicio, fin):
+        self.desde = inicio
+        self.limite = fin - inicio + 1
+        return self
+
+    def insert(self, filas):
+        self.operacion = ("insert", filas if isinstance(filas, list) else [filas])
+        return self
+
+    def update(self, valores):
+        self.operacion = ("update", valores)
+        return self
+
+    def execute(self):
+        _esperar(self.base.latencia_ms)
+        tipo, datos = self.operacion
+        with self.base.lock:
+            if tipo == "insert":
+                return RespuestaLocal(self.base.insertar(self.tabla, datos))
+            if tipo == "update":
+                return RespuestaLocal(self.base.actualizar(self.tabla, datos, self._where(), self.parametros))
+            return RespuestaLocal(self.base.seleccionar(self._sql(), self.parametros))
+
+    def _where(self):
+        return " WHERE " + " AND ".join(self.filtros) if self.filtros else ""
+
+    def _sql(self):
+        if self.columnas.strip() == "*":
+            columnas = ",".join(f'"{c}"' for c in self.base.columnas(self.tabla))
+        else:
+            columnas = ",".join(f'"{c.strip()}"' for c in self.columnas.split(","))
+        sql = f'SELECT {columnas} FROM "{self.tabla}"{self._where()}'
+        if self.orden:
+            sql += " ORDER BY " + ", ".join(self.orden)
+        if self.limite is not None or self.desde:
+            sql += f" LIMIT {self.limite if self.limite is not None else -1} OFFSET {self.desde}"
+        return sql
+
+
+def _texto(valor):
+    return None if valor is None else str(valor)
+
+
+class LlamadaRpc:
+    def __init__(self, base, nombre, parametros):
+        self.base = base
+        self.nombre = nombre
+        self.parametros = parametros or {}
+
+    def execute(self):
+        _esperar(self.base.latencia_ms)
+        funcion = getattr(self.base, f"rpc_{self.nombre}", None)
+        if funcion is None:
+            raise RuntimeError(f"Función {self.nombre} no existe en el backend local")
+        with self.base.lock:
+            return RespuestaLocal(funcion(**self.parametros))
+
+
+class SupabaseLocal:
+    """Tablas BitacoraOperaciones y Login en SQLite en memoria, más la vista BitacoraUltimoEstatus
+    y la función kpis_dashboard de sql/001_agregados_dashboard.sql.
+
+    Con normalizado=True la bitácora queda como en sql/002_esquema_normalizado.sql: tablas
+    Siniestros y EventosSiniestro, y BitacoraOperaciones como vista que las une, con triggers
+    INSTEAD OF para insertar y actualizar a través de ella."""
+
+    def __init__(self, latencia_ms=0, normalizado=False):
+        self.latencia_ms = latencia_ms
+        self.lock = threading.Lock()
+        self.conexion = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conexion.row_factory = sqlite3.Row
+        self._columnas = {}
+        self.vistas = set()
+        if normalizado:
+            self._crear_esquema_normalizado()
+        else:
+            self._crear_tabla("BitacoraOperaciones", COLUMNAS_BITACORA)
+        self._crear_tabla("Login", COLUMNAS_LOGIN)
+        self._crear_vistas()
+
+    @classmethod
+    def desde_secrets(cls, secrets):
+        base = cls(
+            latencia_ms=float(secrets.get("LOCAL_LATENCIA_SUPABASE_MS", 0)),
+            normalizado=bool(secrets.get("ESQUEMA_NORMALIZADO", False)),
+        )
+        eventos = generar_bitacora(int(secrets.get("LOCAL_EVENTOS", 1000)), int(secrets.get("LOCAL_SEMILLA", 7)))
+        with base.lock:
+            while True:
+                lote = list(itertools.islice(eventos, 50_000))
+                if not lote:
+                    break
+                base.insertar("BitacoraOperaciones", lote)
+            base.insertar("Login", usuarios_prueba(str(secrets.get("LOCAL_CLAVE", "local"))))
+        return base
+
+    def table(self, nombre):
+        return ConsultaLocal(self, nombre)
+
+    def rpc(self, nombre, parametros=None):
+        return LlamadaRpc(self, nombre, parametros)
+
+    def columnas(self, tabla):
+        if tabla not in self._columnas:
+            self._columnas[tabla] = [c[1] for c in self.conexion.execute(f'PRAGMA table_info("{tabla}")')]
+        return self._columnas[tabla]
+
+    def _crear_tabla(self, tabla, columnas):
+        definicion = ", ".join(f'"{c}" TEXT' for c in columnas)
+        self.conexion.execute(f'CREATE TABLE "{tabla}" ({definicion})')
+        for columna in INDICES.get(tabla, []):
+            self.conexion.execute(f'CREATE INDEX "ix_{tabla}_{columna}" ON "{tabla}" ("{columna}")')
+        self._columnas.pop(tabla, None)
+
+    def _crear_esquema_normalizado(self):
+        self._crear_tabla("Siniestros", COLUMNAS_SINIESTRO)
+        self.conexion.execute('CREATE UNIQUE INDEX "ux_Siniestros" ON "Siniestros" ("NUM_SINIESTRO")')
+        self._crear_tabla("EventosSiniestro", COLUMNAS_EVENTO)
+
+        def lista(columnas, prefijo=""):
+            return ", ".join(f'{prefijo}"{c}"' for c in columnas)
+
+        seleccion = ", ".join(f'{"e" if c in COLUMNAS_EVENTO else "s"}."{c}"' for c in COLUMNAS_BITACORA)
+        self.conexion.executescript(f'''
+            CREATE VIEW "BitacoraOperaciones" AS
+            SELECT {seleccion}
+            FROM "EventosSiniestro" e JOIN "Siniestros" s ON s."NUM_SINIESTRO" = e."NUM_SINIESTRO";
+
+            CREATE TRIGGER bitacora_insertar INSTEAD OF INSERT ON "BitacoraOperaciones" BEGIN
+                INSERT INTO "Siniestros" ({lista(COLUMNAS_SINIESTRO)}) VALUES ({lista(COLUMNAS_SINIESTRO, "NEW.")})
+                ON CONFLICT ("NUM_SINIESTRO") DO UPDATE SET "DRIVE" = coalesce("DRIVE", excluded."DRIVE");
+                INSERT INTO "EventosSiniestro" ({lista(COLUMNAS_EVENTO)}) VALUES ({lista(COLUMNAS_EVENTO, "NEW.")});
+            END;
+
+            CREATE TRIGGER bitacora_actualizar INSTEAD OF UPDATE ON "BitacoraOperaciones" BEGIN
+                UPDATE "Siniestros" SET {", ".join(f'"{c}" = NEW."{c}"' for c in COLUMNAS_SINIESTRO)}
+                WHERE "NUM_SINIESTRO" = OLD."NUM_SINIESTRO";
+                UPDATE "EventosSiniestro" SET {", ".join(f'"{c}" = NEW."{c}"' for c in COLUMNAS_EVENTO)}
+                WHERE "NUM_SINIESTRO" = OLD."NUM_SINIESTRO"
+                  AND "FECHA_ESTATUS_BITACORA" IS OLD."FECHA_ESTATUS_BITACORA"
+                  AND "ESTATUS" IS OLD."ESTATUS";
+            END;
+        ''')
+        self.vistas.add("BitacoraOperaciones")
+
+    def _crear_vistas(self):
+        columnas = ",".join(f'"{c}"' for c in self.columnas("BitacoraOperaciones"))
+        self.conexion.execute('DROP VIEW IF EXISTS "BitacoraUltimoEstatus"')
+        self.conexion.execute(f'''
+            CREATE VIEW "BitacoraUltimoEstatus" AS
+            SELECT {columnas} FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY "NUM_SINIESTRO"
+                    ORDER BY "FECHA_ESTATUS_BITACORA" DESC NULLS LAST
+                ) AS _n
+                FROM "BitacoraOperaciones"
+            ) WHERE _n = 1
+        ''')
+        self._columnas.pop("BitacoraUltimoEstatus", None)
+
+    def seleccionar(self, sql, parametros):
+        return [dict(fila) for fila in self.conexion.execute(sql, parametros)]
+
+    def insertar(self, tabla, filas):
+        if not filas:
+            return []
+        nuevas = [c for c in dict.fromkeys(c for f in filas for c in f) if c not in self.columnas(tabla)]
+        if tabla in self.vistas:
+            nuevas = []  # una vista no gana columnas; las desconocidas se ignoran
+        for columna in nuevas:
+            self.conexion.execute(f'ALTER TABLE "{tabla}" ADD COLUMN "{columna}" TEXT')
+        if nuevas:
+            self._columnas.pop(tabla, None)
+            if tabla == "BitacoraOperaciones":
+                self._crear_vistas()
+        columnas = self.columnas(tabla)
+        sql = f'INSERT INTO "{tabla}" VALUES ({",".join("?" * len(columnas))})'
+        self.conexion.executemany(sql, ([_texto(f.get(c)) for c in columnas] for f in filas))
+        self.conexion.commit()
+        return [{c: _texto(f.get(c)) for c in columnas} for f in filas]
+
+    def actualizar(self, tabla, valores, where, parametros):
+        asignaciones = ", ".join(f'"{c}" = ?' for c in valores)
+        if tabla in self.vistas:
+            # Las vistas no tienen rowid: se devuelven las filas que cumplen el filtro después del cambio
+            self.conexion.execute(
+                f'UPDATE "{tabla}" SET {asignaciones}{where}',
+                [_texto(v) for v in valores.values()] + list(parametros)
+            )
+            self.conexion.commit()
+            return self.seleccionar(f'SELECT * FROM "{tabla}"{where}', parametros)
+        rowids = [r[0] for r in self.conexion.execute(f'SELECT rowid FROM "{tabla}"{where}', parametros)]
+        self.conexion.execute(
+            f'UPDATE "{tabla}" SET {asignaciones}{where}',
+            [_texto(v) for v in valores.values()] + list(parametros)
+        )
+        self.conexion.commit()
+        if not rowids:
+            return []
+        marcas = ",".join("?" * len(rowids))
+        return self.seleccionar(f'SELECT * FROM "{tabla}" WHERE rowid IN ({marcas})', rowids)
+
+    def rpc_kpis_dashboard(self):
+        ultimos = self.seleccionar(
+            'SELECT "ESTATUS", "LIQUIDADOR", "FECHA_CREACION", "FECHA_ESTATUS_BITACORA" FROM "BitacoraUltimoEstatus"', []
+        )
+        cerrados = [f for f in ultimos if f["ESTATUS"] in ESTATUS_CIERRE]
+        dias = [d for d in (_dias_habiles(f["FECHA_CREACION"], f["FECHA_ESTATUS_BITACORA"]) for f in cerrados) if d is not None]
+        return {
+            "total": len(ultimos),
+            "cerrados": len(cerrados),
+            "suma_dias": sum(dias),
+            "con_dias": len(dias),
+            "por_estatus": dict(Counter(f["ESTATUS"] for f in ultimos if f["ESTATUS"] is not None)),
+            "por_liquidador": dict(Counter(f["LIQUIDADOR"] for f in ultimos if f["LIQUIDADOR"] is not None)),
+        }
+
+
+# =======================================================
+#                     DRIVE LOCAL
+# =======================================================
+class SolicitudLocal:
+    """Petición diferida: no hace nada hasta execute(), igual que googleapiclient."""
+
+    def __init__(self, drive, accion):
+        self.drive = drive
+        self.accion = accion
+
+    def execute(self, http=None, num_retries=0):
+        _esperar(self.drive.latencia_ms)
+        with self.drive.lock:
+            return self.accion()
+
+
+class SubidaLocal(SolicitudLocal):
+    """files().create con media_body: se consume por bloques con next_chunk()."""
+
+    def __init__(self, drive, metadata, media):
+        super().__init__(drive, None)
+        self.metadata = metadata
+        self.media = media
+        self.enviado = 0
+        self.contenido = io.BytesIO()
+
+    def next_chunk(self, http=None, num_retries=0):
+        _esperar(self.drive.latencia_ms)
+        total = self.media.size()
+        tamano = self.media.chunksize() if self.media.resumable() else total
+        bloque = self.media.getbytes(self.enviado, tamano)
+        self.contenido.write(bloque)
+        self.enviado += len(bloque)
+        if total is not None and self.enviado < total and bloque:
+            return None, None
+        with self.drive.lock:
+            return None, self.drive.crear(self.metadata, self.contenido.getvalue())
+
+    def execute(self, http=None, num_retries=0):
+        respuesta = None
+        while respuesta is None:
+            _, respuesta = self.next_chunk(http, num_retries)
+        return respuesta
+
+
+class LoteLocal:
+    """new_batch_http_request(): una sola espera de red para todas las llamadas, y el resultado
+    (o el error) de cada una se entrega al callback, igual que BatchHttpRequest."""
+
+    def __init__(self, drive, callback=None):
+        self.drive = drive
+        self.callback = callback
+        self.solicitudes = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.solicitudes.append((request, callback or self.callback, request_id or str(len(self.solicitudes))))
+
+    def execute(self, http=None):
+        _esperar(self.drive.latencia_ms)
+        for solicitud, callback, request_id in self.solicitudes:
+            try:
+                with self.drive.lock:
+                    respuesta, error = solicitud.accion(), None
+            except Exception as e:
+                respuesta, error = None, e
+            if callback is not None:
+                callback(request_id, respuesta, error)
+
+
+class ArchivosLocales:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q="", **kwargs):
+        return SolicitudLocal(self.drive, lambda: {"files": self.drive.buscar(q)})
+
+    def create(self, body=None, media_body=None, **kwargs):
+        if media_body is not None:
+            return SubidaLocal(self.drive, body or {}, media_body)
+        return SolicitudLocal(self.drive, lambda: self.drive.crear(body or {}, b""))
+
+    def delete(self, fileId=None, **kwargs):
+        return SolicitudLocal(self.drive, lambda: self.drive.borrar(fileId))
+
+
+class DriveLocal:
+    """Carpetas y archivos en memoria con la forma de respuesta de Drive v3 (id, name)."""
+
+    def __init__(self, latencia_ms=0):
+        self.latencia_ms = latencia_ms
+        self.lock = threading.Lock()
+        self.archivos = {}
+        self.contador = 0
+
+    @classmethod
+    def desde_secrets(cls, secrets):
+        return cls(latencia_ms=float(secrets.get("LOCAL_LATENCIA_DRIVE_MS", 0)))
+
+    def files(self):
+        return ArchivosLocales(self)
+
+    def new_batch_http_request(self, callback=None):
+        return LoteLocal(self, callback)
+
+    def crear(self, metadata, contenido):
+        self.contador += 1
+        id_archivo = f"LOCAL_{self.contador}"
+        self.archivos[id_archivo] = {
+            "id": id_archivo,
+            "name": metadata.get("name"),
+            "mimeType": metadata.get("mimeType", "application/octet-stream"),
+            "parents": list(metadata.get("parents", [])),
+            "orden": self.contador,
+            "tamano": len(contenido),
+        }
+        return {"id": id_archivo}
+
+    def borrar(self, id_archivo):
+        self.archivos.pop(id_archivo, None)
+        return ""
+
+    def buscar(self, q):
+        """Entiende las condiciones que arma app.py: name = '...', mimeType = '...', 'id' in parents,
+        trashed = false, and/or y paréntesis. Como Drive, rechaza la consulta completa si un
+        texto trae ' o \\ sin escapar."""
+        condicion = _ConsultaDrive(q).leer()
+        encontrados = []
+        for archivo in sorted(self.archivos.values(), key=lambda a: a["orden"]):
+            if condicion(archivo):
+                encontrados.append({"id": archivo["id"], "name": archivo["name"]})
+        return encontrados
+
+
+class _ConsultaDrive:
+    """Parser de la parte del lenguaje de consultas de Drive que usa app.py."""
+
+    TOKEN = re.compile(r"\s*(?:(?P<texto>'(?:[^'\\]|\\.)*')|(?P<simbolo>[()=])|(?P<palabra>\w+))")
+
+    def __init__(self, q):
+        self.q = q
+        self.tokens = []
+        posicion, fin = 0, len(q.rstrip())
+        while posicion < fin:
+            m = self.TOKEN.match(q, posicion)
+            if not m:
+                self._invalida()
+            if m["texto"]:
+                self.tokens.append(("texto", re.sub(r"\\(.)", r"\1", m["texto"][1:-1])))
+            else:
+                self.tokens.append(("simbolo" if m["simbolo"] else "palabra", m["simbolo"] or m["palabra"]))
+            posicion = m.end()
+        self.posicion = 0
+
+    def leer(self):
+        condicion = self._disyuncion()
+        if self.posicion < len(self.tokens):
+            self._invalida()
+        return condicion
+
+    def _invalida(self):
+        raise ValueError(f"Consulta de Drive inválida: {self.q}")
+
+    def _siguiente(self):
+        return self.tokens[self.posicion] if self.posicion < len(self.tokens) else (None, None)
+
+    def _tomar(self, tipo, valor=None):
+        token = self._siguiente()
+        if token[0] != tipo or (valor is not None and token[1] != valor):
+            self._invalida()
+        self.posicion += 1
+        return token[1]
+
+    def _disyuncion(self):
+        opciones = [self._conjuncion()]
+        while self._siguiente() == ("palabra", "or"):
+            self.posicion += 1
+            opciones.append(self._conjuncion())
+        return lambda archivo: any(c(archivo) for c in opciones)
+
+    def _conjuncion(self):
+        condiciones = [self._condicion()]
+        while self._siguiente() == ("palabra", "and"):
+            self.posicion += 1
+            condiciones.append(self._condicion())
+        return lambda archivo: all(c(archivo) for c in condiciones)
+
+    def _condicion(self):
+        tipo, valor = self._siguiente()
+        if (tipo, valor) == ("simbolo", "("):
+            self.posicion += 1
+            condicion = self._disyuncion()
+            self._tomar("simbolo", ")")
+            return condicion
+        if tipo == "texto":
+            self.posicion += 1
+            self._tomar("palabra", "in")
+            self._tomar("palabra", "parents")
+            return lambda archivo: valor in archivo["parents"]
+        campo = self._tomar("palabra")
+        self._tomar("simbolo", "=")
+        if campo == "trashed":
+            self._tomar("palabra")
+            return lambda archivo: True  # en memoria no hay papelera
+        if campo not in ("name", "mimeType"):
+            self._invalida()
+        texto = self._tomar("texto")
+        return lambda archivo: archivo[campo] == texto
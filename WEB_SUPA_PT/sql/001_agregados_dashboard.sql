@@ -0,0 +1,111 @@
+-- =======================================================
+--        AGREGADOS DEL DASHBOARD EN EL SERVIDOR
+-- =======================================================
+-- Vistas y función RPC que calculan en Postgres lo que dash_general mostraba después de
+-- descargar la bitácora completa. Se aplica una sola vez en el editor SQL de Supabase
+-- (o con psql) y se activa en la app con el secret DASHBOARD_RPC = true.
+--
+-- Las reglas replican las de app.py:
+--   * último estatus: la fila con FECHA_ESTATUS_BITACORA más reciente de cada NUM_SINIESTRO
+--     (las fechas nulas quedan al final, igual que _clave_fecha las ordena primero).
+--   * cerrado: ESTATUS dentro de ESTATUS_CIERRE.
+--   * días hábiles: como np.busday_count(FECHA_CREACION, FECHA_ESTATUS_BITACORA), cuenta los
+--     días de lunes a viernes en [inicio, fin); si fin < inicio cuenta (fin, inicio] con signo
+--     negativo. Solo se usa la parte de fecha (primeros 10 caracteres); si alguna fecha no se
+--     puede leer no cuenta.
+
+-- Fecha a partir de los primeros 10 caracteres, o NULL si no es válida
+create or replace function public.fecha_o_nulo(valor text)
+returns date
+language plpgsql
+immutable
+as $$
+begin
+    return left(valor, 10)::date;
+exception when others then
+    return null;
+end;
+$$;
+
+-- Días hábiles (lunes a viernes) en [inicio, fin), o en (fin, inicio] negativo, como np.busday_count
+create or replace function public.dias_habiles(inicio date, fin date)
+returns integer
+language sql
+immutable
+as $$
+    select case
+        when inicio is null or fin is null then null
+        when fin >= inicio then (
+            select count(*)::integer
+            from generate_series(inicio, fin - 1, interval '1 day') as d
+            where extract(isodow from d) < 6
+        )
+        else -(
+            select count(*)::integer
+            from generate_series(fin + 1, inicio, interval '1 day') as d
+            where extract(isodow from d) < 6
+        )
+    end
+$$;
+
+-- Último estatus de cada siniestro
+create or replace view public."BitacoraUltimoEstatus" as
+select distinct on ("NUM_SINIESTRO") *
+from public."BitacoraOperaciones"
+order by "NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA" desc nulls last;
+
+-- Siniestros cuyo último estatus es de cierre, con su duración en días hábiles
+create or replace view public."SiniestrosCerrados" as
+select
+    "NUM_SINIESTRO",
+    "LIQUIDADOR",
+    "ESTATUS",
+    "FECHA_CREACION",
+    "FECHA_ESTATUS_BITACORA",
+    public.dias_habiles(
+        public.fecha_o_nulo("FECHA_CREACION"::text),
+        public.fecha_o_nulo(replace("FECHA_ESTATUS_BITACORA"::text, 'T', ' '))
+    ) as "DIAS_HABILES"
+from public."BitacoraUltimoEstatus"
+where "ESTATUS" in (
+    'PAGO LIBERADO',
+    'CIERRE POR DESISTIMIENTO',
+    'CIERRE POR RECHAZO',
+    'DERIVADO A PARCIALES'
+);
+
+-- Contadores del dashboard general en un solo JSON, con las mismas llaves que
+-- AgregadosKPI.estado(): total, cerrados, suma_dias, con_dias, por_estatus, por_liquidador
+create or replace function public.kpis_dashboard()
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'total', (select count(*) from public."BitacoraUltimoEstatus"),
+        'cerrados', (select count(*) from public."SiniestrosCerrados"),
+        'suma_dias', (select coalesce(sum("DIAS_HABILES"), 0) from public."SiniestrosCerrados"),
+        'con_dias', (select count("DIAS_HABILES") from public."SiniestrosCerrados"),
+        'por_estatus', (
+            select coalesce(json_object_agg("ESTATUS", total), '{}'::json)
+            from (
+                select "ESTATUS", count(*) as total
+                from public."BitacoraUltimoEstatus"
+                where "ESTATUS" is not null
+                group by "ESTATUS"
+            ) as e
+        ),
+        'por_liquidador', (
+            select coalesce(json_object_agg("LIQUIDADOR", total), '{}'::json)
+            from (
+                select "LIQUIDADOR", count(*) as total
+                from public."BitacoraUltimoEstatus"
+                where "LIQUIDADOR" is not null
+                group by "LIQUIDADOR"
+            ) as l
+        )
+    )
+$$;
+
+grant select on public."BitacoraUltimoEstatus", public."SiniestrosCerrados" to anon, authenticated, service_role;
+grant execute on function public.kpis_dashboard() to anon, authenticated, service_role;
@@ -0,0 +1,237 @@
+-- =======================================================
+--     ESQUEMA NORMALIZADO: SINIESTROS + EVENTOS DE ESTATUS
+-- =======================================================
+-- Cada seguimiento copiaba la fila completa del siniestro (asegurado, propietario, vehículo y
+-- link de Drive) aunque solo cambian el estatus, el comentario, la fecha y el liquidador. Esta
+-- migración separa los datos:
+--
+--   "Siniestros"          una fila por NUM_SINIESTRO con los datos que no cambian por evento
+--   "EventosSiniestro"    una fila por cambio de estatus: NUM_SINIESTRO, FECHA_ESTATUS_BITACORA,
+--                         ESTATUS, COMENTARIO, LIQUIDADOR y CORREO_LIQUIDADOR
+--   "BitacoraOperaciones" pasa a ser una vista que une ambas tablas con las mismas columnas que
+--                         la tabla original, así que las descargas, los dashboards y las vistas de
+--                         001_agregados_dashboard.sql siguen funcionando igual. Se puede insertar,
+--                         actualizar y borrar a través de ella (triggers INSTEAD OF).
+--
+-- Se aplica una sola vez, después de 001, en el editor SQL de Supabase (o con psql). La app sigue
+-- funcionando sin cambios de configuración; con el secret ESQUEMA_NORMALIZADO = true además
+-- escribe los seguimientos y las modificaciones directo en las tablas y descarga la bitácora
+-- como eventos más un siniestro por NUM_SINIESTRO.
+--
+-- Migración de los datos:
+--   * Los datos de cada siniestro se toman de su evento más reciente (el que muestra la app);
+--     si ese evento no tiene link de Drive se usa el último evento que sí lo tenga.
+--   * Los eventos sin NUM_SINIESTRO no se migran (no se pueden unir a un siniestro); quedan en
+--     la tabla original, que se conserva como "BitacoraOperaciones_plana".
+--   * Si la tabla original tenía políticas RLS, hay que crearlas también en las tablas nuevas.
+--
+-- Para volver atrás:
+--   drop view public."SiniestrosCerrados", public."BitacoraUltimoEstatus", public."BitacoraOperaciones";
+--   alter table public."BitacoraOperaciones_plana" rename to "BitacoraOperaciones";
+--   y volver a aplicar las vistas de 001_agregados_dashboard.sql. Los eventos registrados después
+--   de la migración hay que copiarlos antes desde la vista.
+
+begin;
+
+-- Las vistas de 001 dependen de la tabla; se recrean al final sobre el esquema nuevo
+drop view if exists public."SiniestrosCerrados";
+drop view if exists public."BitacoraUltimoEstatus";
+
+alter table public."BitacoraOperaciones" rename to "BitacoraOperaciones_plana";
+
+-- Datos del siniestro, del evento más reciente de cada NUM_SINIESTRO (mismos tipos que la original)
+create table public."Siniestros" as
+select distinct on ("NUM_SINIESTRO")
+    "NUM_SINIESTRO", "CORRELATIVO", "FECHA_SINIESTRO", "LUGAR_SINIESTRO", "MEDIO", "COBERTURA",
+    "MARCA", "SUBMARCA", "VERSION", "MODELO", "NO_SERIE", "MOTOR", "PATENTE", "FECHA_CREACION",
+    "NOMBRE_ASEGURADO", "RUT_ASEGURADO", "TIPO_DE_PERSONA_ASEGURADO", "TEL_ASEGURADO",
+    "CORREO_ASEGURADO", "DIRECCION_ASEGURADO",
+    "NOMBRE_PROPIETARIO", "RUT_PROPIETARIO", "TIPO_DE_PERSONA_PROPIETARIO", "TEL_PROPIETARIO",
+    "CORREO_PROPIETARIO", "DIRECCION_PROPIETARIO", "DRIVE"
+from public."BitacoraOperaciones_plana"
+where "NUM_SINIESTRO" is not null
+order by "NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA" desc nulls last;
+
+update public."Siniestros" s
+set "DRIVE" = (
+    select p."DRIVE"
+    from public."BitacoraOperaciones_plana" p
+    where p."NUM_SINIESTRO" = s."NUM_SINIESTRO" and p."DRIVE" is not null
+    order by p."FECHA_ESTATUS_BITACORA" desc nulls last
+    limit 1
+)
+where s."DRIVE" is null;
+
+alter table public."Siniestros" add primary key ("NUM_SINIESTRO");
+
+-- Un evento por cambio de estatus
+create table public."EventosSiniestro" as
+select
+    "NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA", "ESTATUS", "COMENTARIO", "LIQUIDADOR", "CORREO_LIQUIDADOR"
+from public."BitacoraOperaciones_plana"
+where "NUM_SINIESTRO" is not null;
+
+alter table public."EventosSiniestro"
+    add column "ID" bigint generated always as identity primary key,
+    add foreign key ("NUM_SINIESTRO") references public."Siniestros" ("NUM_SINIESTRO") on update cascade;
+
+-- Las mismas consultas que hace la app: por siniestro, por fecha de estatus (cursor) y por liquidador
+create index on public."EventosSiniestro" ("NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA" desc nulls last);
+create index on public."EventosSiniestro" ("FECHA_ESTATUS_BITACORA");
+create index on public."EventosSiniestro" ("LIQUIDADOR");
+
+-- Vista con la forma plana de siempre (mismas columnas y en el mismo orden)
+create view public."BitacoraOperaciones" as
+select
+    e."NUM_SINIESTRO", s."CORRELATIVO", s."FECHA_SINIESTRO", s."LUGAR_SINIESTRO", s."MEDIO",
+    s."COBERTURA", s."MARCA", s."SUBMARCA", s."VERSION", s."MODELO", s."NO_SERIE", s."MOTOR",
+    s."PATENTE", s."FECHA_CREACION", e."FECHA_ESTATUS_BITACORA", e."ESTATUS",
+    s."NOMBRE_ASEGURADO", s."RUT_ASEGURADO", s."TIPO_DE_PERSONA_ASEGURADO", s."TEL_ASEGURADO",
+    s."CORREO_ASEGURADO", s."DIRECCION_ASEGURADO",
+    s."NOMBRE_PROPIETARIO", s."RUT_PROPIETARIO", s."TIPO_DE_PERSONA_PROPIETARIO", s."TEL_PROPIETARIO",
+    s."CORREO_PROPIETARIO", s."DIRECCION_PROPIETARIO",
+    e."LIQUIDADOR", e."CORREO_LIQUIDADOR", s."DRIVE", e."COMENTARIO"
+from public."EventosSiniestro" e
+join public."Siniestros" s on s."NUM_SINIESTRO" = e."NUM_SINIESTRO";
+
+-- Insertar por la vista: el siniestro se crea con su primer evento (alta) y los siguientes solo
+-- agregan el evento; si el siniestro aún no tenía link de Drive se toma el de la fila nueva.
+create or replace function public.bitacora_insertar()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into public."Siniestros" as s (
+        "NUM_SINIESTRO", "CORRELATIVO", "FECHA_SINIESTRO", "LUGAR_SINIESTRO", "MEDIO", "COBERTURA",
+        "MARCA", "SUBMARCA", "VERSION", "MODELO", "NO_SERIE", "MOTOR", "PATENTE", "FECHA_CREACION",
+        "NOMBRE_ASEGURADO", "RUT_ASEGURADO", "TIPO_DE_PERSONA_ASEGURADO", "TEL_ASEGURADO",
+        "CORREO_ASEGURADO", "DIRECCION_ASEGURADO",
+        "NOMBRE_PROPIETARIO", "RUT_PROPIETARIO", "TIPO_DE_PERSONA_PROPIETARIO", "TEL_PROPIETARIO",
+        "CORREO_PROPIETARIO", "DIRECCION_PROPIETARIO", "DRIVE"
+    ) values (
+        new."NUM_SINIESTRO", new."CORRELATIVO", new."FECHA_SINIESTRO", new."LUGAR_SINIESTRO", new."MEDIO", new."COBERTURA",
+        new."MARCA", new."SUBMARCA", new."VERSION", new."MODELO", new."NO_SERIE", new."MOTOR", new."PATENTE", new."FECHA_CREACION",
+        new."NOMBRE_ASEGURADO", new."RUT_ASEGURADO", new."TIPO_DE_PERSONA_ASEGURADO", new."TEL_ASEGURADO",
+        new."CORREO_ASEGURADO", new."DIRECCION_ASEGURADO",
+        new."NOMBRE_PROPIETARIO", new."RUT_PROPIETARIO", new."TIPO_DE_PERSONA_PROPIETARIO", new."TEL_PROPIETARIO",
+        new."CORREO_PROPIETARIO", new."DIRECCION_PROPIETARIO", new."DRIVE"
+    )
+    on conflict ("NUM_SINIESTRO") do update
+        set "DRIVE" = coalesce(s."DRIVE", excluded."DRIVE");
+
+    insert into public."EventosSiniestro" (
+        "NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA", "ESTATUS", "COMENTARIO", "LIQUIDADOR", "CORREO_LIQUIDADOR"
+    ) values (
+        new."NUM_SINIESTRO", new."FECHA_ESTATUS_BITACORA", new."ESTATUS", new."COMENTARIO", new."LIQUIDADOR", new."CORREO_LIQUIDADOR"
+    );
+    return new;
+end;
+$$;
+
+-- Actualizar por la vista: los datos del siniestro van a Siniestros (una fila, aunque la vista
+-- devuelva una por evento) y los del evento a la fila con la misma fecha y estatus.
+create or replace function public.bitacora_actualizar()
+returns trigger
+language plpgsql
+as $$
+begin
+    update public."Siniestros" set
+        "NUM_SINIESTRO" = new."NUM_SINIESTRO", "CORRELATIVO" = new."CORRELATIVO",
+        "FECHA_SINIESTRO" = new."FECHA_SINIESTRO", "LUGAR_SINIESTRO" = new."LUGAR_SINIESTRO",
+        "MEDIO" = new."MEDIO", "COBERTURA" = new."COBERTURA", "MARCA" = new."MARCA",
+        "SUBMARCA" = new."SUBMARCA", "VERSION" = new."VERSION", "MODELO" = new."MODELO",
+        "NO_SERIE" = new."NO_SERIE", "MOTOR" = new."MOTOR", "PATENTE" = new."PATENTE",
+        "FECHA_CREACION" = new."FECHA_CREACION",
+        "NOMBRE_ASEGURADO" = new."NOMBRE_ASEGURADO", "RUT_ASEGURADO" = new."RUT_ASEGURADO",
+        "TIPO_DE_PERSONA_ASEGURADO" = new."TIPO_DE_PERSONA_ASEGURADO", "TEL_ASEGURADO" = new."TEL_ASEGURADO",
+        "CORREO_ASEGURADO" = new."CORREO_ASEGURADO", "DIRECCION_ASEGURADO" = new."DIRECCION_ASEGURADO",
+        "NOMBRE_PROPIETARIO" = new."NOMBRE_PROPIETARIO", "RUT_PROPIETARIO" = new."RUT_PROPIETARIO",
+        "TIPO_DE_PERSONA_PROPIETARIO" = new."TIPO_DE_PERSONA_PROPIETARIO", "TEL_PROPIETARIO" = new."TEL_PROPIETARIO",
+        "CORREO_PROPIETARIO" = new."CORREO_PROPIETARIO", "DIRECCION_PROPIETARIO" = new."DIRECCION_PROPIETARIO",
+        "DRIVE" = new."DRIVE"
+    where "NUM_SINIESTRO" = old."NUM_SINIESTRO";
+
+    -- Si cambió NUM_SINIESTRO, la llave foránea ya lo propagó a los eventos
+    update public."EventosSiniestro" set
+        "FECHA_ESTATUS_BITACORA" = new."FECHA_ESTATUS_BITACORA", "ESTATUS" = new."ESTATUS",
+        "COMENTARIO" = new."COMENTARIO", "LIQUIDADOR" = new."LIQUIDADOR",
+        "CORREO_LIQUIDADOR" = new."CORREO_LIQUIDADOR"
+    where "NUM_SINIESTRO" = new."NUM_SINIESTRO"
+      and "FECHA_ESTATUS_BITACORA" is not distinct from old."FECHA_ESTATUS_BITACORA"
+      and "ESTATUS" is not distinct from old."ESTATUS";
+    return new;
+end;
+$$;
+
+-- Borrar por la vista: se borra el evento y, si era el último, también el siniestro
+create or replace function public.bitacora_borrar()
+returns trigger
+language plpgsql
+as $$
+begin
+    delete from public."EventosSiniestro"
+    where "NUM_SINIESTRO" = old."NUM_SINIESTRO"
+      and "FECHA_ESTATUS_BITACORA" is not distinct from old."FECHA_ESTATUS_BITACORA"
+      and "ESTATUS" is not distinct from old."ESTATUS";
+
+    delete from public."Siniestros" s
+    where s."NUM_SINIESTRO" = old."NUM_SINIESTRO"
+      and not exists (select 1 from public."EventosSiniestro" e where e."NUM_SINIESTRO" = s."NUM_SINIESTRO");
+    return old;
+end;
+$$;
+
+create trigger bitacora_insertar instead of insert on public."BitacoraOperaciones"
+    for each row execute function public.bitacora_insertar();
+create trigger bitacora_actualizar instead of update on public."BitacoraOperaciones"
+    for each row execute function public.bitacora_actualizar();
+create trigger bitacora_borrar instead of delete on public."BitacoraOperaciones"
+    for each row execute function public.bitacora_borrar();
+
+-- Vistas de 001 sobre el esquema nuevo. El último estatus se elige en la tabla de eventos, que es
+-- angosta, y solo esa fila se une con su siniestro.
+create view public."BitacoraUltimoEstatus" as
+select
+    u."NUM_SINIESTRO", s."CORRELATIVO", s."FECHA_SINIESTRO", s."LUGAR_SINIESTRO", s."MEDIO",
+    s."COBERTURA", s."MARCA", s."SUBMARCA", s."VERSION", s."MODELO", s."NO_SERIE", s."MOTOR",
+    s."PATENTE", s."FECHA_CREACION", u."FECHA_ESTATUS_BITACORA", u."ESTATUS",
+    s."NOMBRE_ASEGURADO", s."RUT_ASEGURADO", s."TIPO_DE_PERSONA_ASEGURADO", s."TEL_ASEGURADO",
+    s."CORREO_ASEGURADO", s."DIRECCION_ASEGURADO",
+    s."NOMBRE_PROPIETARIO", s."RUT_PROPIETARIO", s."TIPO_DE_PERSONA_PROPIETARIO", s."TEL_PROPIETARIO",
+    s."CORREO_PROPIETARIO", s."DIRECCION_PROPIETARIO",
+    u."LIQUIDADOR", u."CORREO_LIQUIDADOR", s."DRIVE", u."COMENTARIO"
+from (
+    select distinct on ("NUM_SINIESTRO") *
+    from public."EventosSiniestro"
+    order by "NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA" desc nulls last
+) as u
+join public."Siniestros" s on s."NUM_SINIESTRO" = u."NUM_SINIESTRO";
+
+create view public."SiniestrosCerrados" as
+select
+    "NUM_SINIESTRO",
+    "LIQUIDADOR",
+    "ESTATUS",
+    "FECHA_CREACION",
+    "FECHA_ESTATUS_BITACORA",
+    public.dias_habiles(
+        public.fecha_o_nulo("FECHA_CREACION"::text),
+        public.fecha_o_nulo(replace("FECHA_ESTATUS_BITACORA"::text, 'T', ' '))
+    ) as "DIAS_HABILES"
+from public."BitacoraUltimoEstatus"
+where "ESTATUS" in (
+    'PAGO LIBERADO',
+    'CIERRE POR DESISTIMIENTO',
+    'CIERRE POR RECHAZO',
+    'DERIVADO A PARCIALES'
+);
+
+grant select, insert, update, delete on public."Siniestros", public."EventosSiniestro", public."BitacoraOperaciones"
+    to anon, authenticated, service_role;
+grant select on public."BitacoraUltimoEstatus", public."SiniestrosCerrados" to anon, authenticated, service_role;
+
+commit;
+
+-- Comprobación: deben coincidir
+--   select count(*) from public."BitacoraOperaciones_plana" where "NUM_SINIESTRO" is not null;
+--   select count(*) from public."BitacoraOperaciones";
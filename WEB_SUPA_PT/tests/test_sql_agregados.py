@@ -0,0 +1,172 @@
+"""Migraciones de sql/ aplicadas en un Postgres local y comparadas con los cálculos de app.py.
+
+Cada prueba crea una base de datos propia, la llena con los eventos de
+servicios_locales.generar_bitacora (más algunos casos borde), aplica las migraciones y compara
+kpis_dashboard() y la vista BitacoraUltimoEstatus con AgregadosKPI y el modelo de último estatus
+que la app arma en Python con el mismo backend local.
+
+El servidor es PRUEBAS_POSTGRES_URL si está definida (se crea y se borra una base de datos
+nueva, nunca se tocan las existentes) o, si no, uno desechable con pgserver. Sin servidor o
+sin psycopg las pruebas se saltan.
+
+Uso:
+    pip install "psycopg[binary]" pgserver
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+psycopg = pytest.importorskip("psycopg")
+from psycopg.conninfo import make_conninfo  # noqa: E402
+
+RAIZ = Path(__file__).resolve().parent.parent
+APP = RAIZ / "app.py"
+SQL = RAIZ / "sql"
+sys.path.insert(0, str(RAIZ))
+
+from servicios_locales import COLUMNAS_BITACORA, generar_bitacora  # noqa: E402
+
+EVENTOS = 3000
+SEMILLA = 11
+
+# Lo que generar_bitacora no produce: fechas nulas, fechas que no se pueden leer, fechas ISO con
+# "T" y un cierre anterior a la fecha de creación (días hábiles negativos)
+FILAS_BORDE = [
+    {"NUM_SINIESTRO": "BORDE-1", "FECHA_CREACION": "2024-03-01", "FECHA_ESTATUS_BITACORA": "2024-03-01 10:00:00",
+     "ESTATUS": "ASIGNADO", "LIQUIDADOR": "LIQ BORDE"},
+    {"NUM_SINIESTRO": "BORDE-1", "FECHA_CREACION": "2024-03-01", "FECHA_ESTATUS_BITACORA": None,
+     "ESTATUS": "CLIENTE CONTACTADO", "LIQUIDADOR": "LIQ BORDE"},
+    {"NUM_SINIESTRO": "BORDE-2", "FECHA_CREACION": "2024-03-01", "FECHA_ESTATUS_BITACORA": None,
+     "ESTATUS": "ALTA SINIESTRO", "LIQUIDADOR": None},
+    {"NUM_SINIESTRO": "BORDE-3", "FECHA_CREACION": "sin fecha", "FECHA_ESTATUS_BITACORA": "2024-03-04 09:00:00",
+     "ESTATUS": "PAGO LIBERADO", "LIQUIDADOR": "LIQ BORDE"},
+    {"NUM_SINIESTRO": "BORDE-4", "FECHA_CREACION": "2024-03-08", "FECHA_ESTATUS_BITACORA": "2024-03-04T09:00:00",
+     "ESTATUS": "CIERRE POR RECHAZO", "LIQUIDADOR": "LIQ BORDE"},
+]
+
+
+@pytest.fixture(scope="module")
+def servidor(tmp_path_factory):
+    """Función que da la URL de una base de datos dentro del servidor de pruebas."""
+    url = os.environ.get("PRUEBAS_POSTGRES_URL")
+    if url:
+        yield lambda base: make_conninfo(url, dbname=base)
+        return
+    pgserver = pytest.importorskip("pgserver", reason="sin PRUEBAS_POSTGRES_URL ni pgserver")
+    servidor = pgserver.get_server(tmp_path_factory.mktemp("pg"), cleanup_mode="stop")
+    yield lambda base: servidor.get_uri(base)
+
+
+@pytest.fixture
+def base_datos(servidor):
+    """Conexión a una base de datos nueva, con los roles que Supabase trae por defecto."""
+    nombre = f"prueba_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(servidor("postgres"), autocommit=True) as admin:
+        admin.execute(f'create database "{nombre}"')
+    try:
+        with psycopg.connect(servidor(nombre), autocommit=True) as conexion:
+            for rol in ("anon", "authenticated", "service_role"):
+                conexion.execute(
+                    f"do $$ begin create role {rol}; exception when duplicate_object then null; end $$"
+                )
+            yield conexion
+    finally:
+        with psycopg.connect(servidor("postgres"), autocommit=True) as admin:
+            admin.execute(f'drop database if exists "{nombre}"')
+
+
+def cargar_bitacora(conexion, filas):
+    columnas = ", ".join(f'"{c}" text' for c in COLUMNAS_BITACORA)
+    conexion.execute(f'create table public."BitacoraOperaciones" ({columnas})')
+    nombres = ", ".join(f'"{c}"' for c in COLUMNAS_BITACORA)
+    with conexion.cursor().copy(f'copy public."BitacoraOperaciones" ({nombres}) from stdin') as copia:
+        for fila in filas:
+            copia.write_row([fila.get(c) for c in COLUMNAS_BITACORA])
+
+
+def aplicar(conexion, *migraciones):
+    for migracion in migraciones:
+        conexion.execute((SQL / migracion).read_text(encoding="utf-8"))
+
+
+def modelo_app(app, filas_borde, kpis_servidor):
+    """Script de AppTest: corre app.py con el backend local y deja sus cálculos en session_state."""
+    import streamlit as st
+
+    ns = {"__name__": "__main__", "__file__": app}
+    with open(app, encoding="utf-8") as archivo:
+        exec(compile(archivo.read(), app, "exec"), ns)
+    ns["supabase"].table("BitacoraOperaciones").insert(filas_borde).execute()
+    ns["invalidar_bitacora"]()
+    ultimos = ns["ultimo_estatus"](ns["COLUMNAS_DASH"])
+    st.session_state["ultimos"] = {
+        fila["NUM_SINIESTRO"]: (fila["FECHA_ESTATUS_BITACORA"], fila["ESTATUS"], fila["LIQUIDADOR"])
+        for fila in ultimos
+    }
+    st.session_state["kpis_local"] = ns["AgregadosKPI"].reconstruir(ultimos).estado()
+    st.session_state["kpis_sincronizador"] = ns["kpis_dashboard"]()
+    st.session_state["kpis_servidor"] = ns["AgregadosKPI"].desde_servidor(kpis_servidor).resumen()
+    st.session_state["estado_servidor"] = ns["AgregadosKPI"].desde_servidor(kpis_servidor).estado()
+
+
+def calcular_en_app(kpis_servidor, tmp_path):
+    at = AppTest.from_function(
+        modelo_app,
+        args=(str(APP), FILAS_BORDE, kpis_servidor),
+        default_timeout=300,
+    )
+    for clave, valor in {
+        "BACKEND": "local",
+        "LOCAL_EVENTOS": EVENTOS,
+        "LOCAL_SEMILLA": SEMILLA,
+        "DATOS_DIR": str(tmp_path),
+        "BITACORA_TTL": 0,
+    }.items():
+        at.secrets[clave] = valor
+    at.session_state["auth"] = True
+    at.session_state["ROL"] = "ADMINISTRADOR"
+    at.session_state["LIQUIDADOR"] = "PRUEBAS"
+    at.session_state["USUARIO"] = "pruebas@local"
+    at.session_state["vista"] = "BUSCAR"
+    at.run()
+    assert not at.exception, at.exception[0].message
+    return at.session_state
+
+
+def _fecha(valor):
+    """PostgREST devuelve timestamps con "T"; la comparación es sobre la fecha como texto."""
+    return None if valor is None else str(valor).replace("T", " ")
+
+
+@pytest.mark.parametrize("migraciones", [
+    ("001_agregados_dashboard.sql",),
+    ("001_agregados_dashboard.sql", "002_esquema_normalizado.sql"),
+], ids=["plana", "normalizada"])
+def test_agregados_igual_que_app(base_datos, migraciones, tmp_path):
+    cargar_bitacora(base_datos, [*generar_bitacora(EVENTOS, SEMILLA), *FILAS_BORDE])
+    aplicar(base_datos, *migraciones)
+
+    kpis_servidor = base_datos.execute("select public.kpis_dashboard()").fetchone()[0]
+    if isinstance(kpis_servidor, str):
+        kpis_servidor = json.loads(kpis_servidor)
+    ultimos_servidor = {
+        num: (_fecha(fecha), estatus, liquidador)
+        for num, fecha, estatus, liquidador in base_datos.execute(
+            'select "NUM_SINIESTRO", "FECHA_ESTATUS_BITACORA", "ESTATUS", "LIQUIDADOR" '
+            'from public."BitacoraUltimoEstatus"'
+        )
+    }
+
+    app = calcular_en_app(kpis_servidor, tmp_path)
+
+    ultimos_app = {num: (_fecha(fecha), estatus, liq) for num, (fecha, estatus, liq) in app["ultimos"].items()}
+    assert len(ultimos_servidor) == EVENTOS // 5 + len({f["NUM_SINIESTRO"] for f in FILAS_BORDE})
+    assert ultimos_servidor == ultimos_app
+    assert app["estado_servidor"] == app["kpis_local"]
+    assert app["kpis_servidor"] == app["kpis_sincronizador"]